@@ -4,8 +4,8 @@ from fastapi import Depends, HTTPException, Request, status
 from fastapi.security.http import HTTPBearer
 
 from exceptions.http_exc import UnauthorizedHTTPException
-from rabbit.jwt_client import run_jwt_client
 from schemas.user import UserEntity
+from services.jwt_verifier import jwt_verifier
 
 if TYPE_CHECKING:
     from fastapi.security.http import HTTPAuthorizationCredentials
@@ -31,10 +31,9 @@ async def get_user_data(
         credentials: "HTTPAuthorizationCredentials" = Depends(custom_http_bearer)
 ) -> UserEntity:
     token: str = credentials.credentials
-    jwt_response: dict = await run_jwt_client(body=token)
-    if not jwt_response["is_valid"]:
+    user_data: dict | None = await jwt_verifier.verify(token)
+    if user_data is None:
         raise UnauthorizedHTTPException
-    user_data: dict = jwt_response["decoded"]
 
     user_data: "UserEntity" = UserEntity(
         id=user_data["sub"],
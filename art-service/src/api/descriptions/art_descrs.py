@@ -68,6 +68,7 @@ description_get_similar_arts: str = """
 - **art_id** (required): The ID of the art for which similar arts are being retrieved.  
 - **offset** (optional): The number of similar arts to skip.  
 - **limit** (optional): The maximum number of similar arts to return.  
+- **exclude_seen** (optional): If **True** and a bearer token is provided, the arts the user liked, saved or uploaded are left out. Pages stay full. Defaults to **False**.  
 
 **Returns:**  
 - **200 OK**: Returns a list of arts similar to the specified art ID, or random arts if **art_id** is not found.  
@@ -76,3 +77,23 @@ description_get_similar_arts: str = """
 **Authentication and Permissions:**  
 - A bearer token may be provided to retrieve the like status of the authenticated user. If no token is provided, the like status will always be **False**.
 """
+
+description_get_for_you_arts: str = """
+**Description:**  
+- Retrieve arts recommended to the authenticated user, ranked by their similarity to the arts the user liked and saved.  
+- Recent likes and saves weigh more than old ones, and saves weigh more than likes.  
+- Users without likes or saves get popular arts.  
+- The arts the user already liked, saved or uploaded are left out.
+
+**Parameters:**  
+- **offset** (optional): The number of recommended arts to skip.  
+- **limit** (optional): The maximum number of recommended arts to return.  
+
+**Returns:**  
+- **200 OK**: Returns a list of recommended arts with the like status of the user.  
+- **401 Unauthorized**: If the user is not authenticated. Provide a valid JWT token in headers.  
+- **500 Internal Server Error**: If there is an error during data retrieval or processing.
+
+**Authentication and Permissions:**  
+- A bearer token is required.
+"""
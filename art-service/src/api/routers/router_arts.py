@@ -5,7 +5,8 @@ from fastapi import Body, Depends, Query
 from api.dependencies import (get_art_post_schema, get_db_gateway, get_user_data,
                               get_user_data_or_none)
 from api.descriptions.art_descrs import (description_delete_art, description_get_arts,
-                                         description_get_similar_arts, description_post_art)
+                                         description_get_for_you_arts, description_get_similar_arts,
+                                         description_post_art)
 from exceptions.http_exc import ForbiddenHTTPException
 from schemas.arts import ArtEntity, ArtGetResponseFull, ArtGetResponseShort, ArtPostSchema
 from schemas.user import UserEntity
@@ -58,6 +59,7 @@ async def get_similar_arts(
         art_id: int | None = None,
         offset: int | None = None,
         limit: int | None = None,
+        exclude_seen: bool = False,
 ) -> list:
     if user_data:
         user_id = user_data.id
@@ -69,10 +71,32 @@ async def get_similar_arts(
         offset=offset,
         limit=limit,
         include_likes_for_user_id=user_id,
+        exclude_seen=exclude_seen,
     )
     return similar_arts
 
 
+@router.get(
+    "/for-you",
+    description=description_get_for_you_arts,
+    tags=["arts"],
+    response_model=list[ArtGetResponseShort]
+)
+async def get_for_you_arts(
+        db_gateway: Annotated["DBGateway", Depends(get_db_gateway)],
+        user_data: Annotated["UserEntity", Depends(get_user_data)],
+        offset: int | None = None,
+        limit: int | None = None,
+) -> list:
+    art_service: "ArtsService" = db_gateway.get_arts_service()
+    for_you_arts: list = await art_service.get_for_you_arts(
+        user_id=user_data.id,
+        offset=offset,
+        limit=limit,
+    )
+    return for_you_arts
+
+
 @router.post(
     "", description=description_post_art, tags=["arts"], response_model=int, status_code=201
 )
@@ -43,6 +43,14 @@ class BucketConfig(BaseModel):
     credentials_path: Path = art_dir / "secrets/bucket-credentials.json"
     bucket_name: str = "artspire-bucket"
     expiration_days: int = 7
+    # Signed URLs are re-signed by a background job (`services.url_rotation`) once they are
+    # within `url_refresh_margin_hours` of expiring, so reads never sign or write.
+    url_rotation_enabled: bool = True
+    url_rotation_interval_seconds: int = 15 * 60
+    url_refresh_margin_hours: int = 24
+    # Arts re-signed per bulk UPDATE, and the threads signing them.
+    url_rotation_batch_size: int = 500
+    url_rotation_workers: int = 8
 
 
 class RMQConfig(BaseModel):
@@ -53,10 +61,54 @@ class RMQConfig(BaseModel):
     prefetch_count: int = 50
     timeout_seconds: int = 10
     heartbeat: int = 120
+    # Channels the shared RPC client publishes requests on, see `rabbit.rpc_client`.
+    channel_pool_size: int = 8
+    # Seconds to wait for a reply per routing key, `timeout_seconds` for the others.
+    # Also the AMQP expiration of the request.
+    deadlines: dict[str, float] = {
+        "jwt_request": 3,
+        "jwks_request": 3,
+        "users_request": 3,
+        "similarity_request": 2,
+        "similarity_batch_request": 2,
+        "for_you_request": 2,
+        # Events, see `rabbit.events`; only the publish is bounded.
+        "art_created": 2,
+        "user_activity": 2,
+    }
+    # Recent similarity replies served when the recommendations service misses its deadline.
+    similarity_cache_size: int = 10_000
+    similarity_cache_ttl_seconds: int = 60 * 30
+    # Codec of outgoing RPC requests. JSON keeps compatibility with services that don't negotiate codecs yet.
+    content_type: str = "application/json"
 
     def get_connection_url(self) -> str:
         return f"amqp://{self.user}:{self.password}@{self.host}:{self.port}/"
 
+    def get_deadline(self, routing_key: str) -> float:
+        return self.deadlines.get(routing_key, self.timeout_seconds)
+
+
+class JwtConfig(BaseModel):
+    # Verify access tokens in process with the public keys of the auth service instead of
+    # sending every token to it, see `services.jwt_verifier`.
+    verify_locally: bool = True
+    algorithm: str = "RS256"
+    # The published keys are fetched again after this many seconds, or when a token names an
+    # unknown key id, at most once per `jwks_min_refresh_seconds`.
+    jwks_ttl_seconds: int = 60 * 60
+    jwks_min_refresh_seconds: int = 30
+    # Already verified tokens, kept until they expire.
+    token_cache_size: int = 10_000
+
+
+class UsersCacheConfig(BaseModel):
+    # Users fetched from the auth service, see `rabbit.users_client`. Entries are dropped after
+    # `ttl_seconds`, or at once on a `user_updated` event, and the least recently used ones
+    # when the cache is full.
+    size: int = 10_000
+    ttl_seconds: int = 5 * 60
+
 
 class LoggingConfig(BaseModel):
     today_date: str = str(date.today())
@@ -93,6 +145,8 @@ class Settings(BaseSettings):
     db: DatabaseConfig
     rmq: RMQConfig
     server: Server
+    jwt: JwtConfig = JwtConfig()
+    users_cache: UsersCacheConfig = UsersCacheConfig()
     s3: BucketConfig = BucketConfig()
     log: LoggingConfig = LoggingConfig()
     project_statuses: ProjectStatusCodes = ProjectStatusCodes()
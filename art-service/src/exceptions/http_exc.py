@@ -25,6 +25,14 @@ class InternalServerErrorHTTPException(HTTPException):
         )
 
 
+class ServiceUnavailableHTTPException(HTTPException):
+    def __init__(self, detail: str = "Service temporarily unavailable, try again later"):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+        )
+
+
 class UnauthorizedHTTPException(HTTPException):
     def __init__(self, detail: str = "User unauthorized"):
         super().__init__(
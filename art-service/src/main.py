@@ -1,11 +1,18 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.exception_handlers import http_exception_handler
 from contextlib import asynccontextmanager
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse
 from api.routers.router import router as arts_router
 from fastapi.middleware.cors import CORSMiddleware
-from config import logger
+from aio_pika.exceptions import AMQPException
+from config import logger, settings
+from exceptions.http_exc import ServiceUnavailableHTTPException
+from rabbit.rpc_client import RpcError, rpc_client, rpc_stats
 from rabbit.s3_server import s3_add_server, s3_get_server
+from rabbit.user_updated_consumer import user_updated_consumer
+from services.jwt_verifier import jwt_verifier
+from services.url_rotation import url_rotation_job
 import asyncio
 
 
@@ -13,9 +20,24 @@ import asyncio
 async def async_lifespan(app_: FastAPI):
     app_.s3_add_server_task = asyncio.create_task(s3_add_server())
     app_.s3_get_server_task = asyncio.create_task(s3_get_server())
+    app_.user_updated_task = asyncio.create_task(user_updated_consumer())
+    app_.url_rotation_task = (
+        asyncio.create_task(url_rotation_job()) if settings.s3.url_rotation_enabled else None
+    )
+    try:
+        await rpc_client.connect()
+    except (AMQPException, OSError) as err:
+        logger.error(f"RPC client not connected, the first call retries: {err}")
+    else:
+        if settings.jwt.verify_locally:
+            await jwt_verifier.refresh_keys()
     yield
     app_.s3_add_server_task.cancel()
     app_.s3_get_server_task.cancel()
+    app_.user_updated_task.cancel()
+    if app_.url_rotation_task:
+        app_.url_rotation_task.cancel()
+    await rpc_client.close()
 
 app = FastAPI(
     title="Artspire-Arts",
@@ -32,11 +54,23 @@ app.add_middleware(
 app.include_router(arts_router)
 
 
+@app.exception_handler(RpcError)
+async def rpc_error_handler(request: Request, exc: RpcError) -> JSONResponse:
+    # Requests without a fallback fail fast instead of waiting for a service that is down.
+    rpc_stats.record_fallback(f"{exc.routing_key}:unavailable")
+    return await http_exception_handler(request, ServiceUnavailableHTTPException())
+
+
 @app.get("/")
 async def redirect_to_docs() -> RedirectResponse:
     return RedirectResponse(url="/docs")
 
 
+@app.get("/rpc-stats", include_in_schema=False)
+async def get_rpc_stats() -> dict:
+    return rpc_stats.as_dict()
+
+
 if __name__ == "__main__":
     logger.info(f"In __main__")
     uvicorn.run(app=app, port=8000, host="0.0.0.0")
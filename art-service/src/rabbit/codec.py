@@ -0,0 +1,63 @@
+import json
+from typing import TYPE_CHECKING, Any
+
+import msgpack
+import numpy as np
+
+if TYPE_CHECKING:
+    from aio_pika.abc import AbstractIncomingMessage
+
+# Messages without a content type are treated as JSON text, which is what older clients send.
+JSON: str = "application/json"
+MSGPACK: str = "application/msgpack"
+# Packed little-endian int32, used for id lists.
+INT32_ARRAY: str = "application/x-int32-array"
+OCTET_STREAM: str = "application/octet-stream"
+
+STRUCTURED: tuple[str, ...] = (JSON, MSGPACK)
+# Name of the header in which a client asks for the content type of the reply.
+ACCEPT_HEADER: str = "accept"
+# Name of the header of an error reply, a request the server failed to handle. Its value describes the error.
+ERROR_HEADER: str = "x-error"
+
+
+def is_json(content_type: str | None) -> bool:
+    return content_type is None or content_type == JSON
+
+
+def encode(data: Any, content_type: str) -> bytes:
+    if isinstance(data, np.ndarray) and content_type in STRUCTURED:
+        data = data.tolist()
+    if content_type == JSON:
+        return json.dumps(data).encode()
+    if content_type == MSGPACK:
+        return msgpack.packb(data)
+    if content_type == INT32_ARRAY:
+        return np.asarray(data, dtype="<i4").tobytes()
+    if content_type == OCTET_STREAM:
+        return bytes(data)
+    raise ValueError(f"Unsupported content type: {content_type}")
+
+
+def decode(body: bytes, content_type: str | None) -> Any:
+    if is_json(content_type):
+        return json.loads(body)
+    if content_type == MSGPACK:
+        return msgpack.unpackb(body)
+    if content_type == INT32_ARRAY:
+        return np.frombuffer(body, dtype="<i4").tolist()
+    if content_type == OCTET_STREAM:
+        return body
+    raise ValueError(f"Unsupported content type: {content_type}")
+
+
+def get_reply_content_type(message: "AbstractIncomingMessage") -> str:
+    """The `accept` header if the client sent one, else the request's own structured codec, else JSON."""
+    accept: Any = (message.headers or {}).get(ACCEPT_HEADER)
+    if isinstance(accept, bytes):
+        accept = accept.decode()
+    if accept:
+        return accept
+    if message.content_type in STRUCTURED:
+        return message.content_type
+    return JSON
@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+from aio_pika.exceptions import AMQPException
+
+from config import logger
+from .rpc_client import rpc_client
+
+ART_CREATED: str = "art_created"
+USER_ACTIVITY: str = "user_activity"
+
+
+# Strong references to the pending publishes, the event loop only keeps weak ones.
+_pending_publishes: set[asyncio.Task] = set()
+
+
+async def _send(queue_name: str, body: bytes, content_type: str | None) -> None:
+    try:
+        await rpc_client.publish(body=body, routing_key=queue_name, content_type=content_type)
+        logger.info(f"Published {queue_name}: {body!r}")
+    except (AMQPException, OSError, TimeoutError) as err:
+        logger.error(f"Failed to publish {queue_name}: {body!r}: {err!r}", exc_info=True)
+
+
+async def _publish(queue_name: str, body: bytes, content_type: str | None = None) -> None:
+    """
+    Publishes an event to the recommendations service in the background, on the shared RabbitMQ
+    connection. Delivery is best effort: the user's request neither waits for the broker nor
+    fails with it, a failure or a missed deadline (`settings.rmq.get_deadline`) is logged.
+    """
+    task: asyncio.Task = asyncio.create_task(_send(queue_name, body, content_type))
+    _pending_publishes.add(task)
+    task.add_done_callback(_pending_publishes.discard)
+
+
+async def publish_art_created(art_id: int) -> None:
+    """
+    Notifies the recommendations service that an art was created, so it can be recommended
+    before the next rebuild. The recommendations service also folds unknown arts in on the
+    first request, so a lost event is not fatal.
+
+    :param art_id: The ID of the created art.
+    """
+    await _publish(ART_CREATED, str(art_id).encode())
+
+
+async def publish_user_activity(user_id: int, art_id: int, action: str) -> None:
+    """
+    Notifies the recommendations service that a user liked, unliked, saved or unsaved an art,
+    so it can update the user's "for you" profile. A lost event is corrected by the next
+    unlike or unsave, which rebuild the profile from the database.
+
+    :param user_id: The ID of the user.
+    :param art_id: The ID of the art.
+    :param action: One of "like", "unlike", "save", "unsave".
+    """
+    body: bytes = json.dumps({"user_id": user_id, "art_id": art_id, "action": action}).encode()
+    await _publish(USER_ACTIVITY, body, content_type="application/json")
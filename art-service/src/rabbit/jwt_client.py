@@ -1,13 +1,19 @@
 import json
 
-from config import logger
+from config import logger, settings
 from exceptions.http_exc import InternalServerErrorHTTPException
-from .rpc_client import run_rpc_client
+from . import codec
+from .rpc_client import run_rpc_client, run_rpc_client_data
 
 JWT_REQUEST: str = "jwt_request"
+JWKS_REQUEST: str = "jwks_request"
 
 
 async def run_jwt_client(body: str) -> dict:
+    if not codec.is_json(settings.rmq.content_type):
+        result: dict = await run_rpc_client_data(data=body, routing_key=JWT_REQUEST)
+        return result
+    # The JSON protocol sends the bare token, not a JSON string.
     json_result: str = await run_rpc_client(body=body, routing_key=JWT_REQUEST)
     try:
         result: dict = json.loads(json_result)
@@ -15,3 +21,14 @@ async def run_jwt_client(body: str) -> dict:
     except json.JSONDecodeError as err:
         logger.error(f"Error: {err}")
         raise InternalServerErrorHTTPException
+
+
+async def run_jwks_client() -> dict:
+    """
+    Fetches the public keys of the auth service, a JWKS document of the form
+    `{"keys": [{"kid": str, "kty": "RSA", "alg": "RS256", "n": str, "e": str}, ...]}`.
+    The key signing new tokens comes first.
+    """
+    logger.warning("Started run_jwks_client")
+    jwks: dict = await run_rpc_client_data(data="", routing_key=JWKS_REQUEST)
+    return jwks
@@ -2,10 +2,13 @@ from typing import TYPE_CHECKING
 
 import asyncio
 import uuid
-from aio_pika import connect, Message
+from collections import Counter
+from aio_pika import connect_robust, Message
 from aio_pika.exceptions import AMQPException
+from aio_pika.pool import Pool
 
 from config import logger, settings
+from . import codec
 
 if TYPE_CHECKING:
     from aio_pika.abc import (
@@ -17,37 +20,121 @@ if TYPE_CHECKING:
     from typing import Self, Any
 
 
+class RpcError(Exception):
+    """No usable reply to an RPC request, see the subclasses."""
+    routing_key: str
+
+
+class RpcTimeoutError(RpcError, asyncio.TimeoutError):
+    """No reply to an RPC request within the deadline of its routing key."""
+
+    def __init__(self, routing_key: str, deadline: float):
+        super().__init__(f"No reply to {routing_key} within {deadline} s")
+        self.routing_key: str = routing_key
+        self.deadline: float = deadline
+
+
+class RpcRemoteError(RpcError):
+    """The server failed to handle an RPC request and sent an error reply (`codec.ERROR_HEADER`)."""
+
+    def __init__(self, routing_key: str, detail: str):
+        super().__init__(f"{routing_key} failed: {detail}")
+        self.routing_key: str = routing_key
+        self.detail: str = detail
+
+
+class RpcStats:
+    """Counters of RPC timeouts and error replies per routing key, and of the fallbacks served instead of a reply."""
+
+    def __init__(self):
+        self.timeouts: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self.fallbacks: Counter[str] = Counter()
+
+    def record_timeout(self, routing_key: str) -> None:
+        self.timeouts[routing_key] += 1
+        logger.warning(f"RPC timeout on {routing_key}, timeouts: {dict(self.timeouts)}")
+
+    def record_error(self, routing_key: str) -> None:
+        self.errors[routing_key] += 1
+        logger.warning(f"RPC error reply on {routing_key}, errors: {dict(self.errors)}")
+
+    def record_fallback(self, name: str) -> None:
+        self.fallbacks[name] += 1
+        logger.warning(f"RPC fallback {name}, fallbacks: {dict(self.fallbacks)}")
+
+    def as_dict(self) -> dict[str, dict[str, int]]:
+        return {"timeouts": dict(self.timeouts), "errors": dict(self.errors), "fallbacks": dict(self.fallbacks)}
+
+
+rpc_stats: RpcStats = RpcStats()
+
+
 class RmqRpcClient:
+    """
+    A long-lived RPC client shared by all requests of the process.
+
+    One robust connection carries every call: requests are published through a small pool of
+    channels, and all replies arrive on a single exclusive reply queue, where `on_response`
+    hands each one to the future waiting for its correlation id. The client is started and
+    closed in the FastAPI lifespan; outside of it, the first call connects.
+    """
     connection: "AbstractConnection"
     channel: "AbstractChannel"
     callback_queue: "AbstractQueue"
+    channel_pool: "Pool[AbstractChannel]"
 
     def __init__(self):
-        self.correlation_id = None
-        self.future = asyncio.Future()
+        self.futures: dict[str, asyncio.Future] = {}
+        self.is_connected: bool = False
+        self._connect_lock: asyncio.Lock = asyncio.Lock()
+        # Queues of the events published by `publish`, declared once per connection.
+        self._declared_queues: set[str] = set()
 
     async def connect(self) -> "Self":
-        try:
-            logger.info("Connecting to RabbitMQ...")
-            self.connection = await connect(
-                url=settings.rmq.get_connection_url(),
-                client_properties={
-                    "expiration": str(settings.rmq.timeout_seconds * 1000),
-                }
-            )
-            self.channel = await self.connection.channel()
-            self.callback_queue = await self.channel.declare_queue(exclusive=True)
-            await self.callback_queue.consume(callback=self.on_response)
-            logger.info("Connected and queue declared successfully.")
-            return self
-        except AMQPException as err:
-            logger.critical(f"AMQP error during RabbitMQ connection: {err}", exc_info=True)
+        async with self._connect_lock:
+            if self.is_connected:
+                return self
+            try:
+                logger.info("Connecting to RabbitMQ...")
+                self.connection = await connect_robust(
+                    url=settings.rmq.get_connection_url(),
+                    client_properties={
+                        "expiration": str(settings.rmq.timeout_seconds * 1000),
+                    }
+                )
+                self.channel_pool = Pool(self._get_channel, max_size=settings.rmq.channel_pool_size)
+                # Replies are consumed on a channel of their own, requests never wait for it.
+                self.channel = await self.connection.channel()
+                # Named by the client: the robust connection re-declares it after a reconnect,
+                # which the broker refuses for server-generated "amq.gen-" names.
+                self.callback_queue = await self.channel.declare_queue(
+                    name=f"rpc_reply.{uuid.uuid4().hex}", exclusive=True,
+                )
+                await self.callback_queue.consume(callback=self.on_response)
+                self.is_connected = True
+                logger.info("Connected and queue declared successfully.")
+                return self
+            except AMQPException as err:
+                logger.critical(f"AMQP error during RabbitMQ connection: {err}", exc_info=True)
 
-            raise
+                raise
+
+    async def _get_channel(self) -> "AbstractChannel":
+        return await self.connection.channel()
 
     async def close(self):
+        if not self.is_connected:
+            return
+        self.is_connected = False
+        self._declared_queues.clear()
+        for future in self.futures.values():
+            if not future.done():
+                future.cancel()
+        self.futures.clear()
         try:
             if not self.connection.is_closed:
+                await self.channel_pool.close()
                 await self.channel.close()
                 await self.connection.close()
                 logger.info("Connection to RabbitMQ closed.")
@@ -55,53 +142,146 @@ class RmqRpcClient:
             logger.error(f"Error while closing connection: {err}", exc_info=True)
             raise
 
-    async def __aenter__(self) -> "Self":
-        await self.connect()
-        return self
-
-    async def __aexit__(self, exc_type, exc, tb):
-        await self.close()
-
     async def on_response(self, message: "AbstractIncomingMessage") -> None:
         try:
             logger.debug(f"Received message with correlation_id: {message.correlation_id}")
-            if message.correlation_id == self.correlation_id:
-                await message.ack()
-                response_body = message.body.decode()
-                logger.debug(f"Response message: {response_body}")
-                self.future.set_result(response_body)
-            else:
-                logger.warning(f"Received message with mismatched correlation_id: {message.correlation_id}")
+            await message.ack()
+            future: asyncio.Future | None = self.futures.pop(message.correlation_id, None)
+            if future is None:
+                # The caller gave up waiting, or the reply is a duplicate.
+                logger.warning(f"Received message with unknown correlation_id: {message.correlation_id}")
+                return
+            logger.debug(f"Response message: {len(message.body)} bytes, {message.content_type}")
+            if not future.done():
+                future.set_result(message)
         except AMQPException as err:
             logger.error(f"AMQP error processing message: {err}", exc_info=True)
             raise
 
+    async def publish(self, body: bytes, routing_key: str, content_type: str | None = None) -> None:
+        """
+        Publishes a message to the queue `routing_key` without waiting for a reply, on the shared
+        connection, within the deadline of the routing key (`settings.rmq.get_deadline`).
+        The queue is declared on the first publish, so messages sent before its consumer
+        started are kept.
+
+        :raises TimeoutError: If the message could not be published within the deadline.
+        """
+        async with asyncio.timeout(settings.rmq.get_deadline(routing_key)):
+            if not self.is_connected:
+                await self.connect()
+            async with self.channel_pool.acquire() as channel:
+                if routing_key not in self._declared_queues:
+                    await channel.declare_queue(name=routing_key)
+                    self._declared_queues.add(routing_key)
+                await channel.default_exchange.publish(
+                    Message(body=body, content_type=content_type),
+                    routing_key=routing_key,
+                )
+
     async def call(self, call_body: str, routing_key: str):
+        response: "AbstractIncomingMessage" = await self.call_message(call_body.encode(), routing_key)
+        return response.body.decode()
+
+    async def call_message(
+            self,
+            call_body: bytes,
+            routing_key: str,
+            content_type: str | None = None,
+            headers: dict | None = None,
+    ) -> "AbstractIncomingMessage":
+        """
+        Publishes a request and waits for its reply, at most the deadline of the routing key
+        (`settings.rmq.get_deadline`). The deadline is also the AMQP expiration of the request,
+        so the broker drops it instead of delivering it after the caller gave up.
+
+        :raises RpcTimeoutError: If there is no reply within the deadline.
+        :raises RpcRemoteError: If the server failed to handle the request.
+        """
+        deadline: float = settings.rmq.get_deadline(routing_key)
+        correlation_id: str = str(uuid.uuid4())
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.futures[correlation_id] = future
         try:
-            self.correlation_id = str(uuid.uuid4())
-            logger.debug(f"Publishing message with correlation_id: {self.correlation_id}")
-
-            await self.channel.default_exchange.publish(
-                Message(
-                    body=call_body.encode(),
-                    correlation_id=self.correlation_id,
-                    reply_to=self.callback_queue.name
-                ),
-                routing_key=routing_key,
-            )
-            response = await self.future
-            return response
+            async with asyncio.timeout(deadline):
+                if not self.is_connected:
+                    await self.connect()
+                logger.debug(f"Publishing message with correlation_id: {correlation_id}")
+                async with self.channel_pool.acquire() as channel:
+                    await channel.default_exchange.publish(
+                        Message(
+                            body=call_body,
+                            content_type=content_type,
+                            headers=headers,
+                            correlation_id=correlation_id,
+                            reply_to=self.callback_queue.name,
+                            expiration=deadline,
+                        ),
+                        routing_key=routing_key,
+                    )
+                response: "AbstractIncomingMessage" = await future
+        except TimeoutError as err:
+            rpc_stats.record_timeout(routing_key)
+            raise RpcTimeoutError(routing_key, deadline) from err
         except AMQPException as err:
             logger.error(f"AMQP error during message publish: {err}", exc_info=True)
             raise
+        finally:
+            self.futures.pop(correlation_id, None)
+        error: "Any" = (response.headers or {}).get(codec.ERROR_HEADER)
+        if error is not None:
+            rpc_stats.record_error(routing_key)
+            raise RpcRemoteError(routing_key, error.decode() if isinstance(error, bytes) else str(error))
+        return response
+
+
+rpc_client: RmqRpcClient = RmqRpcClient()
 
 
 async def run_rpc_client(body: str, routing_key: str) -> "Any":
     try:
-        async with RmqRpcClient() as client:
-            logger.info(f"In async with RmqRpcClient() as client:")
-            response = await client.call(call_body=body, routing_key=routing_key)
+        response = await rpc_client.call(call_body=body, routing_key=routing_key)
         return response
+    except RpcError:
+        # Counted and logged by the client, handled by the caller.
+        raise
+    except Exception as e:
+        logger.error(f"An error occurred: {e}", exc_info=True)
+        raise e
+
+
+async def run_rpc_client_data(
+        data: "Any",
+        routing_key: str,
+        accept: str | None = None,
+        headers: dict | None = None,
+) -> "Any":
+    """
+    Encodes `data` with the configured codec (`settings.rmq.content_type`), sends it and
+    decodes the response according to its own content type.
+
+    :param data: The request data.
+    :param routing_key: The RabbitMQ routing key.
+    :param accept: The content type the response should be encoded with. Ignored with JSON,
+        so JSON-only deployments keep exchanging plain JSON.
+    :param headers: Extra AMQP headers, e.g. metadata of a raw binary body.
+    :return: The decoded response.
+    """
+    content_type: str = settings.rmq.content_type
+    headers = dict(headers or {})
+    if accept is not None and not codec.is_json(content_type):
+        headers[codec.ACCEPT_HEADER] = accept
+    try:
+        response: "AbstractIncomingMessage" = await rpc_client.call_message(
+            call_body=codec.encode(data, content_type),
+            routing_key=routing_key,
+            content_type=content_type,
+            headers=headers or None,
+        )
+        return codec.decode(response.body, response.content_type)
+    except RpcError:
+        # Counted and logged by the client, handled by the caller.
+        raise
     except Exception as e:
         logger.error(f"An error occurred: {e}", exc_info=True)
-        raise e
\ No newline at end of file
+        raise e
@@ -4,6 +4,7 @@ from aio_pika import connect, Message
 from typing import TYPE_CHECKING
 from abc import ABC
 from aio_pika.exceptions import AMQPException
+from . import codec
 
 if TYPE_CHECKING:
     from aio_pika.abc import (
@@ -13,6 +14,7 @@ if TYPE_CHECKING:
         AbstractQueue,
         AbstractIncomingMessage,
     )
+    from typing import Any
 
 
 class RmqRpcServer:
@@ -69,11 +71,39 @@ class RmqRpcServer:
         """
         return message_body
 
+    async def data_handler(self, data: "Any", headers: dict) -> "Any":
+        """
+        Handler for messages sent in a binary codec. Subclasses that accept such messages
+        should override this method.
+
+        :param data: The message body, already decoded according to its content type.
+        :param headers: The AMQP headers of the message, e.g. metadata of a raw binary body.
+        :return: A response, encoded with the content type negotiated by the sender.
+        """
+        raise ValueError(f"{self.queue_name} does not accept binary requests")
+
+    async def handle(self, message: "AbstractIncomingMessage") -> tuple[bytes, str]:
+        """
+        Dispatches a message by its `content_type`: JSON text (or no content type, as sent
+        by older clients) goes to `msg_handler`, any other codec goes to `data_handler`.
+
+        :param message: The incoming RabbitMQ message.
+        :return: The encoded response and its content type.
+        """
+        if codec.is_json(message.content_type):
+            response: str = await self.msg_handler(message.body.decode())
+            return response.encode(), codec.JSON
+
+        content_type: str = codec.get_reply_content_type(message)
+        data: "Any" = codec.decode(message.body, message.content_type)
+        response_data: "Any" = await self.data_handler(data, dict(message.headers or {}))
+        return codec.encode(response_data, content_type), content_type
+
     async def process_messages(self):
         """
         Consumes messages from the queue and processes them in a loop. Each message is:
-          - Decoded into a string.
-          - Handled by `msg_handler`.
+          - Decoded according to its content type.
+          - Handled by `msg_handler` or `data_handler`, see `handle`.
           - Replied to via the `reply_to` property in the original message.
 
         Cleans up the connection if an error occurs or the loop ends.
@@ -84,14 +114,14 @@ class RmqRpcServer:
                     message: "AbstractIncomingMessage"
                     async with message.process(requeue=False):
                         assert message.reply_to is not None
-                        msg_body: str = message.body.decode()
                         logger.info(f"Received message")
 
-                        response: str = await self.msg_handler(msg_body)
+                        response, content_type = await self.handle(message)
 
                         await self.exchange.publish(
                             Message(
-                                body=response.encode(),
+                                body=response,
+                                content_type=content_type,
                                 correlation_id=message.correlation_id,
                             ),
                             routing_key=message.reply_to,
@@ -45,35 +45,65 @@ class S3RpcAddServer(RmqRpcServer):
         :raises InvalidImageTypeHTTPException: If the provided image type is not supported.
         :raises OSError: If any file I/O or image conversion error occurs.
         """
-        result = S3AddResponse()
         try:
             img_data = S3AddSchema.model_validate_json(message_body)
             logger.debug("message_body validated")
+        except ValidationError as e:
+            logger.critical(e, exc_info=True)
+            result = S3AddResponse(status=settings.project_statuses.validation_error)
+        else:
+            img_binary: bytes = base64.b64decode(img_data.img_base64)
+            result: S3AddResponse = await self._add_image(
+                img_binary=img_binary, img_type=img_data.img_type, blob_name=img_data.blob_name)
+        result_json: str = result.model_dump_json()
+        logger.debug(f"result_json = {result_json}")
+        return result_json
 
-            img_base64: str = img_data.img_base64
-            img_binary: bytes = base64.b64decode(img_base64)
+    async def data_handler(self, data: bytes, headers: dict) -> dict:
+        """
+        Handles an image sent as a raw binary body, with `img_type` and `blob_name`
+        in the AMQP headers instead of a base64 string inside JSON.
+
+        :param data: The raw image file.
+        :param headers: AMQP headers with the `img_type` and `blob_name` of the image.
+        :return: The :class:`S3AddResponse` schema as a dict.
+        """
+        try:
+            img_type: str = str(headers["img_type"])
+            blob_name: str = str(headers["blob_name"])
+        except KeyError as e:
+            logger.critical(f"Missing header: {e}")
+            return S3AddResponse(status=settings.project_statuses.validation_error).model_dump()
+        result: S3AddResponse = await self._add_image(img_binary=data, img_type=img_type, blob_name=blob_name)
+        return result.model_dump()
+
+    @staticmethod
+    async def _add_image(img_binary: bytes, img_type: str, blob_name: str) -> S3AddResponse:
+        """
+        Converts the image to JPEG and uploads it to the storage bucket.
+
+        :return: :class:`S3AddResponse` with the status and, on success, the blob name.
+        """
+        result = S3AddResponse()
+        try:
             img_bytes_io: BytesIO = BytesIO(img_binary)
 
             img_jpg: BytesIO = await s3_service.convert_image_file_to_jpg(
-                image_file=img_bytes_io, image_type=img_data.img_type)
+                image_file=img_bytes_io, image_type=img_type)
             logger.debug("image converted to jpg")
 
-            blob_name: str = s3_service.upload_file(file_obj=img_jpg, blob_name=img_data.blob_name)
+            blob_name: str = s3_service.upload_file(file_obj=img_jpg, blob_name=blob_name)
             result.status = settings.project_statuses.success
             result.blob_name = blob_name
-        except (ValidationError, GoogleCloudError, InvalidImageTypeHTTPException, OSError) as e:
+        except (GoogleCloudError, InvalidImageTypeHTTPException, OSError) as e:
             logger.critical(e, exc_info=True)
-            if type(e) is ValidationError:
-                result.status = settings.project_statuses.validation_error
-            elif type(e) is GoogleCloudError:
+            if type(e) is GoogleCloudError:
                 result.status = settings.project_statuses.google_cloud_error
             elif type(e) is InvalidImageTypeHTTPException:
                 result.status = settings.project_statuses.img_invalid_type_error
             else:
                 result.status = settings.project_statuses.os_error
-        result_json: str = result.model_dump_json()
-        logger.debug(f"result_json = {result_json}")
-        return result_json
+        return result
 
 
 class S3RpcGetServer(RmqRpcServer):
@@ -1,13 +1,112 @@
-import json
+from typing import Literal
 
-from config import logger
-from .rpc_client import run_rpc_client
+from cachetools import TTLCache
+
+from config import logger, settings
+from schemas.base import CustomBaseModel
+from schemas.rabbit_ import ExclusionSpecSchema, ForYouGetSchema, SimilarityBatchGetSchema, SimilarityGetSchema
+from . import codec
+from .rpc_client import RpcError, rpc_stats, run_rpc_client_data
 
 SIMILARITY_REQUEST: str = "similarity_request"
+SIMILARITY_BATCH_REQUEST: str = "similarity_batch_request"
+FOR_YOU_REQUEST: str = "for_you_request"
+
+# The last reply to each recent request, served when the recommendations service misses its deadline.
+_recent_replies: TTLCache = TTLCache(
+    maxsize=settings.rmq.similarity_cache_size, ttl=settings.rmq.similarity_cache_ttl_seconds,
+)
+
+
+async def _call_with_cache(request: CustomBaseModel, routing_key: str) -> list[int]:
+    """
+    Sends a similarity request and keeps its reply. If a later reply to the same request
+    misses its deadline or is an error, the kept one is returned instead.
+
+    :raises RpcError: If the reply misses its deadline or is an error, and there is no kept reply.
+    """
+    key: tuple[str, str] = (routing_key, request.model_dump_json())
+    try:
+        art_ids: list[int] = await run_rpc_client_data(
+            data=request.model_dump(),
+            routing_key=routing_key,
+            accept=codec.INT32_ARRAY,
+        )
+    except RpcError:
+        cached: list[int] | None = _recent_replies.get(key)
+        if cached is None:
+            raise
+        rpc_stats.record_fallback(f"{routing_key}:cache")
+        return cached
+    _recent_replies[key] = art_ids
+    return art_ids
 
 
-async def run_similarity_client(art_id: int) -> list[int]:
+async def run_similarity_client(
+        art_id: int,
+        offset: int | None = None,
+        limit: int | None = None,
+        exclude: list[int] | None = None,
+        exclude_for: ExclusionSpecSchema | None = None,
+        engine: Literal["tags"] | None = None,
+) -> list[int]:
     logger.warning(f"Started run_similarity_client with art_id: {art_id}")
-    art_ids_json: str = await run_rpc_client(body=str(art_id), routing_key=SIMILARITY_REQUEST)
-    art_ids: list[int] = json.loads(art_ids_json)
+    request = SimilarityGetSchema(
+        art_id=art_id,
+        offset=offset or 0,
+        limit=limit,
+        exclude=exclude or [],
+        exclude_for=exclude_for,
+        engine=engine,
+    )
+    art_ids: list[int] = await _call_with_cache(request, SIMILARITY_REQUEST)
+    return art_ids
+
+
+async def run_similarity_batch_client(
+        art_ids: list[int],
+        weights: list[float] | None = None,
+        offset: int | None = None,
+        limit: int | None = None,
+        exclude: list[int] | None = None,
+        exclude_for: ExclusionSpecSchema | None = None,
+) -> list[int]:
+    """
+    Asks for one ranked page of the arts similar to all seed arts together, in a single round trip.
+    The seeds themselves are never returned.
+    """
+    logger.warning(f"Started run_similarity_batch_client with {len(art_ids)} art_ids")
+    request = SimilarityBatchGetSchema(
+        art_ids=art_ids,
+        weights=weights,
+        offset=offset or 0,
+        limit=limit,
+        exclude=exclude or [],
+        exclude_for=exclude_for,
+    )
+    similar_art_ids: list[int] = await _call_with_cache(request, SIMILARITY_BATCH_REQUEST)
+    return similar_art_ids
+
+
+async def run_for_you_client(
+        user_id: int,
+        offset: int | None = None,
+        limit: int | None = None,
+        exclude: list[int] | None = None,
+        exclude_for: ExclusionSpecSchema | None = None,
+) -> list[int]:
+    """
+    Asks for a page of the arts ranked by the user's likes and saves.
+    Arts matched by `exclude_for` are dropped by the recommendations service before the page is cut,
+    so pages stay full.
+    """
+    logger.warning(f"Started run_for_you_client with user_id: {user_id}")
+    request = ForYouGetSchema(
+        user_id=user_id,
+        offset=offset or 0,
+        limit=limit,
+        exclude=exclude or [],
+        exclude_for=exclude_for,
+    )
+    art_ids: list[int] = await _call_with_cache(request, FOR_YOU_REQUEST)
     return art_ids
@@ -0,0 +1,50 @@
+import asyncio
+from typing import TYPE_CHECKING
+
+from aio_pika import connect, ExchangeType
+from aio_pika.exceptions import AMQPException
+
+from config import logger, settings
+from .users_client import invalidate_users
+
+if TYPE_CHECKING:
+    from aio_pika.abc import AbstractConnection, AbstractIncomingMessage
+
+# Fanout exchange the auth service publishes to when a username or profile picture changes;
+# the body is the user id. Every instance consumes its own exclusive queue.
+USER_UPDATED: str = "user_updated"
+
+
+async def _on_user_updated(message: "AbstractIncomingMessage") -> None:
+    async with message.process(requeue=False):
+        user_id: int = int(message.body.decode())
+        invalidate_users([user_id])
+        logger.info(f"Dropped cached user_id = {user_id}")
+
+
+async def _run_user_updated_consumer() -> None:
+    connection: "AbstractConnection" = await connect(
+        url=settings.rmq.get_connection_url(),
+        client_properties={"heartbeat": settings.rmq.heartbeat},
+    )
+    async with connection:
+        channel = await connection.channel()
+        exchange = await channel.declare_exchange(name=USER_UPDATED, type=ExchangeType.FANOUT)
+        queue = await channel.declare_queue(exclusive=True)
+        await queue.bind(exchange)
+        await queue.consume(_on_user_updated)
+        logger.info("UserUpdatedConsumer connected to RabbitMQ and queue declared successfully.")
+        await asyncio.Future()
+
+
+async def user_updated_consumer():
+    while True:
+        try:
+            await _run_user_updated_consumer()
+        except asyncio.CancelledError:
+            logger.info("User updated consumer task was cancelled.")
+            raise
+        except (AMQPException, OSError) as err:
+            logger.critical(f"User updated consumer encountered an error: {err}", exc_info=True)
+            logger.info("Restarting user updated consumer...")
+            await asyncio.sleep(5)
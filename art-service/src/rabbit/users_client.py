@@ -1,37 +1,91 @@
-import json
+import asyncio
 
-from config import logger
+from cachetools import TTLCache
+
+from config import logger, settings
 from schemas.user import UserEntity
-from .rpc_client import run_rpc_client
+from .rpc_client import run_rpc_client_data
 
 USERS_REQUEST: str = "users_request"
 
+# Users by id, TTL expiry with LRU eviction when full.
+_users_cache: TTLCache = TTLCache(maxsize=settings.users_cache.size, ttl=settings.users_cache.ttl_seconds)
+# The pending `users_request` of every user id being fetched, shared by concurrent callers.
+_pending: dict[int, "asyncio.Task[dict[int, UserEntity]]"] = {}
+
+
+async def _fetch_users(users_id: list[int]) -> dict[int, "UserEntity"]:
+    users_info: list[dict] = await run_rpc_client_data(data=users_id, routing_key=USERS_REQUEST)
+    user_entities_dict: dict[int, "UserEntity"] = {
+        user["id"]: UserEntity.model_validate(user) for user in users_info
+    }
+    return user_entities_dict
+
+
+def _on_fetched(users_id: list[int], task: "asyncio.Task[dict[int, UserEntity]]") -> None:
+    # Users invalidated while the request was pending are not cached.
+    still_pending: list[int] = [user_id for user_id in users_id if _pending.get(user_id) is task]
+    for user_id in still_pending:
+        del _pending[user_id]
+    if not task.cancelled() and task.exception() is None:
+        fetched: dict[int, "UserEntity"] = task.result()
+        _users_cache.update((user_id, fetched[user_id]) for user_id in still_pending if user_id in fetched)
+
+
+def invalidate_users(users_id: list[int]) -> None:
+    """Drops cached users, so their next lookup asks the auth service again."""
+    for user_id in users_id:
+        _users_cache.pop(user_id, None)
+        # A reply already on its way may hold the old data.
+        _pending.pop(user_id, None)
+
 
 async def run_users_client(users_id: list) -> dict[int, "UserEntity"]:
     """
     Sends a request to the RabbitMQ queue to retrieve user information based on a list of user IDs.
 
-    This function sends a JSON-encoded list of `user_id` values to the `users_request` queue via RabbitMQ.
-    The authorization service processes the request and returns a JSON-encoded response, where each key is a
-    user ID and each value is a dictionary containing user information such as `id`, `username`, `email`, etc.
+    Users are served from an in-process cache (`settings.users_cache`) when possible. The missing
+    ones are sent in a single request to the `users_request` queue, encoded with the configured
+    codec (JSON or msgpack). Users already requested by a concurrent call are not requested again,
+    the call waits for that reply instead. The authorization service returns a list of dictionaries
+    containing user information such as `id`, `username`, `email`, etc.
 
     The function validates the received data and creates `UserEntity` models for each user. It returns a
     dictionary where the keys are user IDs, and the values are instances of `UserEntity`.
 
     If the input list contains duplicate user IDs (e.g., `[1, 1, 7]`), the result will only contain unique
-    user IDs (e.g., `{1: user_1, 7: user_7}`).
+    user IDs (e.g., `{1: user_1, 7: user_7}`). Unknown user IDs are left out.
 
     :param users_id: A list of user IDs for which information needs to be retrieved.
     :return: A dictionary where the keys are user IDs, and the values are `UserEntity` instances with the user's information.
     :raises ValidationError: If the data from the service does not match the expected structure.
     """
     logger.warning(f"Started run_users_client with users_id: {users_id}")
-    users_id_json = json.dumps(users_id)
-    users_info_json: str = await run_rpc_client(body=users_id_json, routing_key=USERS_REQUEST)
-    users_info: list[dict] = json.loads(users_info_json)
+    user_entities_dict: dict[int, "UserEntity"] = {}
+    tasks: dict[int, "asyncio.Task[dict[int, UserEntity]]"] = {}
+    missing_ids: list[int] = []
+    for user_id in dict.fromkeys(users_id):
+        user: "UserEntity | None" = _users_cache.get(user_id)
+        if user is not None:
+            user_entities_dict[user_id] = user
+        elif user_id in _pending:
+            tasks[user_id] = _pending[user_id]
+        else:
+            missing_ids.append(user_id)
 
-    user_entities_dict: dict[int, "UserEntity"] = {
-        user["id"]: UserEntity.model_validate(user) for user in users_info
-    }
+    if missing_ids:
+        task: "asyncio.Task[dict[int, UserEntity]]" = asyncio.create_task(_fetch_users(missing_ids))
+        task.add_done_callback(lambda done: _on_fetched(missing_ids, done))
+        for user_id in missing_ids:
+            _pending[user_id] = task
+            tasks[user_id] = task
+    logger.debug(f"cached: {len(user_entities_dict)}, pending: {len(tasks) - len(missing_ids)}, "
+                 f"requested: {len(missing_ids)}")
 
+    for task in set(tasks.values()):
+        # A cancelled caller doesn't cancel the request other callers wait for.
+        fetched: dict[int, "UserEntity"] = await asyncio.shield(task)
+        user_entities_dict.update(
+            (user_id, user) for user_id, user in fetched.items() if tasks.get(user_id) is task
+        )
     return user_entities_dict
@@ -1,3 +1,6 @@
+# Standard lib
+from datetime import datetime
+
 # SQLAlchemy
 from sqlalchemy import select, update
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
@@ -16,7 +19,8 @@ from .tags import TagRepository
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from sqlalchemy import Update, Result
+    from collections.abc import Collection
+    from sqlalchemy import Select, Update, Result
     from sqlalchemy.ext.asyncio import AsyncSession
 
 
@@ -35,3 +39,40 @@ class ArtRepository(SQLAlchemyRepository):
         async with self.transaction():
             result: "ø" = await self._session.execute(stmt)
         return result.rowcount
+
+    async def find_expiring_urls(
+            self,
+            generated_before: datetime,
+            limit: int,
+            exclude_ids: "Collection[int]" = (),
+    ) -> list[tuple[int, str]]:
+        """
+        Find the arts whose URL was signed before a moment, oldest first.
+
+        :param generated_before: The arts with an older `url_generated_at` are returned.
+        :param limit: The maximum number of arts to return.
+        :param exclude_ids: IDs of arts to leave out, e.g. the ones that already failed to sign.
+        :return: The ID and the blob name of every art.
+        """
+        # noinspection PyTypeChecker
+        stmt: "Select" = (
+            select(self.model.id, self.model.blob_name)
+            .where(self.model.url_generated_at < generated_before)
+            .order_by(self.model.url_generated_at, self.model.id)
+            .limit(limit)
+        )
+        if exclude_ids:
+            stmt = stmt.where(self.model.id.not_in(list(exclude_ids)))
+        result: "Result" = await self._session.execute(stmt)
+        return [(art_id, blob_name) for art_id, blob_name in result.all()]
+
+    async def update_urls(self, urls: list[dict]) -> None:
+        """
+        Write back re-signed URLs in one bulk UPDATE by primary key.
+
+        :param urls: Dictionaries with the `id`, `url` and `url_generated_at` of every art.
+        """
+        if not urls:
+            return
+        async with self.transaction():
+            await self._session.execute(update(self.model), urls)
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from .base import CustomBaseModel
 
 
@@ -19,3 +21,36 @@ class S3GetSchema(CustomBaseModel):
 class S3GetResponse(CustomBaseModel):
     status: int | None = None
     img_url: str | None = None
+
+
+class ExclusionSpecSchema(CustomBaseModel):
+    user_id: int  # the arts this user has already seen are not returned
+    liked: bool = True
+    saved: bool = True
+    own: bool = False  # the arts the user uploaded
+
+
+class SimilarityGetSchema(CustomBaseModel):
+    art_id: int
+    offset: int = 0
+    limit: int | None = None  # None returns every similar art
+    exclude: list[int] = []
+    exclude_for: ExclusionSpecSchema | None = None
+    engine: Literal["tags"] | None = None  # "tags" ranks by shared tags, None by the configured engine
+
+
+class SimilarityBatchGetSchema(CustomBaseModel):
+    art_ids: list[int]  # seed arts, e.g. the arts a user liked
+    weights: list[float] | None = None  # one per seed, 1 each if None
+    offset: int = 0
+    limit: int | None = None
+    exclude: list[int] = []
+    exclude_for: ExclusionSpecSchema | None = None
+
+
+class ForYouGetSchema(CustomBaseModel):
+    user_id: int
+    offset: int = 0
+    limit: int | None = None
+    exclude: list[int] = []
+    exclude_for: ExclusionSpecSchema | None = None
@@ -1,4 +1,5 @@
 # Standard libraries
+import random
 from datetime import datetime, timezone
 from typing import TYPE_CHECKING
 
@@ -13,10 +14,13 @@ from exceptions.http_exc import (
     ArtNotFoundHTTPException,
     InternalServerErrorHTTPException,
 )
-from rabbit.similarity_client import run_similarity_client
+from rabbit.events import publish_art_created
+from rabbit.rpc_client import RpcError, rpc_stats
+from rabbit.similarity_client import run_for_you_client, run_similarity_client
 from rabbit.users_client import run_users_client
 from schemas.arts import (ArtCreateDTO, ArtEntity, ArtGetResponseFull, ArtGetResponseShort,
                           ArtPostSchema)
+from schemas.rabbit_ import ExclusionSpecSchema
 
 if TYPE_CHECKING:
     from repositories.arts import ArtRepository
@@ -42,65 +46,6 @@ class BaseArtsService:
 
 
 class ArtsGetService(BaseArtsService):
-    SIX_DAYS_IN_SECONDS: int = 6 * 24 * 3600
-
-    async def _refresh_art_url_if_needed(self, art: "ArtEntity") -> "ArtEntity":
-        """
-        Refresh the art URL if it is older than 6 days.
-
-        This method checks the age of the art URL. If the URL is older than 6 days,
-        a new URL is generated and both the URL and the timestamp are updated in the database.
-
-        :param art: The art entity to check and potentially update.
-        :return: The updated art entity with a refreshed URL, or the original if no refresh was needed.
-        :raises InternalServerErrorHTTPException: If there is an error generating the new URL or updating the database.
-        """
-
-        generated_at_dt: datetime = art.url_generated_at
-        current_dt: datetime = datetime.now(tz=timezone.utc)
-        current_dt: datetime = current_dt.replace(tzinfo=None)
-        # With tzinfo it raises exceptions, IDK why, just don't touch it.
-
-        dt_diff_in_seconds: float = (current_dt - generated_at_dt).total_seconds()
-        if dt_diff_in_seconds > self.SIX_DAYS_IN_SECONDS:
-            try:
-                art_new_url: str = s3_service.create_url(art.blob_name)
-            except GoogleCloudError as err:
-                logger.error("Error: {err}")
-                raise InternalServerErrorHTTPException from err
-            to_refresh: dict = {
-                "url": art_new_url,
-                "url_generated_at": current_dt,
-            }
-            new_art: "ArtEntity" = art.model_copy()
-            new_art.url = art_new_url
-            new_art.url_generated_at = current_dt
-            try:
-                await self.art_repo.update_one(model_id=art.id, data=to_refresh)
-            except SQLAlchemyError as err:
-                logger.critical("Error: {err}")
-                logger.debug(f"model_id: {art.id}; to_refresh: {to_refresh}")
-                raise InternalServerErrorHTTPException from err
-            return new_art
-        return art
-
-    async def _refresh_arts_url_if_needed(self, arts: list["ArtEntity"]) -> list["ArtEntity"]:
-        """
-        Refresh URLs for a list of art entities if they are outdated.
-
-        Iterates through the given list of arts, checking each for URL expiration
-        and refreshing them as needed.
-
-        :param arts: A list of art entities to check and refresh.
-        :return: A list of updated art entities.
-        """
-        logger.info(f"STARTED _refresh_arts_url_if_needed")
-        result: "list[ArtEntity]" = []
-        for art in arts:
-            refreshed_art: "ArtEntity" = await self._refresh_art_url_if_needed(art)
-            result.append(refreshed_art)
-        return result
-
     async def _increase_views_count(self, art_id: int | None) -> None:
         """
         Increment the view count of a specific art by 1.
@@ -177,7 +122,7 @@ class ArtsGetService(BaseArtsService):
 
         If `art_id` is provided, retrieves the art with that specific ID.
         Otherwise, retrieves all arts with optional pagination and tag inclusion.
-        If the URLs of the arts are outdated, they are refreshed.
+        The signed URLs are kept fresh by `services.url_rotation`.
         Optionally retrieves the like status of the arts for a specific user.
 
         Note: The `art_id` parameter can also accept a list of integers. However, this functionality
@@ -220,7 +165,6 @@ class ArtsGetService(BaseArtsService):
             )
             raise InternalServerErrorHTTPException from err
 
-        all_arts: list["ArtEntity"] = await self._refresh_arts_url_if_needed(arts=all_arts)
         result: "list[ArtGetResponseShort | ArtGetResponseFull]" = await self._get_prepared_out_arts(
             arts=all_arts, user_id=include_likes_for_user_id, is_one_art=isinstance(art_id, int),
         )
@@ -232,6 +176,7 @@ class ArtsGetService(BaseArtsService):
                                offset: int | None = None,
                                limit: int | None = None,
                                include_likes_for_user_id: int | None = None,
+                               exclude_seen: bool = False,
                                ) -> list:
         """
         Retrieve a list of arts similar to the specified art.
@@ -245,25 +190,114 @@ class ArtsGetService(BaseArtsService):
         :param offset: The number of arts to skip for pagination. Defaults to None.
         :param limit: The maximum number of arts to retrieve. Defaults to None.
         :param include_likes_for_user_id: The ID of the user for whom the like status should be included. Defaults to None.
+        :param exclude_seen: Whether to leave out the arts `include_likes_for_user_id` liked, saved or uploaded.
+            Defaults to False.
 
-        :return: A list of similar arts or random arts if `art_id` is not found.
+        :return: A list of similar arts, or random arts if `art_id` is not found or the
+            recommendations service misses its deadline or fails without a cached reply.
         :raises InternalServerErrorHTTPException: If an error occurs while retrieving arts.
         """
         logger.info(f"STARTED art_id = {art_id}")
-        similar_art_ids: list[int] = await run_similarity_client(art_id=art_id)
-        if offset is None:
-            offset = 0
-        if limit is None:
-            limit = len(similar_art_ids)
-        similar_art_ids = similar_art_ids[offset:offset + limit]
+        # The page is cut by the recommendations service, only `limit` ids are transferred.
+        exclude_for: ExclusionSpecSchema | None = None
+        if exclude_seen and include_likes_for_user_id is not None:
+            exclude_for = ExclusionSpecSchema(user_id=include_likes_for_user_id, own=True)
+        try:
+            similar_art_ids: list[int] = await run_similarity_client(
+                art_id=art_id, offset=offset, limit=limit, exclude_for=exclude_for,
+            )
+        except RpcError as err:
+            return await self._get_random_arts_fallback(err, offset, limit, include_likes_for_user_id)
 
         logger.debug(f"similar_art_ids = {similar_art_ids}")
-        result: list = await self.get_arts(
-            art_id=similar_art_ids,
-            include_likes_for_user_id=include_likes_for_user_id
+        result: list = await self._get_ranked_arts(
+            art_ids=similar_art_ids,
+            include_likes_for_user_id=include_likes_for_user_id,
         )
         return result
 
+    async def get_for_you_arts(self,
+                               user_id: int,
+                               offset: int | None = None,
+                               limit: int | None = None,
+                               ) -> list:
+        """
+        Retrieve a personalized list of arts for the user.
+
+        The recommendations service ranks the arts by their similarity to the arts the user
+        liked and saved. Users without likes or saves get popular arts. The arts the user already
+        liked, saved or uploaded are left out.
+
+        :param user_id: The ID of the user the arts are recommended to.
+        :param offset: The number of arts to skip for pagination. Defaults to None.
+        :param limit: The maximum number of arts to retrieve. Defaults to None.
+
+        :return: A list of recommended arts, with the like status for the user. Random arts
+            if the recommendations service misses its deadline or fails without a cached reply.
+        :raises InternalServerErrorHTTPException: If an error occurs while retrieving arts.
+        """
+        logger.info(f"STARTED user_id = {user_id}")
+        try:
+            art_ids: list[int] = await run_for_you_client(
+                user_id=user_id,
+                offset=offset,
+                limit=limit,
+                exclude_for=ExclusionSpecSchema(user_id=user_id, own=True),
+            )
+        except RpcError as err:
+            return await self._get_random_arts_fallback(err, offset, limit, user_id)
+
+        logger.debug(f"art_ids = {art_ids}")
+        result: list = await self._get_ranked_arts(art_ids=art_ids, include_likes_for_user_id=user_id)
+        return result
+
+    async def _get_ranked_arts(self,
+                               art_ids: list[int],
+                               include_likes_for_user_id: int | None = None,
+                               ) -> list:
+        """
+        Retrieve a page of arts ranked by the recommendations service, in the order of the ranking.
+
+        :param art_ids: The IDs of the arts, best first.
+        :param include_likes_for_user_id: The ID of the user for whom the like status should be included.
+
+        :return: A list of arts in the order of `art_ids`, empty if `art_ids` is empty.
+        :raises InternalServerErrorHTTPException: If an error occurs while retrieving arts.
+        """
+        # An empty list would retrieve all arts, without a filter.
+        if not art_ids:
+            return []
+        arts: list = await self.get_arts(art_id=art_ids, include_likes_for_user_id=include_likes_for_user_id)
+        positions: dict[int, int] = {art_id: position for position, art_id in reversed(list(enumerate(art_ids)))}
+        return sorted(arts, key=lambda art: positions[art.id])
+
+    async def _get_random_arts_fallback(self,
+                                        err: RpcError,
+                                        offset: int | None,
+                                        limit: int | None,
+                                        include_likes_for_user_id: int | None,
+                                        ) -> list:
+        """
+        Serve a page of random arts in place of recommendations that missed their deadline or failed.
+
+        :param err: The timeout or error reply of the recommendations request.
+        :param offset: The number of arts to skip for pagination.
+        :param limit: The maximum number of arts to retrieve.
+        :param include_likes_for_user_id: The ID of the user for whom the like status should be included.
+
+        :return: A list of random arts.
+        """
+        logger.warning(f"{err}, serving random arts")
+        rpc_stats.record_fallback(f"{err.routing_key}:random")
+        # A zero seed would skip the random ordering.
+        random_seed: float = random.uniform(-1, 1) or 1.0
+        return await self.get_arts(
+            offset=offset,
+            limit=limit,
+            include_likes_for_user_id=include_likes_for_user_id,
+            random_seed=random_seed,
+        )
+
 
 class ArtsAddRepository(BaseArtsService):
     async def add_art(
@@ -286,6 +320,9 @@ class ArtsAddRepository(BaseArtsService):
         of tags with the art. It first checks if the tags already exist, creates any missing
         tags, and links them to the newly created art.
 
+        Finally, an `art_created` event is published, so the recommendations service can
+        recommend the art right away.
+
         :param art_data: A data structure containing all necessary information about the art
             being uploaded.
             - user_id (int): The ID of the user uploading the art. This is required for
@@ -348,6 +385,7 @@ class ArtsAddRepository(BaseArtsService):
         except SQLAlchemyError as err:
             logger.critical(f"Error: {err}")
             raise InternalServerErrorHTTPException from err
+        await publish_art_created(art_id=new_art_id)
         return new_art_id
 
 
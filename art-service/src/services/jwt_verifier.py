@@ -0,0 +1,118 @@
+# Standard libraries
+import asyncio
+import time
+from hashlib import sha256
+from typing import TYPE_CHECKING, Any
+
+# External libraries
+import jwt
+from cachetools import LRUCache
+from jwt.algorithms import RSAAlgorithm
+from jwt.exceptions import PyJWTError
+
+# Local modules
+from config import logger, settings
+from rabbit.jwt_client import run_jwks_client, run_jwt_client
+
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
+
+ACCESS_TOKEN_TYPE: str = "access"
+
+
+class JwtVerifier:
+    """
+    Verifies the access tokens of the auth service in process.
+
+    The public keys are fetched from the auth service over RabbitMQ and kept by their key id.
+    Tokens naming an unknown key id trigger a refresh, so rotated keys are picked up without
+    a restart. Verified tokens are kept in an LRU cache keyed by their hash until they expire.
+    While no keys could be fetched yet, tokens are verified by the auth service.
+    """
+
+    def __init__(self):
+        self.keys: dict[str, "RSAPublicKey"] = {}
+        # Id of the key signing new tokens, used for tokens without a key id.
+        self.signing_key_id: str | None = None
+        self._fetched_at: float | None = None
+        self._refresh_lock: asyncio.Lock = asyncio.Lock()
+        self._verified: LRUCache = LRUCache(maxsize=settings.jwt.token_cache_size)
+
+    async def refresh_keys(self) -> None:
+        """
+        Fetches the published keys, at most once per `settings.jwt.jwks_min_refresh_seconds`.
+        The known keys are kept if the auth service doesn't answer.
+        """
+        async with self._refresh_lock:
+            now: float = time.monotonic()
+            if self._fetched_at is not None and now - self._fetched_at < settings.jwt.jwks_min_refresh_seconds:
+                return
+            self._fetched_at = now
+            try:
+                jwks: dict = await run_jwks_client()
+                keys: dict[str, "RSAPublicKey"] = {
+                    jwk["kid"]: RSAAlgorithm.from_jwk(jwk) for jwk in jwks["keys"]
+                }
+            except Exception as err:
+                logger.error(f"Failed to fetch the public keys, keeping {len(self.keys)}: {err}")
+                return
+            self.keys = keys
+            self.signing_key_id = next(iter(keys), None)
+            logger.info(f"Public keys: {list(keys)}")
+
+    async def _get_key(self, key_id: str | None) -> "RSAPublicKey | None":
+        is_stale: bool = (
+            self._fetched_at is None
+            or time.monotonic() - self._fetched_at > settings.jwt.jwks_ttl_seconds
+        )
+        if is_stale or (key_id is not None and key_id not in self.keys):
+            await self.refresh_keys()
+        return self.keys.get(key_id or self.signing_key_id)
+
+    async def verify(self, token: str) -> dict[str, "Any"] | None:
+        """
+        Verifies an access token.
+
+        :param token: The bearer token.
+        :return: The claims of the token, or None if it is invalid, expired or not an access token.
+        """
+        if not settings.jwt.verify_locally:
+            return await self._verify_remotely(token)
+
+        cache_key: bytes = sha256(token.encode()).digest()
+        claims: dict | None = self._verified.get(cache_key)
+        if claims is not None:
+            if claims.get("exp", 0) > time.time():
+                return claims
+            self._verified.pop(cache_key, None)
+
+        try:
+            key_id: str | None = jwt.get_unverified_header(token).get("kid")
+        except PyJWTError as err:
+            logger.info(f"Malformed token: {err}")
+            return None
+        key: "RSAPublicKey | None" = await self._get_key(key_id)
+        if key is None:
+            if not self.keys:
+                return await self._verify_remotely(token)
+            logger.info(f"Unknown key id: {key_id}")
+            return None
+
+        try:
+            claims = jwt.decode(token, key=key, algorithms=[settings.jwt.algorithm])
+        except PyJWTError as err:
+            logger.info(f"JWT decoding failed: {err}")
+            return None
+        if claims.get("type") != ACCESS_TOKEN_TYPE:
+            logger.info(f"Incorrect token type, expected: {ACCESS_TOKEN_TYPE} received: {claims.get('type')}")
+            return None
+        self._verified[cache_key] = claims
+        return claims
+
+    @staticmethod
+    async def _verify_remotely(token: str) -> dict[str, "Any"] | None:
+        jwt_response: dict = await run_jwt_client(body=token)
+        return jwt_response["decoded"] if jwt_response["is_valid"] else None
+
+
+jwt_verifier: JwtVerifier = JwtVerifier()
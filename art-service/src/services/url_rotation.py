@@ -0,0 +1,96 @@
+# Standard libraries
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+# External libraries
+from google.cloud.exceptions import GoogleCloudError
+
+# Local modules
+from bucket.s3_service import s3_service
+from config import logger, settings
+from database.db import db_manager
+from repositories.arts import ArtRepository
+
+# Signing is CPU-bound RSA work of the Google client, done off the event loop.
+_signing_executor: ThreadPoolExecutor = ThreadPoolExecutor(
+    max_workers=settings.s3.url_rotation_workers, thread_name_prefix="url-signing",
+)
+
+
+async def _sign_urls(arts: list[tuple[int, str]], generated_at: datetime) -> list[dict]:
+    """
+    Sign new URLs for a batch of arts in the thread pool.
+
+    :param arts: The ID and the blob name of every art.
+    :param generated_at: The `url_generated_at` to store with the new URLs.
+    :return: The rows for `ArtRepository.update_urls`. Arts whose URL could not be signed are left out.
+    """
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    urls: list[str | BaseException] = await asyncio.gather(
+        *(loop.run_in_executor(_signing_executor, s3_service.create_url, blob_name) for _, blob_name in arts),
+        return_exceptions=True,
+    )
+    rows: list[dict] = []
+    for (art_id, blob_name), url in zip(arts, urls):
+        if isinstance(url, GoogleCloudError):
+            logger.error(f"URL of art_id = {art_id} not signed, blob_name: {blob_name}: {url}")
+        elif isinstance(url, BaseException):
+            raise url
+        else:
+            rows.append({"id": art_id, "url": url, "url_generated_at": generated_at})
+    return rows
+
+
+async def rotate_expiring_urls() -> int:
+    """
+    Re-sign the URLs of all arts that expire within `settings.s3.url_refresh_margin_hours`.
+
+    The arts are processed in batches of `settings.s3.url_rotation_batch_size`, oldest URL first.
+    Every batch is signed in the thread pool and written back with one bulk UPDATE. Arts whose
+    URL could not be signed are skipped for the rest of the run, so they don't hold back the others.
+
+    :return: The number of re-signed URLs.
+    """
+    config = settings.s3
+    # Stored without tzinfo, like every `url_generated_at`.
+    now: datetime = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+    generated_before: datetime = now - timedelta(days=config.expiration_days) + timedelta(
+        hours=config.url_refresh_margin_hours
+    )
+    n_rotated: int = 0
+    # Arts that failed to sign are still expiring and would be found again, they are left to the next run.
+    failed_ids: set[int] = set()
+    async with db_manager.async_session_maker() as session:
+        art_repo: ArtRepository = ArtRepository(session)
+        while True:
+            arts: list[tuple[int, str]] = await art_repo.find_expiring_urls(
+                generated_before=generated_before, limit=config.url_rotation_batch_size, exclude_ids=failed_ids,
+            )
+            if not arts:
+                break
+            rows: list[dict] = await _sign_urls(arts, generated_at=now)
+            await art_repo.update_urls(rows)
+            n_rotated += len(rows)
+            signed_ids: set[int] = {row["id"] for row in rows}
+            failed_ids.update(art_id for art_id, _ in arts if art_id not in signed_ids)
+            logger.info(f"Re-signed {len(rows)} of {len(arts)} URLs")
+            if len(arts) < config.url_rotation_batch_size:
+                break
+    if failed_ids:
+        logger.warning(f"{len(failed_ids)} URLs not re-signed, art_ids: {sorted(failed_ids)}")
+    return n_rotated
+
+
+async def url_rotation_job() -> None:
+    """Run `rotate_expiring_urls` every `settings.s3.url_rotation_interval_seconds`, the first time at once."""
+    while True:
+        try:
+            n_rotated: int = await rotate_expiring_urls()
+            logger.info(f"URL rotation finished, n_rotated = {n_rotated}")
+        except asyncio.CancelledError:
+            logger.info("URL rotation task was cancelled.")
+            raise
+        except Exception as err:
+            logger.critical(f"URL rotation failed: {err}", exc_info=True)
+        await asyncio.sleep(settings.s3.url_rotation_interval_seconds)
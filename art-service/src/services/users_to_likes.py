@@ -4,6 +4,7 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from config import logger
 from exceptions.http_exc import ArtNotFoundHTTPException, InternalServerErrorHTTPException
+from rabbit.events import publish_user_activity
 from schemas.user_to_likes import UsersToLikesCreateDTO
 
 if TYPE_CHECKING:
@@ -52,6 +53,7 @@ class UsersToLikesService:
                 logger.debug(f"liked_rowcount: {liked_rowcount}")
             except SQLAlchemyError as err:
                 raise InternalServerErrorHTTPException from err
+            await publish_user_activity(user_id=user_id, art_id=art_id, action="like")
         return bool(result_rowcount)
 
     async def delete_from_liked(self, user_id: int, art_id: int) -> bool:
@@ -70,4 +72,5 @@ class UsersToLikesService:
                 logger.debug(f"disliked_rowcount: {disliked_rowcount}")
             except SQLAlchemyError as err:
                 raise InternalServerErrorHTTPException from err
+            await publish_user_activity(user_id=user_id, art_id=art_id, action="unlike")
         return bool(result_rows)
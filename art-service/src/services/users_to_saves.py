@@ -4,6 +4,7 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from config import logger
 from exceptions.http_exc import ArtNotFoundHTTPException, InternalServerErrorHTTPException
+from rabbit.events import publish_user_activity
 from schemas.user_to_saves import UsersToSavesCreateDTO
 
 if TYPE_CHECKING:
@@ -46,6 +47,8 @@ class UsersToSavesService:
             logger.info(f"Finished save_art(), rowcount={result_rowcount}")
         except SQLAlchemyError as err:
             raise InternalServerErrorHTTPException from err
+        if result_rowcount > 0:
+            await publish_user_activity(user_id=user_id, art_id=art_id, action="save")
         return bool(result_rowcount)
 
     async def get_saved_arts(self,
@@ -88,4 +91,6 @@ class UsersToSavesService:
         to_delete: dict = {"user_id": user_id, "art_id": art_id}
         logger.debug(f"to_delete: {to_delete}")
         result_rows: int = await self.repo.delete_one(to_delete)
+        if result_rows > 0:
+            await publish_user_activity(user_id=user_id, art_id=art_id, action="unsave")
         return bool(result_rows)
@@ -97,6 +97,12 @@ class TestArtsGet:
         assert len(art["tags"]) == 3
 
 
+class TestArtsForYou:
+    async def test_without_token(self, async_client: "AsyncClient") -> None:
+        response: "Response" = await async_client.get(f"{arts_url}/for-you")
+        assert response.status_code == 401
+
+
 # TODO: Test, moderator deletes an art of another user
 class TestArtsDelete:
     async def test_without_token(
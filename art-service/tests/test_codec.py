@@ -0,0 +1,113 @@
+from io import BytesIO
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.rabbit import codec
+from src.rabbit import s3_server as s3_server_module
+from src.rabbit.s3_server import S3RpcAddServer
+
+
+def make_message(body: bytes, content_type: str | None, headers: dict | None = None) -> SimpleNamespace:
+    return SimpleNamespace(body=body, content_type=content_type, headers=headers)
+
+
+class TestRoundTrip:
+    @pytest.mark.parametrize("content_type", [codec.JSON, codec.MSGPACK])
+    @pytest.mark.parametrize("data", [
+        {"art_id": 5, "limit": 10, "offset": 0},
+        {"users_id": [1, 2, 3], "nested": {"name": "user", "ok": True}},
+        [1, 2, 3],
+        "text",
+    ])
+    def test_structured(self, content_type: str, data) -> None:
+        assert codec.decode(codec.encode(data, content_type), content_type) == data
+
+    @pytest.mark.parametrize("content_type", [codec.JSON, codec.MSGPACK])
+    def test_structured_numpy_array(self, content_type: str) -> None:
+        data: np.ndarray = np.array([7, 2, 9], dtype=np.int64)
+        assert codec.decode(codec.encode(data, content_type), content_type) == [7, 2, 9]
+
+    @pytest.mark.parametrize("data", [[], [1, 2, 3], [2 ** 31 - 1, -2 ** 31, 0]])
+    def test_int32_array(self, data: list[int]) -> None:
+        body: bytes = codec.encode(data, codec.INT32_ARRAY)
+        assert len(body) == 4 * len(data)
+        assert codec.decode(body, codec.INT32_ARRAY) == data
+
+    def test_int32_array_is_little_endian(self) -> None:
+        assert codec.encode(np.array([1, 256]), codec.INT32_ARRAY) == b"\x01\x00\x00\x00\x00\x01\x00\x00"
+
+    def test_octet_stream(self) -> None:
+        data: bytes = bytes(range(256))
+        assert codec.decode(codec.encode(data, codec.OCTET_STREAM), codec.OCTET_STREAM) == data
+
+
+class TestContentType:
+    def test_missing_content_type_is_json(self) -> None:
+        assert codec.is_json(None)
+        assert codec.decode(b'{"art_id": 5}', None) == {"art_id": 5}
+
+    def test_unknown_content_type(self) -> None:
+        with pytest.raises(ValueError):
+            codec.encode([1, 2], "text/csv")
+        with pytest.raises(ValueError):
+            codec.decode(b"1,2", "text/csv")
+
+    @pytest.mark.parametrize(("message", "expected"), [
+        (make_message(b"", codec.OCTET_STREAM, {codec.ACCEPT_HEADER: codec.MSGPACK}), codec.MSGPACK),
+        (make_message(b"", codec.MSGPACK, {codec.ACCEPT_HEADER: codec.INT32_ARRAY.encode()}), codec.INT32_ARRAY),
+        (make_message(b"", codec.MSGPACK, None), codec.MSGPACK),
+        (make_message(b"", codec.OCTET_STREAM, {}), codec.JSON),
+        (make_message(b"", None, None), codec.JSON),
+    ])
+    def test_reply_content_type(self, message: SimpleNamespace, expected: str) -> None:
+        assert codec.get_reply_content_type(message) == expected
+
+
+class FakeS3Service:
+    def __init__(self):
+        self.uploaded: dict[str, bytes] = {}
+        self.image_types: list[str] = []
+
+    async def convert_image_file_to_jpg(self, image_file: BytesIO, image_type: str) -> BytesIO:
+        self.image_types.append(image_type)
+        return image_file
+
+    def upload_file(self, file_obj: BytesIO, blob_name: str) -> str:
+        self.uploaded[blob_name] = file_obj.getvalue()
+        return blob_name
+
+
+@pytest.fixture
+def s3_service(monkeypatch) -> FakeS3Service:
+    s3_service: FakeS3Service = FakeS3Service()
+    monkeypatch.setattr(s3_server_module, "s3_service", s3_service)
+    return s3_service
+
+
+class TestImageHeaders:
+    async def test_raw_image_with_headers(self, s3_service: FakeS3Service) -> None:
+        img_bytes: bytes = b"\x89PNG\r\n\x1a\n" + bytes(range(64))
+        message: SimpleNamespace = make_message(
+            img_bytes,
+            codec.OCTET_STREAM,
+            {"img_type": "image/png", "blob_name": "avatar_1", codec.ACCEPT_HEADER: codec.MSGPACK},
+        )
+        response, content_type = await S3RpcAddServer().handle(message)
+        assert content_type == codec.MSGPACK
+        assert codec.decode(response, content_type) == {
+            "status": s3_server_module.settings.project_statuses.success,
+            "blob_name": "avatar_1",
+        }
+        assert s3_service.uploaded == {"avatar_1": img_bytes}
+        assert s3_service.image_types == ["image/png"]
+
+    async def test_missing_header(self, s3_service: FakeS3Service) -> None:
+        message: SimpleNamespace = make_message(b"img", codec.OCTET_STREAM, {"img_type": "image/png"})
+        response, content_type = await S3RpcAddServer().handle(message)
+        assert content_type == codec.JSON
+        assert codec.decode(response, content_type)["status"] == (
+            s3_server_module.settings.project_statuses.validation_error
+        )
+        assert s3_service.uploaded == {}
@@ -0,0 +1,164 @@
+import time
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+from src.services import jwt_verifier as jwt_verifier_module
+from src.services.jwt_verifier import JwtVerifier
+
+if TYPE_CHECKING:
+    from typing import Any
+
+
+class KeyPair:
+    def __init__(self, kid: str):
+        self.kid: str = kid
+        self.private_key: rsa.RSAPrivateKey = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.jwk: dict = RSAAlgorithm.to_jwk(self.private_key.public_key(), as_dict=True) | {"kid": kid}
+
+    def sign(self, token_type: str = "access", expires_in: float = 300, **claims: "Any") -> str:
+        payload: dict = {"type": token_type, "sub": "1", "exp": int(time.time() + expires_in), **claims}
+        return jwt.encode(payload=payload, key=self.private_key, algorithm="RS256", headers={"kid": self.kid})
+
+
+class FakeAuthService:
+    """The JWKS and JWT RPCs of the auth service, with call counters."""
+
+    def __init__(self, keys: list[KeyPair]):
+        self.keys: list[KeyPair] = keys
+        self.available: bool = True
+        self.jwks_requests: int = 0
+        self.jwt_requests: list[str] = []
+
+    async def run_jwks_client(self) -> dict:
+        self.jwks_requests += 1
+        if not self.available:
+            raise TimeoutError("No reply to jwks_request")
+        return {"keys": [key.jwk for key in self.keys]}
+
+    async def run_jwt_client(self, body: str) -> dict:
+        self.jwt_requests.append(body)
+        return {"is_valid": True, "decoded": {"type": "access", "sub": "remote"}}
+
+
+class DecodeCounter:
+    def __init__(self):
+        self.calls: int = 0
+        self.decode = jwt.decode
+
+    def __call__(self, *args: "Any", **kwargs: "Any") -> dict:
+        self.calls += 1
+        return self.decode(*args, **kwargs)
+
+
+@pytest.fixture
+def signing_key() -> KeyPair:
+    return KeyPair("key-1")
+
+
+@pytest.fixture
+def auth_service(monkeypatch, signing_key: KeyPair) -> FakeAuthService:
+    auth_service: FakeAuthService = FakeAuthService([signing_key])
+    monkeypatch.setattr(jwt_verifier_module, "run_jwks_client", auth_service.run_jwks_client)
+    monkeypatch.setattr(jwt_verifier_module, "run_jwt_client", auth_service.run_jwt_client)
+    monkeypatch.setattr(jwt_verifier_module.settings.jwt, "verify_locally", True)
+    monkeypatch.setattr(jwt_verifier_module.settings.jwt, "jwks_min_refresh_seconds", 30)
+    return auth_service
+
+
+@pytest.fixture
+def decode_counter(monkeypatch) -> DecodeCounter:
+    decode_counter: DecodeCounter = DecodeCounter()
+    monkeypatch.setattr(jwt_verifier_module.jwt, "decode", decode_counter)
+    return decode_counter
+
+
+class TestCache:
+    async def test_cached_until_exp(self, monkeypatch, auth_service, signing_key, decode_counter) -> None:
+        verifier: JwtVerifier = JwtVerifier()
+        token: str = signing_key.sign(expires_in=60)
+        assert (await verifier.verify(token))["sub"] == "1"
+        assert (await verifier.verify(token))["sub"] == "1"
+        assert decode_counter.calls == 1
+
+        # Past its exp the cached claims are dropped and the token is verified again.
+        after_exp: SimpleNamespace = SimpleNamespace(time=lambda: time.time() + 120, monotonic=time.monotonic)
+        monkeypatch.setattr(jwt_verifier_module, "time", after_exp)
+        assert (await verifier.verify(token))["sub"] == "1"
+        assert decode_counter.calls == 2
+
+    async def test_invalid_token_is_not_cached(self, auth_service, signing_key, decode_counter) -> None:
+        verifier: JwtVerifier = JwtVerifier()
+        token: str = signing_key.sign(expires_in=-10)
+        assert await verifier.verify(token) is None
+        assert await verifier.verify(token) is None
+        assert decode_counter.calls == 2
+
+
+class TestKeys:
+    async def test_unknown_kid_refreshes_keys(self, auth_service, signing_key) -> None:
+        verifier: JwtVerifier = JwtVerifier()
+        assert await verifier.verify(signing_key.sign()) is not None
+        assert auth_service.jwks_requests == 1
+
+        # The auth service rotated its key, the old one is retired.
+        new_key: KeyPair = KeyPair("key-2")
+        auth_service.keys = [new_key, signing_key]
+        verifier._fetched_at -= 60
+        assert (await verifier.verify(new_key.sign()))["sub"] == "1"
+        assert auth_service.jwks_requests == 2
+        assert verifier.signing_key_id == "key-2"
+        assert await verifier.verify(signing_key.sign(jti="retired")) is not None
+        assert auth_service.jwks_requests == 2
+
+    async def test_unknown_kid_refresh_is_rate_limited(self, auth_service, signing_key) -> None:
+        verifier: JwtVerifier = JwtVerifier()
+        assert await verifier.verify(signing_key.sign()) is not None
+        unknown_key: KeyPair = KeyPair("unknown")
+        assert await verifier.verify(unknown_key.sign()) is None
+        assert await verifier.verify(unknown_key.sign(jti="again")) is None
+        assert auth_service.jwks_requests == 1
+        assert auth_service.jwt_requests == []
+
+    async def test_wrong_signature(self, auth_service, signing_key) -> None:
+        verifier: JwtVerifier = JwtVerifier()
+        forged: KeyPair = KeyPair(signing_key.kid)
+        assert await verifier.verify(forged.sign()) is None
+
+    async def test_wrong_token_type(self, auth_service, signing_key) -> None:
+        verifier: JwtVerifier = JwtVerifier()
+        assert await verifier.verify(signing_key.sign(token_type="refresh")) is None
+        assert auth_service.jwt_requests == []
+
+    async def test_malformed_token(self, auth_service) -> None:
+        verifier: JwtVerifier = JwtVerifier()
+        assert await verifier.verify("not a token") is None
+
+
+class TestRemoteFallback:
+    async def test_no_keys_falls_back_to_auth_service(self, auth_service, signing_key) -> None:
+        auth_service.available = False
+        verifier: JwtVerifier = JwtVerifier()
+        token: str = signing_key.sign()
+        assert (await verifier.verify(token))["sub"] == "remote"
+        assert auth_service.jwt_requests == [token]
+
+    async def test_known_keys_are_kept_when_refresh_fails(self, auth_service, signing_key) -> None:
+        verifier: JwtVerifier = JwtVerifier()
+        assert await verifier.verify(signing_key.sign()) is not None
+        auth_service.available = False
+        verifier._fetched_at -= 60
+        assert await verifier.verify(KeyPair("unknown").sign()) is None
+        assert auth_service.jwks_requests == 2
+        assert (await verifier.verify(signing_key.sign(jti="other")))["sub"] == "1"
+        assert auth_service.jwt_requests == []
+
+    async def test_verify_remotely_when_disabled(self, monkeypatch, auth_service, signing_key) -> None:
+        monkeypatch.setattr(jwt_verifier_module.settings.jwt, "verify_locally", False)
+        verifier: JwtVerifier = JwtVerifier()
+        assert (await verifier.verify(signing_key.sign()))["sub"] == "remote"
+        assert auth_service.jwks_requests == 0
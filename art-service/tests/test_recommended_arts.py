@@ -0,0 +1,87 @@
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+import pytest
+
+# The services import the client as `rabbit.rpc_client`, its exception classes are caught by that module's identity.
+from rabbit.rpc_client import RpcRemoteError
+from src.schemas.arts import ArtEntity
+from src.services import arts as arts_module
+from src.services.arts import ArtsService
+
+if TYPE_CHECKING:
+    from typing import Any
+
+
+class FakeArtRepository:
+    """Returns the arts with the requested IDs in ID order, like `WHERE id IN (...)`."""
+
+    def __init__(self, art_ids: list[int]):
+        self.arts: list[ArtEntity] = [
+            ArtEntity(id=art_id, user_id=1, blob_name=f"blob_{art_id}", url=f"url_{art_id}",
+                      url_generated_at=datetime(2024, 1, 1), title=None)
+            for art_id in art_ids
+        ]
+        self.calls: list[dict] = []
+
+    async def find_all(self, filter_by: dict, **kwargs: "Any") -> list[ArtEntity]:
+        self.calls.append(filter_by)
+        if "id" not in filter_by:
+            return self.arts
+        return [art for art in self.arts if art.id in filter_by["id"]]
+
+
+class FakeLikesRepository:
+    async def find_all(self, filter_by: dict, **kwargs: "Any") -> list:
+        return []
+
+
+@pytest.fixture
+def art_repo() -> FakeArtRepository:
+    return FakeArtRepository(art_ids=list(range(1, 11)))
+
+
+@pytest.fixture
+def arts_service(art_repo: FakeArtRepository) -> ArtsService:
+    return ArtsService(
+        art_repo=art_repo,
+        art_to_tag_repo=None,
+        tag_repo=None,
+        user_to_likes_repo=FakeLikesRepository(),
+    )
+
+
+def mock_ranking(monkeypatch, ranked_ids: list[int]) -> None:
+    async def run_client(*args: "Any", **kwargs: "Any") -> list[int]:
+        return ranked_ids
+
+    monkeypatch.setattr(arts_module, "run_similarity_client", run_client)
+    monkeypatch.setattr(arts_module, "run_for_you_client", run_client)
+
+
+class TestRankedArts:
+    async def test_similar_arts_keep_ranking(self, monkeypatch, arts_service, art_repo) -> None:
+        mock_ranking(monkeypatch, [7, 2, 9, 4])
+        result: list = await arts_service.get_similar_arts(art_id=1, limit=4)
+        assert [art.id for art in result] == [7, 2, 9, 4]
+
+    async def test_for_you_arts_keep_ranking(self, monkeypatch, arts_service, art_repo) -> None:
+        mock_ranking(monkeypatch, [10, 3, 5])
+        result: list = await arts_service.get_for_you_arts(user_id=1, limit=3)
+        assert [art.id for art in result] == [10, 3, 5]
+
+    async def test_empty_page(self, monkeypatch, arts_service, art_repo) -> None:
+        mock_ranking(monkeypatch, [])
+        assert await arts_service.get_similar_arts(art_id=1, offset=100, limit=10) == []
+        assert await arts_service.get_for_you_arts(user_id=1, offset=100, limit=10) == []
+        # The whole table must not be read without a filter.
+        assert art_repo.calls == []
+
+    async def test_error_reply_serves_random_arts(self, monkeypatch, arts_service, art_repo) -> None:
+        async def run_client(*args: "Any", **kwargs: "Any") -> list[int]:
+            raise RpcRemoteError("similarity_request", "ValueError: bad request")
+
+        monkeypatch.setattr(arts_module, "run_similarity_client", run_client)
+        monkeypatch.setattr(arts_module, "run_for_you_client", run_client)
+        assert len(await arts_service.get_similar_arts(art_id=1, limit=10)) == 10
+        assert len(await arts_service.get_for_you_arts(user_id=1, limit=10)) == 10
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+
+import pytest
+
+from src.rabbit import codec
+from src.rabbit import rpc_client as rpc_client_module
+from src.rabbit.rpc_client import RmqRpcClient, RpcError, RpcRemoteError, RpcTimeoutError
+
+if TYPE_CHECKING:
+    from typing import AsyncIterator, Callable
+
+ROUTING_KEY: str = "test_request"
+DEADLINE: float = 0.05
+
+
+class FakeReply:
+    def __init__(self, correlation_id: str, body: bytes, headers: dict | None = None):
+        self.correlation_id: str = correlation_id
+        self.body: bytes = body
+        self.content_type: str | None = None
+        self.headers: dict | None = headers
+        self.acked: bool = False
+
+    async def ack(self) -> None:
+        self.acked = True
+
+
+class FakeChannelPool:
+    """Records the published requests and hands each one to `responder`."""
+
+    def __init__(self, responder: "Callable"):
+        self.responder: "Callable" = responder
+        self.published: list = []
+        self.default_exchange: FakeChannelPool = self
+
+    @asynccontextmanager
+    async def acquire(self) -> "AsyncIterator[FakeChannelPool]":
+        yield self
+
+    async def publish(self, message, routing_key: str) -> None:
+        self.published.append(message)
+        self.responder(message)
+
+
+@pytest.fixture
+def client(monkeypatch) -> RmqRpcClient:
+    monkeypatch.setitem(rpc_client_module.settings.rmq.deadlines, ROUTING_KEY, DEADLINE)
+    client: RmqRpcClient = RmqRpcClient()
+    client.is_connected = True
+    client.callback_queue = SimpleNamespace(name="rpc_reply.test")
+    return client
+
+
+class TestReplyDispatch:
+    async def test_replies_reach_their_callers(self, client: RmqRpcClient) -> None:
+        def reply_reversed(message) -> None:
+            # Later requests are answered first.
+            delay: float = 0.01 / (1 + len(client.channel_pool.published))
+            reply: FakeReply = FakeReply(message.correlation_id, message.body[::-1])
+            asyncio.get_running_loop().call_later(delay, asyncio.ensure_future, client.on_response(reply))
+
+        client.channel_pool = FakeChannelPool(reply_reversed)
+        bodies: list[str] = [f"request {i}" for i in range(20)]
+        replies: list[str] = await asyncio.gather(*(client.call(body, ROUTING_KEY) for body in bodies))
+        assert replies == [body[::-1] for body in bodies]
+        assert client.futures == {}
+
+    async def test_request_carries_reply_queue_and_deadline(self, client: RmqRpcClient) -> None:
+        def reply(message) -> None:
+            asyncio.get_running_loop().call_soon(
+                asyncio.ensure_future, client.on_response(FakeReply(message.correlation_id, b"ok"))
+            )
+
+        client.channel_pool = FakeChannelPool(reply)
+        assert await client.call("ping", ROUTING_KEY) == "ok"
+        message = client.channel_pool.published[0]
+        assert message.reply_to == "rpc_reply.test"
+        assert message.expiration is not None
+
+    async def test_unknown_reply_is_acked_and_dropped(self, client: RmqRpcClient) -> None:
+        reply: FakeReply = FakeReply("unknown", b"late")
+        await client.on_response(reply)
+        assert reply.acked
+        assert client.futures == {}
+
+
+class TestTimeout:
+    async def test_timeout_removes_future(self, client: RmqRpcClient) -> None:
+        client.channel_pool = FakeChannelPool(lambda message: None)
+        timeouts: int = rpc_client_module.rpc_stats.timeouts[ROUTING_KEY]
+        with pytest.raises(RpcTimeoutError) as exc_info:
+            await client.call("ping", ROUTING_KEY)
+        assert exc_info.value.routing_key == ROUTING_KEY
+        assert exc_info.value.deadline == DEADLINE
+        assert client.futures == {}
+        assert rpc_client_module.rpc_stats.timeouts[ROUTING_KEY] == timeouts + 1
+
+    async def test_late_reply_after_timeout_is_dropped(self, client: RmqRpcClient) -> None:
+        client.channel_pool = FakeChannelPool(lambda message: None)
+        with pytest.raises(RpcTimeoutError):
+            await client.call("ping", ROUTING_KEY)
+        correlation_id: str = client.channel_pool.published[0].correlation_id
+        reply: FakeReply = FakeReply(correlation_id, b"late")
+        await client.on_response(reply)
+        assert reply.acked
+        assert client.futures == {}
+
+    async def test_cancelled_call_removes_future(self, client: RmqRpcClient) -> None:
+        client.channel_pool = FakeChannelPool(lambda message: None)
+        task: asyncio.Task = asyncio.create_task(client.call("ping", ROUTING_KEY))
+        await asyncio.sleep(0)
+        assert len(client.futures) == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert client.futures == {}
+
+
+class TestErrorReply:
+    async def test_error_reply_fails_fast(self, client: RmqRpcClient) -> None:
+        def reply_error(message) -> None:
+            # Like the recommendations service when its handler raises.
+            reply: FakeReply = FakeReply(message.correlation_id, b"", {codec.ERROR_HEADER: b"ValueError: bad request"})
+            asyncio.get_running_loop().call_soon(asyncio.ensure_future, client.on_response(reply))
+
+        client.channel_pool = FakeChannelPool(reply_error)
+        errors: int = rpc_client_module.rpc_stats.errors[ROUTING_KEY]
+        started_at: float = time.monotonic()
+        with pytest.raises(RpcRemoteError) as exc_info:
+            await client.call("ping", ROUTING_KEY)
+        assert time.monotonic() - started_at < DEADLINE
+        assert exc_info.value.routing_key == ROUTING_KEY
+        assert exc_info.value.detail == "ValueError: bad request"
+        assert isinstance(exc_info.value, RpcError)
+        assert not isinstance(exc_info.value, RpcTimeoutError)
+        assert client.futures == {}
+        assert rpc_client_module.rpc_stats.errors[ROUTING_KEY] == errors + 1
@@ -0,0 +1,165 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+
+import pytest
+from google.cloud.exceptions import GoogleCloudError
+
+from src.services import url_rotation
+from src.services.url_rotation import rotate_expiring_urls
+
+if TYPE_CHECKING:
+    from typing import AsyncIterator
+
+EXPIRATION_DAYS: int = 7
+MARGIN_HOURS: int = 24
+
+
+class FakeArtTable:
+    """Arts by ID, with `url_generated_at` stored without tzinfo like the database column."""
+
+    def __init__(self):
+        self.arts: dict[int, SimpleNamespace] = {}
+        self.updates: list[list[dict]] = []
+
+    def add(self, art_id: int, url_generated_at: datetime) -> None:
+        self.arts[art_id] = SimpleNamespace(
+            id=art_id, blob_name=f"blob_{art_id}", url=f"old_{art_id}", url_generated_at=url_generated_at,
+        )
+
+
+class FakeArtRepository:
+    def __init__(self, table: FakeArtTable):
+        self.table: FakeArtTable = table
+
+    async def find_expiring_urls(
+            self, generated_before: datetime, limit: int, exclude_ids: set[int] = frozenset(),
+    ) -> list[tuple[int, str]]:
+        expiring: list[SimpleNamespace] = sorted(
+            (
+                art for art in self.table.arts.values()
+                if art.url_generated_at < generated_before and art.id not in exclude_ids
+            ),
+            key=lambda art: (art.url_generated_at, art.id),
+        )
+        return [(art.id, art.blob_name) for art in expiring[:limit]]
+
+    async def update_urls(self, urls: list[dict]) -> None:
+        self.table.updates.append(urls)
+        for row in urls:
+            art: SimpleNamespace = self.table.arts[row["id"]]
+            art.url, art.url_generated_at = row["url"], row["url_generated_at"]
+
+
+class FakeS3Service:
+    def __init__(self):
+        self.failing_blobs: dict[str, Exception] = {}
+
+    def create_url(self, blob_name: str) -> str:
+        if blob_name in self.failing_blobs:
+            raise self.failing_blobs[blob_name]
+        return f"https://signed/{blob_name}"
+
+
+@pytest.fixture
+def table(monkeypatch) -> FakeArtTable:
+    table: FakeArtTable = FakeArtTable()
+
+    @asynccontextmanager
+    async def async_session_maker() -> "AsyncIterator[None]":
+        yield None
+
+    monkeypatch.setattr(url_rotation, "db_manager", SimpleNamespace(async_session_maker=async_session_maker))
+    monkeypatch.setattr(url_rotation, "ArtRepository", lambda session: FakeArtRepository(table))
+    monkeypatch.setattr(url_rotation.settings.s3, "expiration_days", EXPIRATION_DAYS)
+    monkeypatch.setattr(url_rotation.settings.s3, "url_refresh_margin_hours", MARGIN_HOURS)
+    return table
+
+
+@pytest.fixture
+def s3_service(monkeypatch) -> FakeS3Service:
+    s3_service: FakeS3Service = FakeS3Service()
+    monkeypatch.setattr(url_rotation, "s3_service", s3_service)
+    return s3_service
+
+
+def utc_now() -> datetime:
+    return datetime.now(tz=timezone.utc).replace(tzinfo=None)
+
+
+def expiring_at(hours_left: float) -> datetime:
+    """A naive UTC `url_generated_at` of a URL that expires in `hours_left` hours."""
+    return utc_now() - timedelta(days=EXPIRATION_DAYS) + timedelta(hours=hours_left)
+
+
+class TestRotateExpiringUrls:
+    async def test_only_urls_within_margin(self, table: FakeArtTable, s3_service: FakeS3Service) -> None:
+        table.add(1, expiring_at(hours_left=MARGIN_HOURS - 1))
+        table.add(2, expiring_at(hours_left=MARGIN_HOURS + 1))
+        table.add(3, expiring_at(hours_left=-1))
+        table.add(4, utc_now())
+
+        started_at: datetime = utc_now()
+        assert await rotate_expiring_urls() == 2
+        assert {art_id: art.url for art_id, art in table.arts.items()} == {
+            1: "https://signed/blob_1", 2: "old_2", 3: "https://signed/blob_3", 4: "old_4",
+        }
+        for art_id in (1, 3):
+            generated_at: datetime = table.arts[art_id].url_generated_at
+            assert generated_at.tzinfo is None
+            assert started_at <= generated_at <= utc_now()
+
+        # Re-signed URLs are fresh, the next run has nothing to do.
+        assert await rotate_expiring_urls() == 0
+
+    async def test_batches_oldest_first(self, monkeypatch, table: FakeArtTable, s3_service: FakeS3Service) -> None:
+        monkeypatch.setattr(url_rotation.settings.s3, "url_rotation_batch_size", 2)
+        for art_id in range(1, 6):
+            table.add(art_id, expiring_at(hours_left=art_id))
+        assert await rotate_expiring_urls() == 5
+        assert [[row["id"] for row in rows] for rows in table.updates] == [[1, 2], [3, 4], [5]]
+
+    async def test_failed_signing_skips_art(self, monkeypatch, table: FakeArtTable, s3_service: FakeS3Service) -> None:
+        monkeypatch.setattr(url_rotation.settings.s3, "url_rotation_batch_size", 3)
+        for art_id in range(1, 8):
+            table.add(art_id, expiring_at(hours_left=art_id))
+        s3_service.failing_blobs["blob_2"] = GoogleCloudError("signing failed")
+
+        # The failed art is skipped for the rest of the run, the arts after it are still rotated.
+        assert await rotate_expiring_urls() == 6
+        assert [[row["id"] for row in rows] for rows in table.updates] == [[1, 3], [4, 5, 6], [7]]
+        assert table.arts[2].url == "old_2"
+        assert all(table.arts[art_id].url == f"https://signed/blob_{art_id}" for art_id in (1, 3, 4, 5, 6, 7))
+
+        # It is retried on the next run.
+        s3_service.failing_blobs.clear()
+        assert await rotate_expiring_urls() == 1
+        assert all(art.url == f"https://signed/{art.blob_name}" for art in table.arts.values())
+
+    async def test_failing_oldest_art_does_not_block_rotation(
+            self, monkeypatch, table: FakeArtTable, s3_service: FakeS3Service,
+    ) -> None:
+        monkeypatch.setattr(url_rotation.settings.s3, "url_rotation_batch_size", 2)
+        for art_id in range(1, 6):
+            table.add(art_id, expiring_at(hours_left=art_id))
+        s3_service.failing_blobs["blob_1"] = GoogleCloudError("blob not found")
+        s3_service.failing_blobs["blob_2"] = GoogleCloudError("blob not found")
+
+        # A whole batch failing doesn't end the run either.
+        assert await rotate_expiring_urls() == 3
+        assert [[row["id"] for row in rows] for rows in table.updates] == [[], [3, 4], [5]]
+        assert table.arts[1].url == "old_1"
+        assert table.arts[2].url == "old_2"
+        # The failing arts stay the oldest, and the next run still gets past them.
+        table.add(6, expiring_at(hours_left=6))
+        assert await rotate_expiring_urls() == 1
+        assert table.arts[6].url == "https://signed/blob_6"
+
+    async def test_unexpected_error_is_raised(self, table: FakeArtTable, s3_service: FakeS3Service) -> None:
+        table.add(1, expiring_at(hours_left=1))
+        table.add(2, expiring_at(hours_left=2))
+        s3_service.failing_blobs["blob_2"] = ValueError("no credentials")
+        with pytest.raises(ValueError):
+            await rotate_expiring_urls()
+        assert table.updates == []
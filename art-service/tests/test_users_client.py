@@ -0,0 +1,132 @@
+import asyncio
+from typing import TYPE_CHECKING
+
+import pytest
+from cachetools import TTLCache
+
+from src.rabbit import users_client
+from src.rabbit.users_client import USERS_REQUEST, invalidate_users, run_users_client
+
+if TYPE_CHECKING:
+    from typing import Any
+
+
+class FakeAuthService:
+    """Answers `users_request` once `release` is called, with the current usernames."""
+
+    def __init__(self, known_ids: set[int]):
+        self.known_ids: set[int] = known_ids
+        self.usernames: dict[int, str] = {}
+        self.requests: list[list[int]] = []
+        self.gate: asyncio.Event = asyncio.Event()
+
+    def release(self) -> None:
+        self.gate.set()
+
+    async def run_rpc_client_data(self, data: list[int], routing_key: str, **kwargs: "Any") -> list[dict]:
+        assert routing_key == USERS_REQUEST
+        self.requests.append(list(data))
+        # The reply reflects the users at the time the auth service read them.
+        users: list[dict] = [self.get_user(user_id) for user_id in data if user_id in self.known_ids]
+        await self.gate.wait()
+        return users
+
+    def get_user(self, user_id: int) -> dict:
+        username: str = self.usernames.get(user_id, f"user_{user_id}")
+        return {"id": user_id, "username": username, "email": f"user{user_id}@example.com", "profile_image": None}
+
+
+@pytest.fixture
+def auth_service(monkeypatch) -> FakeAuthService:
+    auth_service: FakeAuthService = FakeAuthService(known_ids=set(range(1, 10)))
+    monkeypatch.setattr(users_client, "run_rpc_client_data", auth_service.run_rpc_client_data)
+    monkeypatch.setattr(users_client, "_users_cache", TTLCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(users_client, "_pending", {})
+    return auth_service
+
+
+async def wait_for_requests(auth_service: FakeAuthService, count: int) -> None:
+    while len(auth_service.requests) < count:
+        await asyncio.sleep(0)
+
+
+class TestCoalescing:
+    async def test_overlapping_callers_share_request(self, auth_service: FakeAuthService) -> None:
+        first: asyncio.Task = asyncio.create_task(run_users_client([1, 2]))
+        await wait_for_requests(auth_service, 1)
+        second: asyncio.Task = asyncio.create_task(run_users_client([2, 3]))
+        await wait_for_requests(auth_service, 2)
+        auth_service.release()
+
+        assert sorted(await first) == [1, 2]
+        assert sorted(await second) == [2, 3]
+        # User 2 is requested once, by the first caller.
+        assert auth_service.requests == [[1, 2], [3]]
+        assert users_client._pending == {}
+
+    async def test_same_ids_send_one_request(self, auth_service: FakeAuthService) -> None:
+        callers: list[asyncio.Task] = [asyncio.create_task(run_users_client([4, 5, 5])) for _ in range(5)]
+        await wait_for_requests(auth_service, 1)
+        auth_service.release()
+        results: list[dict] = await asyncio.gather(*callers)
+        assert auth_service.requests == [[4, 5]]
+        assert all(result.keys() == {4, 5} for result in results)
+
+    async def test_cached_users_are_not_requested(self, auth_service: FakeAuthService) -> None:
+        auth_service.release()
+        await run_users_client([1, 2])
+        result: dict = await run_users_client([2, 1, 3])
+        assert auth_service.requests == [[1, 2], [3]]
+        assert result[1].username == "user_1"
+
+    async def test_unknown_users_are_left_out(self, auth_service: FakeAuthService) -> None:
+        auth_service.release()
+        assert sorted(await run_users_client([1, 42])) == [1]
+
+    async def test_cancelled_caller_keeps_shared_request(self, auth_service: FakeAuthService) -> None:
+        first: asyncio.Task = asyncio.create_task(run_users_client([1]))
+        await wait_for_requests(auth_service, 1)
+        second: asyncio.Task = asyncio.create_task(run_users_client([1]))
+        await asyncio.sleep(0)
+        first.cancel()
+        auth_service.release()
+        assert (await second)[1].username == "user_1"
+        assert auth_service.requests == [[1]]
+
+
+class TestInvalidation:
+    async def test_invalidate_cached_user(self, auth_service: FakeAuthService) -> None:
+        auth_service.release()
+        await run_users_client([1])
+        auth_service.usernames[1] = "renamed"
+        invalidate_users([1])
+        assert (await run_users_client([1]))[1].username == "renamed"
+        assert auth_service.requests == [[1], [1]]
+
+    async def test_invalidation_during_fetch_is_not_cached(self, auth_service: FakeAuthService) -> None:
+        caller: asyncio.Task = asyncio.create_task(run_users_client([1, 2]))
+        await wait_for_requests(auth_service, 1)
+        # User 1 is updated after the auth service read it, the reply holds the old name.
+        auth_service.usernames[1] = "renamed"
+        invalidate_users([1])
+        auth_service.release()
+        result: dict = await caller
+        assert result[1].username == "user_1"
+        assert 1 not in users_client._users_cache
+        assert 2 in users_client._users_cache
+
+        assert (await run_users_client([1, 2]))[1].username == "renamed"
+        assert auth_service.requests == [[1, 2], [1]]
+
+    async def test_invalidated_user_is_requested_again_while_pending(self, auth_service: FakeAuthService) -> None:
+        first: asyncio.Task = asyncio.create_task(run_users_client([1]))
+        await wait_for_requests(auth_service, 1)
+        auth_service.usernames[1] = "renamed"
+        invalidate_users([1])
+        # A caller after the invalidation doesn't wait for the stale reply.
+        second: asyncio.Task = asyncio.create_task(run_users_client([1]))
+        await wait_for_requests(auth_service, 2)
+        auth_service.release()
+        assert (await first)[1].username == "user_1"
+        assert (await second)[1].username == "renamed"
+        assert users_client._users_cache[1].username == "renamed"
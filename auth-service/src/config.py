@@ -16,9 +16,13 @@ class RMQConfig(BaseModel):
     host: str
     port: int = 5672
     prefetch_count: int = 50
+    # Codec of outgoing RPC requests. JSON keeps compatibility with services that don't negotiate codecs yet.
+    content_type: str = "application/json"
 
     heartbeat: int = 120
     timeout_seconds: int = 15
+    # Publish `user_updated` events, so art-service drops cached users at once instead of on expiry.
+    publish_user_updates: bool = True
 
     def get_connection_url(self) -> str:
         return f"amqp://{self.user}:{self.password}@{self.host}:{self.port}/"
@@ -52,6 +56,9 @@ class Settings(BaseSettings):
 
     jwt_private_key_path: Path = auth_dir / "secrets/jwt-private.pem"
     jwt_public_key_path: Path = auth_dir / "secrets/jwt-public.pem"
+    # Public keys of rotated out signing keys. They stay in the published JWKS until the
+    # tokens they signed expire.
+    jwt_retired_public_key_paths: list[Path] = []
     jwt_access_token_expire_minutes: int = 5
     jwt_refresh_token_expire_minutes: int = 30 * 24 * 60
 
@@ -4,20 +4,24 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
+from rabbit.jwks_server import jwks_server
 from rabbit.jwt_server import jwt_server
 from rabbit.users_server import users_server
 from api.router import router as auth_router
 from contextlib import asynccontextmanager
 from config import logger
+from utils.jwt_utils import get_jwks
 
 
 @asynccontextmanager
 async def async_lifespan(app_name: FastAPI):
     app.jwt_rpc_task = asyncio.create_task(jwt_server())
     app.users_rpc_task = asyncio.create_task(users_server())
+    app.jwks_rpc_task = asyncio.create_task(jwks_server())
     yield
     app.jwt_rpc_task.cancel()
     app.users_rpc_task.cancel()
+    app.jwks_rpc_task.cancel()
 
 
 app = FastAPI(
@@ -48,5 +52,11 @@ async def redirect_to_docs() -> RedirectResponse:
     return RedirectResponse(url="/docs")
 
 
+@app.get("/.well-known/jwks.json", tags=["keys"])
+async def get_public_keys() -> dict:
+    """The public keys verifying the access tokens, by the `kid` in the token header."""
+    return get_jwks()
+
+
 if __name__ == "__main__":
     uvicorn.run(app=app, port=8001, host="0.0.0.0")
@@ -0,0 +1,29 @@
+from aio_pika import connect, ExchangeType, Message
+from aio_pika.exceptions import AMQPException
+
+from config import logger, settings
+
+# Fanout exchange, every art-service instance binds its own queue to it.
+USER_UPDATED: str = "user_updated"
+
+
+async def publish_user_updated(user_id: int) -> None:
+    """
+    Notifies the other services that the public data of a user (username, profile picture)
+    changed, so they drop their cached copy. Delivery is best effort: a failure is logged,
+    not raised, and the cached copies expire on their own.
+
+    :param user_id: The ID of the updated user.
+    """
+    if not settings.rmq.publish_user_updates:
+        return
+    body: bytes = str(user_id).encode()
+    try:
+        connection = await connect(url=settings.rmq.get_connection_url())
+        async with connection:
+            channel = await connection.channel()
+            exchange = await channel.declare_exchange(name=USER_UPDATED, type=ExchangeType.FANOUT)
+            await exchange.publish(Message(body=body), routing_key="")
+        logger.info(f"Published {USER_UPDATED}: {body!r}")
+    except (AMQPException, OSError) as err:
+        logger.error(f"Failed to publish {USER_UPDATED}: {body!r}: {err}", exc_info=True)
@@ -0,0 +1,62 @@
+import asyncio
+
+from .rpc_server import RmqRpcServer
+from utils.jwt_utils import get_jwks
+from aio_pika.exceptions import AMQPException
+import json
+from config import logger
+
+JWKS_REQUEST: str = "jwks_request"
+
+
+# jwks_request: str = Ignored
+# jwks_response: str = Json string of the JWKS, {"keys": [{"kid": str, "kty": "RSA", "n": str, "e": str, ...}]}
+# With a binary content type the response is encoded with that codec instead.
+
+class JwksRpcServer(RmqRpcServer):
+    def __init__(self):
+        super().__init__(queue_name=JWKS_REQUEST)
+
+    async def msg_handler(self, message_body: str) -> str:
+        return json.dumps(get_jwks())
+
+    async def data_handler(self, data: str, headers: dict) -> dict:
+        return get_jwks()
+
+
+async def _run_jwks_rpc_server() -> None:
+    jwks_rpc_server: "JwksRpcServer" = JwksRpcServer()
+    try:
+        await jwks_rpc_server.connect()
+        logger.info("JwksRpcServer connected to RabbitMQ and queue declared successfully.")
+        await jwks_rpc_server.process_messages()
+    except (AMQPException, Exception) as err:
+        logger.error(f"error: {err}")
+        await jwks_rpc_server.cleanup()
+
+
+async def jwks_server():
+    jwks_server_task: "asyncio.Task | None" = None
+    try:
+        while True:
+            if jwks_server_task is None or jwks_server_task.done():
+                jwks_server_task = asyncio.create_task(_run_jwks_rpc_server())
+
+            try:
+                await jwks_server_task
+            except asyncio.CancelledError:
+                logger.info("JWKS server task was cancelled.")
+                break
+            except Exception as e:
+                logger.error(f"JWKS server task encountered an error: {e}", exc_info=True)
+                logger.info("Restarting JWKS server task...")
+
+            await asyncio.sleep(1)
+    finally:
+        if jwks_server_task:
+            jwks_server_task.cancel()
+            try:
+                await jwks_server_task
+                logger.critical("JWKS server not cancelled")
+            except asyncio.CancelledError:
+                logger.info("JWKS server task was cancelled.")
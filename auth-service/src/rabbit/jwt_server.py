@@ -12,14 +12,23 @@ JWT_REQUEST: str = "jwt_request"
 
 # jwt_request: str = Just token itself
 # jwt_response: str = Json string of format {"is_valid": bool, "decoded": dict | None}
+# With a binary content type the token and the response are encoded with that codec instead.
 
 class JwtRpcServer(RmqRpcServer):
     def __init__(self):
         super().__init__(queue_name=JWT_REQUEST)
 
     async def msg_handler(self, message_body: str) -> str:
+        response_str: str = json.dumps(self._verify(message_body))
+        return response_str
+
+    async def data_handler(self, data: str, headers: dict) -> dict:
+        return self._verify(data)
+
+    @staticmethod
+    def _verify(token: str) -> dict:
         try:
-            decoded: dict = decode_jwt(message_body)
+            decoded: dict = decode_jwt(token)
             if decoded["type"] != ACCESS_TOKEN_TYPE:
                 raise ValueError(f"Incorrect token type, expected: {ACCESS_TOKEN_TYPE} received: {decoded['type']}")
             response: dict = {
@@ -32,8 +41,7 @@ class JwtRpcServer(RmqRpcServer):
                 "is_valid": False,
                 "decoded": None,
             }
-        response_str: str = json.dumps(response)
-        return response_str
+        return response
 
 
 async def _run_jwt_rpc_server() -> None:
@@ -7,6 +7,7 @@ from abc import ABC
 
 import config
 from config import settings, logger
+from . import codec
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -86,7 +87,7 @@ class RmqRpcClient:
     async def on_response(self, message: "AbstractIncomingMessage") -> None:
         """
         Compares the incoming message's correlation_id with the client's current correlation_id.
-        If they match, the message is acknowledged and the response is set on the Future.
+        If they match, the message is acknowledged and the message itself is set on the Future.
 
         :param message: An incoming RabbitMQ message.
         :raises AMQPException: If acknowledging the message fails.
@@ -95,9 +96,8 @@ class RmqRpcClient:
             logger.debug(f"Received message with correlation_id: {message.correlation_id}")
             if message.correlation_id == self.correlation_id:
                 await message.ack()
-                response_body = message.body.decode()
-                logger.debug(f"Response message: {response_body}")
-                self.future.set_result(response_body)
+                logger.debug(f"Response message: {len(message.body)} bytes, {message.content_type}")
+                self.future.set_result(message)
             else:
                 logger.warning(f"Received message with mismatched correlation_id: {message.correlation_id}")
         except AMQPException as err:
@@ -114,13 +114,36 @@ class RmqRpcClient:
         :return: The server's response body as a string.
         :raises AMQPException: If there's an error during publishing or receiving the response.
         """
+        response: "AbstractIncomingMessage" = await self.call_message(call_body.encode(), routing_key)
+        return response.body.decode()
+
+    async def call_message(
+            self,
+            call_body: bytes,
+            routing_key: str,
+            content_type: str | None = None,
+            headers: dict | None = None,
+    ) -> "AbstractIncomingMessage":
+        """
+        Same as `call`, but sends a binary body with its content type and headers
+        and returns the whole response message.
+
+        :param call_body: The encoded content of the message.
+        :param routing_key: The RabbitMQ routing key or queue name.
+        :param content_type: The codec of `call_body`, see `rabbit.codec`.
+        :param headers: AMQP headers, e.g. metadata of a raw binary body.
+        :return: The server's response message.
+        :raises AMQPException: If there's an error during publishing or receiving the response.
+        """
         try:
             self.correlation_id = str(uuid.uuid4())
             logger.debug(f"Publishing message with correlation_id: {self.correlation_id}")
 
             await self.channel.default_exchange.publish(
                 Message(
-                    body=call_body.encode(),
+                    body=call_body,
+                    content_type=content_type,
+                    headers=headers,
                     correlation_id=self.correlation_id,
                     reply_to=self.callback_queue.name
                 ),
@@ -145,3 +168,30 @@ async def run_rpc_client(body: str, routing_key: str) -> "Any":
         logger.info(f"In async with RmqRpcClient() as client:")
         response = await client.call(call_body=body, routing_key=routing_key)
     return response
+
+
+async def run_rpc_client_data(
+        data: "Any",
+        routing_key: str,
+        content_type: str | None = None,
+        headers: dict | None = None,
+) -> "Any":
+    """
+    Encodes `data` with the given codec (the configured `settings.rmq.content_type` by default),
+    sends it and decodes the response according to its own content type.
+
+    :param data: The request data, raw bytes for `codec.OCTET_STREAM`.
+    :param routing_key: The RabbitMQ routing key.
+    :param content_type: The codec of the request.
+    :param headers: AMQP headers, e.g. metadata of a raw binary body.
+    :return: The decoded response.
+    """
+    content_type = content_type or settings.rmq.content_type
+    async with RmqRpcClient() as client:
+        response: "AbstractIncomingMessage" = await client.call_message(
+            call_body=codec.encode(data, content_type),
+            routing_key=routing_key,
+            content_type=content_type,
+            headers=headers,
+        )
+    return codec.decode(response.body, response.content_type)
@@ -4,6 +4,7 @@ from aio_pika import connect, Message
 from typing import TYPE_CHECKING
 from abc import ABC
 from aio_pika.exceptions import AMQPException
+from . import codec
 
 if TYPE_CHECKING:
     from aio_pika.abc import (
@@ -13,6 +14,7 @@ if TYPE_CHECKING:
         AbstractQueue,
         AbstractIncomingMessage,
     )
+    from typing import Any
 
 
 class RmqRpcServer:
@@ -44,6 +46,21 @@ class RmqRpcServer:
     async def msg_handler(self, message_body: str) -> str:
         return message_body
 
+    async def data_handler(self, data: "Any", headers: dict) -> "Any":
+        # Handles messages sent in a binary codec, `data` is already decoded.
+        raise ValueError(f"{self.queue_name} does not accept binary requests")
+
+    async def handle(self, message: "AbstractIncomingMessage") -> tuple[bytes, str]:
+        # JSON text, or no content type as sent by older clients, goes to msg_handler.
+        if codec.is_json(message.content_type):
+            response: str = await self.msg_handler(message.body.decode())
+            return response.encode(), codec.JSON
+
+        content_type: str = codec.get_reply_content_type(message)
+        data: "Any" = codec.decode(message.body, message.content_type)
+        response_data: "Any" = await self.data_handler(data, dict(message.headers or {}))
+        return codec.encode(response_data, content_type), content_type
+
     async def process_messages(self):
         try:
             async with self.queue.iterator() as q_iterator:
@@ -51,14 +68,14 @@ class RmqRpcServer:
                     message: "AbstractIncomingMessage"
                     async with message.process(requeue=False):
                         assert message.reply_to is not None
-                        msg_body: str = message.body.decode()
                         logger.info(f"Received message")
 
-                        response: str = await self.msg_handler(msg_body)
+                        response, content_type = await self.handle(message)
 
                         await self.exchange.publish(
                             Message(
-                                body=response.encode(),
+                                body=response,
+                                content_type=content_type,
                                 correlation_id=message.correlation_id,
                             ),
                             routing_key=message.reply_to,
@@ -1,4 +1,5 @@
-from .rpc_client import run_rpc_client
+from . import codec
+from .rpc_client import run_rpc_client, run_rpc_client_data
 from fastapi import UploadFile
 import base64
 import json
@@ -25,6 +26,40 @@ async def run_s3_add_client(body: S3AddSchema) -> str:
     """
     json_result: str = await run_rpc_client(body=body.model_dump_json(), routing_key=S3_ADD_REQUEST)
     result = S3AddResponse.model_validate_json(json_result)
+    return _get_added_blob_name(result)
+
+
+async def run_s3_add_image_client(img_bytes: bytes, img_type: str, blob_name: str) -> str:
+    """
+    Uploads an image via RabbitMQ using the configured codec.
+
+    With JSON the image is sent base64-encoded inside :class:`S3AddSchema`. With any other codec it is
+    sent as the raw message body, with `img_type` and `blob_name` in the AMQP headers, which avoids
+    the base64 size overhead.
+
+    :param img_bytes: The image file.
+    :param img_type: MIME type of the image.
+    :param blob_name: Blob name in the external storage.
+    :return: Blob name in the external storage.
+    :raises InterServerHTTPException: If the response status is not 1000.
+    :raises InvalidImageTypeHTTPException: If the response status is 1002
+    """
+    if codec.is_json(settings.rmq.content_type):
+        img_base64: str = base64.b64encode(img_bytes).decode("utf-8")
+        body = S3AddSchema(img_base64=img_base64, img_type=img_type, blob_name=blob_name)
+        return await run_s3_add_client(body=body)
+
+    result_data: dict = await run_rpc_client_data(
+        data=img_bytes,
+        routing_key=S3_ADD_REQUEST,
+        content_type=codec.OCTET_STREAM,
+        headers={"img_type": img_type, "blob_name": blob_name},
+    )
+    result = S3AddResponse.model_validate(result_data)
+    return _get_added_blob_name(result)
+
+
+def _get_added_blob_name(result: S3AddResponse) -> str:
     logger.debug(f"result = {result}")
     if result.status == settings.rpc_status_success:
         return result.blob_name
@@ -25,6 +25,13 @@ class UsersRpcServer(RmqRpcServer):
 
         return users_json
 
+    async def data_handler(self,
+                           data: list[int],
+                           headers: dict,
+                           users_service: "UserService" = get_user_service()
+                           ) -> list[dict]:
+        return await users_service.get_all_users(users_id=data)
+
 
 async def _run_users_rpc_server() -> None:
     users_rpc_server: UsersRpcServer = UsersRpcServer()
@@ -1,5 +1,3 @@
-import base64
-
 from fastapi import Response, UploadFile
 
 from config import logger, settings
@@ -7,9 +5,10 @@ from exceptions.http import (EmailAlreadyExistsHTTPException, UnauthorizedHTTPEx
                              UsernameAlreadyExistHTTPException, UsernameTooLongHTTPException,
                              UserNotActiveHTTPException, UserNotFoundHTTPException,
                              WeakPasswordHTTPException)
-from rabbit.s3_client import run_s3_add_client, run_s3_get_client
+from rabbit.events import publish_user_updated
+from rabbit.s3_client import run_s3_add_image_client, run_s3_get_client
 from repositories.users import UserRepository
-from schemas.rabbit_ import S3AddSchema, S3GetSchema
+from schemas.rabbit_ import S3GetSchema
 from schemas.tokens import AccessTokenSchema, TokenInfoSchema
 from schemas.users import (UserCreateSchema, UserEntity, UserLoginSchema, UserProfilePrivate,
                            UserProfilePublic)
@@ -154,6 +153,7 @@ class UserService:
     async def change_username(self, user_id: int, new_username: str) -> None:
         await self._validate_username(new_username)
         await self.user_repo.update_one(model_id=user_id, data={"username": new_username})
+        await publish_user_updated(user_id)
 
     async def set_profile_picture(self, user_id: int, image: UploadFile) -> None:
         """
@@ -161,32 +161,27 @@ class UserService:
 
         Steps:
         1. Reads the uploaded file as bytes.
-        2. Base64-encodes the image data.
-        3. Constructs an S3AddSchema object containing the encoded image, MIME type, and blob name.
-        4. Calls run_s3_add_client(...) to store the image in external storage.
-        5. Updates the user's profile in the repository with the resulting blob name.
+        2. Calls run_s3_add_image_client(...) with the image, MIME type, and blob name
+           to store the image in external storage.
+        3. Updates the user's profile in the repository with the resulting blob name.
 
         :param user_id: The ID of the user whose profile picture is being updated.
         :param image: The uploaded file containing the user's new profile picture.
         :raises InterServerHTTPException: If the storage operation fails or returns a non-successful status.
-        Note: The InternalServerException might be raised by the run_s3_add_client function, not directly by set_profile_picture.
+        Note: The InternalServerException might be raised by the run_s3_add_image_client function, not directly by set_profile_picture.
         """
         img_bytes: bytes = await image.read()
         img_type: str = image.content_type
         logger.debug(f"img_type: {img_type}")
 
-        img_base64: bytes = base64.b64encode(img_bytes)
-        img_base64: str = img_base64.decode("utf-8")
-
         img_blob_name: str = f"profile_pictures/user_{user_id}.jpg"
         logger.debug(f"img_blob_name: {img_blob_name}")
 
-        img_add_data = S3AddSchema(img_base64=img_base64,
-                                   img_type=img_type,
-                                   blob_name=img_blob_name)
-
-        img_blob_name: str = await run_s3_add_client(body=img_add_data)
+        img_blob_name: str = await run_s3_add_image_client(img_bytes=img_bytes,
+                                                           img_type=img_type,
+                                                           blob_name=img_blob_name)
         await self.user_repo.update_one(model_id=user_id, data={"profile_image": img_blob_name})
+        await publish_user_updated(user_id)
 
     async def get_profile_picture(self, user_id: int) -> str:
         """
@@ -1,8 +1,13 @@
+import json
 import jwt
-from jwt.exceptions import PyJWTError, ExpiredSignatureError
+from jwt.algorithms import RSAAlgorithm
+from jwt.exceptions import PyJWTError, ExpiredSignatureError, InvalidKeyError
 from config import settings
 from datetime import datetime, timedelta, timezone
 from copy import deepcopy
+from functools import cache
+from hashlib import sha256
+from base64 import urlsafe_b64encode
 
 from typing import Any
 
@@ -11,6 +16,27 @@ ACCESS_TOKEN_TYPE = "access"
 REFRESH_TOKEN_TYPE = "refresh"
 
 
+def get_public_jwk(public_key: str, algorithm: str = "RS256") -> dict:
+    """A PEM public key as a JWK, its `kid` is the RFC 7638 thumbprint of the key."""
+    jwk: dict = RSAAlgorithm.to_jwk(RSAAlgorithm(RSAAlgorithm.SHA256).prepare_key(public_key), as_dict=True)
+    # The thumbprint hashes the required members only, sorted and without whitespace.
+    required: str = json.dumps({"e": jwk["e"], "kty": jwk["kty"], "n": jwk["n"]}, separators=(",", ":"))
+    kid: str = urlsafe_b64encode(sha256(required.encode()).digest()).rstrip(b"=").decode()
+    jwk.update(kid=kid, alg=algorithm, use="sig")
+    return jwk
+
+
+@cache
+def get_jwks() -> dict:
+    """The public keys verifying the tokens, the signing one first."""
+    key_paths: list = [settings.jwt_public_key_path, *settings.jwt_retired_public_key_paths]
+    return {"keys": [get_public_jwk(path.read_text()) for path in key_paths]}
+
+
+def get_signing_key_id() -> str:
+    return get_jwks()["keys"][0]["kid"]
+
+
 def encode_jwt(
         payload: dict,
         private_key: str = settings.jwt_private_key_path.read_text(),
@@ -29,16 +55,31 @@ def encode_jwt(
         payload=to_encode,
         key=private_key,
         algorithm=algorithm,
+        headers={"kid": get_signing_key_id()},
     )
     return encoded
 
 
+@cache
+def get_public_keys() -> dict[str, Any]:
+    """The keys of `get_jwks` by key id."""
+    return {jwk["kid"]: RSAAlgorithm.from_jwk(jwk) for jwk in get_jwks()["keys"]}
+
+
 def decode_jwt(
         token: str,
-        public_key: str = settings.jwt_public_key_path.read_text(),
         algorithm: str = "RS256",
 ) -> Any:
+    """
+    Verifies a token with the published key named by its `kid`, like the services verifying
+    tokens locally do, so tokens signed with a retired key stay valid until they expire.
+    Tokens without a key id were signed before the key ids, with the signing key.
+    """
     try:
+        key_id: str = jwt.get_unverified_header(token).get("kid") or get_signing_key_id()
+        public_key: Any = get_public_keys().get(key_id)
+        if public_key is None:
+            raise InvalidKeyError(f"Unknown key id: {key_id}")
         decoded: Any = jwt.decode(
             jwt=token,
             key=public_key,
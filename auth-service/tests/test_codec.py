@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.rabbit import codec
+
+
+def make_message(content_type: str | None, headers: dict | None = None) -> SimpleNamespace:
+    return SimpleNamespace(body=b"", content_type=content_type, headers=headers)
+
+
+class TestRoundTrip:
+    @pytest.mark.parametrize("content_type", [codec.JSON, codec.MSGPACK])
+    @pytest.mark.parametrize("data", [
+        {"users_id": [1, 2, 3]},
+        {"id": 1, "username": "user", "email": "user@example.com", "is_active": True, "avatar": None},
+        [{"id": 1}, {"id": 2}],
+        "token",
+    ])
+    def test_structured(self, content_type: str, data) -> None:
+        assert codec.decode(codec.encode(data, content_type), content_type) == data
+
+    def test_octet_stream(self) -> None:
+        data: bytes = bytes(range(256))
+        assert codec.decode(codec.encode(data, codec.OCTET_STREAM), codec.OCTET_STREAM) == data
+
+
+class TestContentType:
+    def test_missing_content_type_is_json(self) -> None:
+        assert codec.is_json(None)
+        assert codec.decode(b'{"users_id": [1]}', None) == {"users_id": [1]}
+
+    def test_unknown_content_type(self) -> None:
+        with pytest.raises(ValueError):
+            codec.encode([1, 2], "application/x-int32-array")
+        with pytest.raises(ValueError):
+            codec.decode(b"\x01\x00\x00\x00", "application/x-int32-array")
+
+    @pytest.mark.parametrize(("message", "expected"), [
+        (make_message(codec.OCTET_STREAM, {codec.ACCEPT_HEADER: codec.MSGPACK}), codec.MSGPACK),
+        (make_message(codec.JSON, {codec.ACCEPT_HEADER: codec.MSGPACK.encode()}), codec.MSGPACK),
+        (make_message(codec.MSGPACK, None), codec.MSGPACK),
+        (make_message(codec.OCTET_STREAM, {}), codec.JSON),
+        (make_message(None, None), codec.JSON),
+    ])
+    def test_reply_content_type(self, message: SimpleNamespace, expected: str) -> None:
+        assert codec.get_reply_content_type(message) == expected
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.exceptions import ExpiredSignatureError, InvalidSignatureError, PyJWTError
+
+from src.utils import jwt_utils
+from src.utils.jwt_utils import decode_jwt, get_jwks, get_public_jwk
+
+if TYPE_CHECKING:
+    from typing import Iterator
+
+
+class KeyPair:
+    def __init__(self, directory: Path, name: str):
+        private_key: rsa.RSAPrivateKey = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.private_pem: bytes = private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+        self.public_path: Path = directory / f"{name}-public.pem"
+        self.public_path.write_bytes(private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        ))
+        self.kid: str = get_public_jwk(self.public_path.read_text())["kid"]
+
+    def sign(self, kid: str | None = "own", expire_minutes: int = 5) -> str:
+        payload: dict = {
+            "type": jwt_utils.ACCESS_TOKEN_TYPE,
+            "sub": "1",
+            "exp": datetime.now(tz=timezone.utc) + timedelta(minutes=expire_minutes),
+        }
+        headers: dict = {} if kid is None else {"kid": self.kid if kid == "own" else kid}
+        return jwt.encode(payload=payload, key=self.private_pem, algorithm="RS256", headers=headers)
+
+
+def clear_key_caches() -> None:
+    get_jwks.cache_clear()
+    jwt_utils.get_public_keys.cache_clear()
+
+
+@pytest.fixture
+def keys(monkeypatch, tmp_path: Path) -> "Iterator[tuple[KeyPair, KeyPair]]":
+    """The signing key and a retired one, published by `get_jwks`."""
+    signing: KeyPair = KeyPair(tmp_path, "signing")
+    retired: KeyPair = KeyPair(tmp_path, "retired")
+    monkeypatch.setattr(jwt_utils.settings, "jwt_public_key_path", signing.public_path)
+    monkeypatch.setattr(jwt_utils.settings, "jwt_retired_public_key_paths", [retired.public_path])
+    clear_key_caches()
+    yield signing, retired
+    clear_key_caches()
+
+
+class TestDecodeJwt:
+    def test_jwks_lists_signing_key_first(self, keys: tuple[KeyPair, KeyPair]) -> None:
+        signing, retired = keys
+        assert [jwk["kid"] for jwk in get_jwks()["keys"]] == [signing.kid, retired.kid]
+
+    def test_signing_key(self, keys: tuple[KeyPair, KeyPair]) -> None:
+        signing, _ = keys
+        assert decode_jwt(signing.sign())["sub"] == "1"
+
+    def test_retired_key(self, keys: tuple[KeyPair, KeyPair]) -> None:
+        _, retired = keys
+        assert decode_jwt(retired.sign())["sub"] == "1"
+
+    def test_token_without_key_id(self, keys: tuple[KeyPair, KeyPair]) -> None:
+        signing, retired = keys
+        assert decode_jwt(signing.sign(kid=None))["sub"] == "1"
+        with pytest.raises(InvalidSignatureError):
+            decode_jwt(retired.sign(kid=None))
+
+    def test_unknown_key(self, keys: tuple[KeyPair, KeyPair], tmp_path: Path) -> None:
+        unknown: KeyPair = KeyPair(tmp_path, "unknown")
+        with pytest.raises(PyJWTError):
+            decode_jwt(unknown.sign())
+
+    def test_key_id_of_another_key(self, keys: tuple[KeyPair, KeyPair]) -> None:
+        signing, retired = keys
+        with pytest.raises(InvalidSignatureError):
+            decode_jwt(retired.sign(kid=signing.kid))
+
+    def test_expired(self, keys: tuple[KeyPair, KeyPair]) -> None:
+        signing, _ = keys
+        with pytest.raises(ExpiredSignatureError):
+            decode_jwt(signing.sign(expire_minutes=-1))
+
+    def test_malformed(self, keys: tuple[KeyPair, KeyPair]) -> None:
+        with pytest.raises(PyJWTError):
+            decode_jwt("not a token")
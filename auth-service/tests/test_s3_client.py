@@ -0,0 +1,68 @@
+import base64
+import json
+from typing import TYPE_CHECKING
+
+import pytest
+
+from src.rabbit import codec
+from src.rabbit import s3_client
+from src.rabbit.s3_client import S3_ADD_REQUEST, run_s3_add_image_client
+
+if TYPE_CHECKING:
+    from typing import Any
+
+IMG_BYTES: bytes = b"\x89PNG\r\n\x1a\n" + bytes(range(64))
+
+
+class FakeRpc:
+    """Records the requests and replies like the S3 server of art-service."""
+
+    def __init__(self, status: int):
+        self.status: int = status
+        self.json_requests: list[tuple[str, str]] = []
+        self.data_requests: list[dict] = []
+
+    async def run_rpc_client(self, body: str, routing_key: str) -> str:
+        self.json_requests.append((body, routing_key))
+        return json.dumps({"status": self.status, "blob_name": json.loads(body)["blob_name"]})
+
+    async def run_rpc_client_data(self, **kwargs: "Any") -> dict:
+        self.data_requests.append(kwargs)
+        return {"status": self.status, "blob_name": kwargs["headers"]["blob_name"]}
+
+
+@pytest.fixture
+def rpc(monkeypatch) -> FakeRpc:
+    rpc: FakeRpc = FakeRpc(status=s3_client.settings.rpc_status_success)
+    monkeypatch.setattr(s3_client, "run_rpc_client", rpc.run_rpc_client)
+    monkeypatch.setattr(s3_client, "run_rpc_client_data", rpc.run_rpc_client_data)
+    return rpc
+
+
+class TestAddImage:
+    async def test_json_sends_base64(self, monkeypatch, rpc: FakeRpc) -> None:
+        monkeypatch.setattr(s3_client.settings.rmq, "content_type", codec.JSON)
+        assert await run_s3_add_image_client(IMG_BYTES, "image/png", "avatar_1") == "avatar_1"
+        assert rpc.data_requests == []
+        body, routing_key = rpc.json_requests[0]
+        assert routing_key == S3_ADD_REQUEST
+        request: dict = json.loads(body)
+        assert base64.b64decode(request["img_base64"]) == IMG_BYTES
+        assert request["img_type"] == "image/png"
+
+    async def test_binary_codec_sends_raw_image_with_headers(self, monkeypatch, rpc: FakeRpc) -> None:
+        monkeypatch.setattr(s3_client.settings.rmq, "content_type", codec.MSGPACK)
+        assert await run_s3_add_image_client(IMG_BYTES, "image/png", "avatar_1") == "avatar_1"
+        assert rpc.json_requests == []
+        assert rpc.data_requests == [{
+            "data": IMG_BYTES,
+            "routing_key": S3_ADD_REQUEST,
+            "content_type": codec.OCTET_STREAM,
+            "headers": {"img_type": "image/png", "blob_name": "avatar_1"},
+        }]
+
+    async def test_invalid_image_type(self, monkeypatch, rpc: FakeRpc) -> None:
+        monkeypatch.setattr(s3_client.settings.rmq, "content_type", codec.MSGPACK)
+        rpc.status = s3_client.settings.rpc_status_img_invalid_type_error
+        with pytest.raises(s3_client.InvalidImageTypeHTTPException):
+            await run_s3_add_image_client(IMG_BYTES, "image/tiff", "avatar_1")
@@ -0,0 +1,314 @@
+"""
+Offline benchmark of the recommendation pipeline.
+
+Generates a synthetic catalogue shaped like the `arts`, `arts_to_tags` and `tags` tables,
+runs the rebuild phases of `rec.update_similarity_matrix` on it and queries the result.
+Postgres is replaced by an in-memory `ArtsService`, and the fastText + PCA models by
+deterministic random projections, so nothing but the Python dependencies is needed.
+
+Reported per phase: wall time and peak RSS. Then the artifact size, p50/p99 latency of
+neighbour lookups and fold-in searches, and recall@K of the approximate engine against
+exact cosine. For the tag-overlap engine the recall measures how much the two rankings agree.
+
+Usage, from `recommendations-service`:
+
+    python benchmarks/bench_pipeline.py --n-arts 100000 --engine ivf --n-probe 8
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Iterator
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+# Settings require these, the benchmark never connects anywhere.
+for _name, _value in {
+    "DB__USER": "bench", "DB__PASSWORD": "bench", "DB__HOST": "localhost", "DB__NAME": "bench",
+    "DB__PORT": "5432", "RMQ__USER": "bench", "RMQ__PASSWORD": "bench", "RMQ__HOST": "localhost",
+    "UPDATE_PASSWORD": "bench",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import artifacts  # noqa: E402
+import rec  # noqa: E402
+from config import ArtifactPaths, settings  # noqa: E402
+from database.arts import ArtsBatch, ArtsStats  # noqa: E402
+from utils import data_processor, fold_in, popularity, tag_embeddings  # noqa: E402
+from utils.feature_store import load_features  # noqa: E402
+
+
+class SyntheticCatalogue:
+    """Columns of the synthetic `arts` table, sorted by id, with tags drawn from a Zipf law."""
+
+    def __init__(
+            self,
+            n_arts: int,
+            n_tags: int,
+            n_users: int,
+            mean_tags: float,
+            zipf_a: float,
+            seed: int,
+    ):
+        rng = np.random.default_rng(seed)
+        max_tags: int = settings.arts.max_tags
+        self.tag_names: list[str] = [f"tag_{i}" for i in range(n_tags)]
+        self.art_ids: np.ndarray = np.arange(1, n_arts + 1, dtype=np.int64)
+        self.user_ids: np.ndarray = rng.integers(1, n_users + 1, n_arts)
+        self.like_counts: np.ndarray = np.floor(rng.lognormal(2.0, 1.5, n_arts))
+        self.view_counts: np.ndarray = self.like_counts * 10 + np.floor(rng.lognormal(4.0, 1.5, n_arts))
+        self.age_days: np.ndarray = rng.uniform(0, 365, n_arts)
+
+        n_art_tags: np.ndarray = np.clip(rng.poisson(mean_tags, n_arts), 1, max_tags)
+        # Tag popularity follows a Zipf law, tag 0 being the most used one.
+        tag_weights: np.ndarray = 1 / np.arange(1, n_tags + 1) ** zipf_a
+        drawn: np.ndarray = rng.choice(n_tags, size=(n_arts, max_tags), p=tag_weights / tag_weights.sum())
+        self.tag_ids: np.ndarray = np.where(np.arange(max_tags) < n_art_tags[:, None], drawn, -1)
+
+    def get_batch(self, rows: slice | np.ndarray) -> ArtsBatch:
+        return ArtsBatch(
+            art_ids=self.art_ids[rows],
+            user_ids=self.user_ids[rows],
+            like_counts=self.like_counts[rows],
+            view_counts=self.view_counts[rows],
+            tag_ids=self.tag_ids[rows],
+        )
+
+
+def make_arts_service(catalogue: SyntheticCatalogue) -> type:
+    """An `ArtsService` answering from the catalogue instead of Postgres."""
+
+    class SyntheticArtsService:
+        @staticmethod
+        async def get_arts_stats(start_date: datetime = None) -> ArtsStats | None:
+            if start_date is not None:
+                return None
+            return ArtsStats(
+                n_arts=len(catalogue.art_ids),
+                max_id=int(catalogue.art_ids[-1]),
+                likes_range=(float(catalogue.like_counts.min()), float(catalogue.like_counts.max())),
+                views_range=(float(catalogue.view_counts.min()), float(catalogue.view_counts.max())),
+            )
+
+        @staticmethod
+        async def iter_arts_data(
+                max_id: int, start_date: datetime = None, batch_size: int = 5000,
+        ) -> AsyncIterator[ArtsBatch]:
+            for start in range(0, len(catalogue.art_ids), batch_size):
+                yield catalogue.get_batch(slice(start, start + batch_size))
+
+        @staticmethod
+        async def get_arts_data(art_ids: list[int]) -> ArtsBatch:
+            return catalogue.get_batch(np.asarray(art_ids, dtype=np.int64) - 1)
+
+        @staticmethod
+        async def get_all_tags() -> list[tuple[int, str]]:
+            return list(enumerate(catalogue.tag_names))
+
+        @staticmethod
+        async def get_popular_arts(
+                top_n: int, likes_weight: float, views_weight: float, half_life_days: float,
+        ) -> tuple[np.ndarray, np.ndarray]:
+            # The weights are the configured ones, read by get_popularity_scores.
+            scores: np.ndarray = popularity.get_popularity_scores(
+                catalogue.like_counts, catalogue.view_counts, catalogue.age_days,
+            )
+            order: np.ndarray = np.lexsort((catalogue.art_ids, -scores))[:top_n]
+            return catalogue.art_ids[order], scores[order]
+
+        @staticmethod
+        async def get_tag_ids(art_ids: list[int]) -> dict[int, list[int]]:
+            rows: np.ndarray = catalogue.tag_ids[np.asarray(art_ids, dtype=np.int64) - 1]
+            return {art_id: row[row >= 0].tolist() for art_id, row in zip(art_ids, rows)}
+
+    return SyntheticArtsService
+
+
+def embed_tag_names(tag_names: list[str]) -> np.ndarray:
+    """Stands in for fastText + PCA: a fixed random 300D vector per name, projected to tag_vector_size."""
+    projection: np.ndarray = np.random.default_rng(0).normal(
+        size=(300, settings.arts.tag_vector_size)
+    ).astype(np.float32) / np.sqrt(300)
+    vectors: np.ndarray = np.stack([
+        np.random.default_rng(int.from_bytes(hashlib.sha1(name.encode()).digest()[:8], "little"))
+        .normal(size=300).astype(np.float32)
+        for name in tag_names
+    ])
+    return vectors @ projection
+
+
+def _get_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        # No procfs (macOS): the peak of the whole process is the best we have.
+        max_rss: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss / 2 ** 20 if sys.platform == "darwin" else max_rss / 2 ** 10
+
+
+@contextmanager
+def measure(name: str, results: dict[str, tuple[float, float]], interval: float = 0.01) -> Iterator[None]:
+    """Records the wall time and the peak RSS sampled every `interval` seconds while the block runs."""
+    peak: list[float] = [_get_rss_mb()]
+    done = threading.Event()
+
+    def sample() -> None:
+        while not done.wait(interval):
+            peak[0] = max(peak[0], _get_rss_mb())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed: float = time.perf_counter() - start
+        done.set()
+        sampler.join()
+        results[name] = (elapsed, max(peak[0], _get_rss_mb()))
+
+
+def get_latencies_ms(func, args: list, repeat: int = 1) -> tuple[float, float]:
+    latencies: np.ndarray = np.empty(len(args) * repeat)
+    for i, arg in enumerate(args * repeat):
+        start: float = time.perf_counter()
+        func(arg)
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def get_recall_at_k(exact: np.ndarray, approximate: np.ndarray) -> float:
+    """Mean share of the exact top-K found in the approximate top-K."""
+    k: int = exact.shape[1]
+    if k == 0:
+        return 1.0
+    hits: np.ndarray = (approximate[:, :, None] == exact[:, None, :]).any(axis=2).sum(axis=1)
+    return float(hits.mean() / k)
+
+
+def get_dir_size_mb(path: Path) -> float:
+    return sum(p.stat().st_size for p in path.iterdir() if p.is_file()) / 2 ** 20
+
+
+def build_version(name: str, engine: str, results: dict[str, tuple[float, float]]) -> ArtifactPaths:
+    """Runs the rebuild phases of `rec.update_similarity_matrix` into a new version."""
+    settings.similarity.engine = engine
+    paths: ArtifactPaths = settings.paths.get_version(name)
+    paths.root.mkdir(parents=True)
+    with measure(f"{engine}: features", results):
+        build_info = asyncio.run(data_processor.update_arts_matrix(paths))
+    with measure(f"{engine}: neighbours", results):
+        rec.get_sim_from_arts_matrix(paths)
+    with measure(f"{engine}: popularity", results):
+        asyncio.run(popularity.build_popularity(paths))
+    artifacts.save_build_info(paths, build_info)
+    return paths
+
+
+def run(args: argparse.Namespace) -> None:
+    data_dir = Path(tempfile.mkdtemp(prefix="artspire-bench-"))
+    settings.paths.versions_dir = data_dir / "versions"
+    settings.paths.current_version = data_dir / "current"
+    settings.paths.tag_embeddings = data_dir / "tag_embeddings.npy"
+    settings.paths.tag_embeddings_known = data_dir / "tag_embeddings_known.npy"
+    settings.similarity.top_k = args.top_k
+    settings.similarity.ivf.n_probe = args.n_probe
+    settings.similarity.ivf.n_lists = args.n_lists
+    settings.features.dtype = args.dtype
+    settings.features.tag_pooling = args.tag_pooling
+
+    results: dict[str, tuple[float, float]] = {}
+    with measure("generate", results):
+        catalogue = SyntheticCatalogue(
+            args.n_arts, args.n_tags, args.n_users, args.mean_tags, args.zipf_a, args.seed
+        )
+    arts_service: type = make_arts_service(catalogue)
+    data_processor.ArtsService = arts_service
+    popularity.ArtsService = arts_service
+    fold_in.ArtsService = arts_service
+    tag_embeddings._embed_tag_names = embed_tag_names
+
+    engines: list[str] = ["exact"] if args.engine == "exact" else ["exact", args.engine]
+    versions: dict[str, ArtifactPaths] = {
+        engine: build_version(f"{i:02d}_{engine}", engine, results) for i, engine in enumerate(engines)
+    }
+
+    print(f"\n{'phase':<24}{'wall, s':>10}{'peak RSS, MB':>16}")
+    for name, (elapsed, peak_mb) in results.items():
+        print(f"{name:<24}{elapsed:>10.2f}{peak_mb:>16.1f}")
+
+    rng = np.random.default_rng(args.seed + 1)
+    query_ids: list[int] = rng.choice(catalogue.art_ids, size=min(args.n_queries, args.n_arts), replace=False).tolist()
+    print(f"\n{'engine':<10}{'size, MB':>10}{'lookup p50/p99, ms':>22}{'search p50/p99, ms':>22}")
+    for engine, paths in versions.items():
+        settings.similarity.engine = engine
+        artifacts.publish_version(paths)
+        artifacts.artifact_store.load()
+        lookup: tuple[float, float] = get_latencies_ms(rec._get_neighbours, query_ids, repeat=3)
+        # Fold-in of an art missing from the build: a full scan, an index search or a tag search.
+        if engine == "tags":
+            tag_index = artifacts.artifact_store.tag_index
+            tag_ids: list[np.ndarray] = [
+                tag_index.get_tags(int(artifacts.artifact_store.get_index(i))) for i in query_ids[:args.n_searches]
+            ]
+            search: tuple[float, float] = get_latencies_ms(
+                lambda tags: tag_index.search(tags, settings.similarity.top_k), tag_ids
+            )
+        else:
+            features: np.ndarray = load_features(paths.features)
+            matrix, norms = artifacts.artifact_store.get_features()
+            index = artifacts.artifact_store.ivf_index if engine == "ivf" else None
+            rows: list[np.ndarray] = [features[int(artifacts.artifact_store.get_index(i))] for i in query_ids]
+            search = get_latencies_ms(
+                lambda row: fold_in.search_feature_rows(row, matrix, norms, settings.similarity.top_k, index),
+                rows[:args.n_searches],
+            )
+        print(
+            f"{engine:<10}{get_dir_size_mb(paths.root):>10.1f}"
+            f"{lookup[0]:>11.3f}/{lookup[1]:<10.3f}{search[0]:>11.3f}/{search[1]:<10.3f}"
+        )
+
+    if args.engine != "exact":
+        exact: np.ndarray = np.load(versions["exact"].arts_neighbours_indices)
+        approximate: np.ndarray = np.load(versions[args.engine].arts_neighbours_indices)
+        print(f"\nrecall@{exact.shape[1]} of {args.engine} against exact: {get_recall_at_k(exact, approximate):.4f}")
+    if args.keep_artifacts:
+        print(f"\nartifacts are in {data_dir}")
+    else:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-arts", type=int, default=20_000)
+    parser.add_argument("--n-tags", type=int, default=5_000)
+    parser.add_argument("--n-users", type=int, default=2_000)
+    parser.add_argument("--mean-tags", type=float, default=5.0, help="Mean number of tags per art")
+    parser.add_argument("--zipf-a", type=float, default=1.1, help="Exponent of the tag popularity law")
+    parser.add_argument("--engine", choices=["exact", "ivf", "tags"], default="ivf",
+                        help="Engine compared with exact, exact alone if 'exact'")
+    parser.add_argument("--top-k", type=int, default=settings.similarity.top_k)
+    parser.add_argument("--n-probe", type=int, default=settings.similarity.ivf.n_probe)
+    parser.add_argument("--n-lists", type=int, default=settings.similarity.ivf.n_lists)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default=settings.features.dtype)
+    parser.add_argument("--tag-pooling", choices=["padded", "mean", "max"], default=settings.features.tag_pooling)
+    parser.add_argument("--n-queries", type=int, default=1_000)
+    parser.add_argument("--n-searches", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-artifacts", action="store_true", help="Keep the built versions on disk")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import os
+import shutil
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from pydantic import BaseModel
+
+from config import ArtifactPaths, logger, settings
+from utils.feature_store import get_row_norms, load_features
+from utils.ivf import IVFIndex
+from utils.tag_overlap import TagIndex
+
+
+class BuildInfo(BaseModel):
+    """Metadata of the artifacts on disk, required to extend them incrementally."""
+    built_at: datetime
+    n_arts: int
+    likes_range: tuple[float, float]
+    views_range: tuple[float, float]
+    # Incremental builds must keep the feature layout of the build they extend.
+    tag_pooling: str = "padded"
+    # Versions built with `similarity.engine = "tags"` have no feature store.
+    has_features: bool = True
+
+
+def save_array(path: Path, array: np.ndarray) -> None:
+    """
+    Saves an array next to `path` and atomically moves it into place.
+
+    Readers that memory-mapped the previous file keep their pages, because the old inode
+    is never truncated.
+    """
+    tmp_path: Path = path.with_name(f"{path.stem}.tmp{path.suffix}")
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def save_art_ids(paths: ArtifactPaths, art_ids: np.ndarray) -> None:
+    """
+    Saves the index -> id map together with its sorted view used for id -> index lookups.
+
+    Args:
+        paths (ArtifactPaths): The artifact version to write to.
+        art_ids (np.ndarray): Art ids, where `art_ids[i]` is the id of the art in row `i`.
+    """
+    art_ids = np.asarray(art_ids, dtype=np.int64)
+    order: np.ndarray = np.argsort(art_ids, kind="stable")
+    save_array(paths.art_indices_to_ids, art_ids)
+    save_array(paths.art_ids_sorted, art_ids[order])
+    save_array(paths.art_ids_sorted_indices, order.astype(np.int32))
+
+
+def save_build_info(paths: ArtifactPaths, build_info: BuildInfo) -> None:
+    path: Path = paths.build_info
+    tmp_path: Path = path.with_name(f"{path.stem}.tmp{path.suffix}")
+    tmp_path.write_text(build_info.model_dump_json())
+    os.replace(tmp_path, path)
+
+
+def load_build_info(paths: ArtifactPaths) -> BuildInfo | None:
+    try:
+        return BuildInfo.model_validate_json(paths.build_info.read_text())
+    except FileNotFoundError:
+        return None
+
+
+def save_ivf_index(paths: ArtifactPaths, index: IVFIndex) -> None:
+    save_array(paths.ivf_centroids, index.centroids)
+    save_array(paths.ivf_list_offsets, index.list_offsets)
+    save_array(paths.ivf_list_rows, index.list_rows)
+
+
+def load_ivf_index(paths: ArtifactPaths) -> IVFIndex | None:
+    """Opens the IVF index of the version memory-mapped, or returns None if it was built without one."""
+    try:
+        return IVFIndex(
+            centroids=np.load(paths.ivf_centroids, mmap_mode="r"),
+            list_offsets=np.load(paths.ivf_list_offsets, mmap_mode="r"),
+            list_rows=np.load(paths.ivf_list_rows, mmap_mode="r"),
+        )
+    except FileNotFoundError:
+        return None
+
+
+def save_tag_incidence(paths: ArtifactPaths, indptr: np.ndarray, tag_ids: np.ndarray) -> None:
+    save_array(paths.art_tag_indptr, np.asarray(indptr, dtype=np.int64))
+    save_array(paths.art_tag_ids, np.asarray(tag_ids, dtype=np.int32))
+
+
+def load_tag_incidence(paths: ArtifactPaths) -> tuple[np.ndarray, np.ndarray] | None:
+    """Opens the art x tag CSR arrays memory-mapped, or returns None for versions built before them."""
+    try:
+        return np.load(paths.art_tag_indptr, mmap_mode="r"), np.load(paths.art_tag_ids, mmap_mode="r")
+    except FileNotFoundError:
+        return None
+
+
+def load_tag_index(paths: ArtifactPaths) -> TagIndex | None:
+    incidence: tuple[np.ndarray, np.ndarray] | None = load_tag_incidence(paths)
+    return None if incidence is None else TagIndex(*incidence)
+
+
+def create_version() -> ArtifactPaths:
+    """Creates an empty, not yet published artifact version directory."""
+    version: str = datetime.now(tz=timezone.utc).strftime("%Y%m%d_%H%M%S_%f")
+    paths: ArtifactPaths = settings.paths.get_version(version)
+    paths.root.mkdir(parents=True)
+    return paths
+
+
+def publish_version(paths: ArtifactPaths) -> None:
+    """
+    Atomically points the `current` symlink to the given version.
+
+    Readers resolve the link once per load, so they see either the old or the new
+    version in full, never a mix of both.
+    """
+    current: Path = settings.paths.current_version
+    tmp_link: Path = current.with_name(f"{current.name}.tmp")
+    if tmp_link.is_symlink():
+        tmp_link.unlink()
+    tmp_link.symlink_to(paths.root, target_is_directory=True)
+    os.replace(tmp_link, current)
+    logger.info(f"Published artifact version {paths.root.name}")
+
+
+def remove_old_versions(keep: int) -> None:
+    """Deletes all but the `keep` newest versions. The live version is never deleted."""
+    versions_dir: Path = settings.paths.versions_dir
+    if not versions_dir.exists():
+        return
+    current: Path = settings.paths.current_version.resolve()
+    versions: list[Path] = sorted(p for p in versions_dir.iterdir() if p.is_dir())
+    for version in versions[:-keep] if keep > 0 else versions:
+        if version != current:
+            # Workers that still map files of this version keep them until they reload.
+            shutil.rmtree(version, ignore_errors=True)
+            logger.info(f"Removed artifact version {version.name}")
+
+
+class ArtifactStore:
+    """
+    Keeps the live recommendation artifacts resident for the lifetime of the process.
+
+    All arrays are opened with `mmap_mode="r"`, so several workers on the same host
+    share the page cache instead of holding private copies.
+    """
+
+    def __init__(self):
+        self.version: Path | None = None
+        self.art_ids: np.ndarray | None = None
+        self.art_ids_sorted: np.ndarray | None = None
+        self.art_ids_sorted_indices: np.ndarray | None = None
+        self.neighbour_indices: np.ndarray | None = None
+        self.neighbour_scores: np.ndarray | None = None
+        self.popular_art_ids: np.ndarray | None = None
+        self.popular_scores: np.ndarray | None = None
+        self.popular_tag_ids: np.ndarray | None = None
+        self.build_info: BuildInfo | None = None
+        # Only versions built with `similarity.engine = "ivf"` have an index.
+        self.ivf_index: IVFIndex | None = None
+        # Tag-overlap scoring, see `utils.tag_overlap`. None for versions built before it.
+        self.tag_index: TagIndex | None = None
+        # Neighbours of arts created after the build, see `utils.fold_in`, least recently used
+        # first. Reset on every load.
+        self.folded: OrderedDict[int, tuple[np.ndarray, np.ndarray]] = OrderedDict()
+        self._features: np.ndarray | None = None
+        self._feature_norms: np.ndarray | None = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.art_ids is not None
+
+    def load(self) -> None:
+        paths: ArtifactPaths = settings.paths.get_current()
+        try:
+            art_ids: np.ndarray = np.load(paths.art_indices_to_ids, mmap_mode="r")
+            art_ids_sorted: np.ndarray = np.load(paths.art_ids_sorted, mmap_mode="r")
+            art_ids_sorted_indices: np.ndarray = np.load(paths.art_ids_sorted_indices, mmap_mode="r")
+            neighbour_indices: np.ndarray = np.load(paths.arts_neighbours_indices, mmap_mode="r")
+            neighbour_scores: np.ndarray = np.load(paths.arts_neighbours_scores, mmap_mode="r")
+        except FileNotFoundError as err:
+            logger.warning(f"Artifacts are not built yet: {err}")
+            return
+
+        self.version = paths.root
+        self.art_ids = art_ids
+        self.art_ids_sorted = art_ids_sorted
+        self.art_ids_sorted_indices = art_ids_sorted_indices
+        self.neighbour_indices = neighbour_indices
+        self.neighbour_scores = neighbour_scores
+        self._load_popularity(paths)
+        self.build_info = load_build_info(paths)
+        self.ivf_index = load_ivf_index(paths)
+        self.tag_index = load_tag_index(paths)
+        self.folded = OrderedDict()
+        self._features = None
+        self._feature_norms = None
+        logger.info(f"Artifacts {paths.root.name} loaded, n_arts = {len(art_ids)}")
+
+    def _load_popularity(self, paths: ArtifactPaths) -> None:
+        try:
+            self.popular_art_ids = np.load(paths.popular_art_ids, mmap_mode="r")
+            self.popular_scores = np.load(paths.popular_scores, mmap_mode="r")
+            self.popular_tag_ids = np.load(paths.popular_tag_ids, mmap_mode="r")
+        except FileNotFoundError:
+            # Versions built before the popularity ranking existed.
+            logger.warning(f"Artifacts {paths.root.name} have no popularity ranking")
+            self.popular_art_ids = np.empty(0, dtype=np.int64)
+            self.popular_scores = np.empty(0, dtype=np.float32)
+            self.popular_tag_ids = np.empty((0, settings.arts.max_tags), dtype=np.int32)
+
+    def refresh_if_changed(self) -> None:
+        """Reloads the artifacts if another process published a new version."""
+        current: Path = settings.paths.current_version
+        if current.exists() and current.resolve() != self.version:
+            self.load()
+
+    def get_features(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The memory-mapped feature store of the live version and its row norms, saved by the
+        rebuild, opened on first use.
+        """
+        if self._features is None:
+            paths: ArtifactPaths = ArtifactPaths(root=self.version)
+            features: np.ndarray = load_features(paths.features)
+            try:
+                self._feature_norms = np.load(paths.feature_norms, mmap_mode="r")
+            except FileNotFoundError:
+                # Versions built before the norms were saved.
+                logger.warning(f"Artifacts {paths.root.name} have no feature norms, computing them")
+                self._feature_norms = get_row_norms(features)
+            self._features = features
+        return self._features, self._feature_norms
+
+    def get_folded(self, art_id: int) -> tuple[np.ndarray, np.ndarray] | None:
+        neighbours: tuple[np.ndarray, np.ndarray] | None = self.folded.get(art_id)
+        if neighbours is not None:
+            self.folded.move_to_end(art_id)
+        return neighbours
+
+    def set_folded(self, art_id: int, neighbours: tuple[np.ndarray, np.ndarray]) -> None:
+        """Keeps the neighbours of a folded-in art, evicting the least recently used beyond `similarity.max_folded_arts`."""
+        self.folded[art_id] = neighbours
+        self.folded.move_to_end(art_id)
+        while len(self.folded) > settings.similarity.max_folded_arts:
+            self.folded.popitem(last=False)
+
+    def get_index(self, art_id: int) -> int | None:
+        """Returns the row index of `art_id`, or None if the art is not in the artifacts."""
+        if not self.is_loaded:
+            return None
+        position: int = int(np.searchsorted(self.art_ids_sorted, art_id))
+        if position < len(self.art_ids_sorted) and self.art_ids_sorted[position] == art_id:
+            return int(self.art_ids_sorted_indices[position])
+        return None
+
+    def get_indices(self, art_ids: np.ndarray) -> np.ndarray:
+        """Vectorized `get_index`: the row index of every art id, -1 for arts not in the artifacts."""
+        art_ids = np.asarray(art_ids, dtype=np.int64)
+        if not self.is_loaded or len(self.art_ids_sorted) == 0:
+            return np.full(len(art_ids), -1, dtype=np.int64)
+        positions: np.ndarray = np.minimum(np.searchsorted(self.art_ids_sorted, art_ids), len(self.art_ids_sorted) - 1)
+        is_found: np.ndarray = self.art_ids_sorted[positions] == art_ids
+        return np.where(is_found, self.art_ids_sorted_indices[positions], -1).astype(np.int64)
+
+    def get_art_ids(self, indices: np.ndarray) -> np.ndarray:
+        return self.art_ids[indices]
+
+    def get_neighbours(self, art_index: int) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the neighbour art ids and scores of the art in row `art_index`, best first."""
+        neighbour_indices: np.ndarray = self.neighbour_indices[art_index]
+        # The tag engine pads short lists with -1.
+        is_neighbour: np.ndarray = neighbour_indices >= 0
+        return self.get_art_ids(neighbour_indices[is_neighbour]), self.neighbour_scores[art_index][is_neighbour]
+
+
+artifact_store: ArtifactStore = ArtifactStore()
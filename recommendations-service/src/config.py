@@ -2,6 +2,7 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import BaseModel
 from loguru import logger
 from pathlib import Path
+from typing import Literal
 import sys
 
 rec_dir: Path = Path(__file__).parent.parent
@@ -29,20 +30,188 @@ class Database(BaseModel):
 
 class RedisExpire(BaseModel):
     art_ids: int = 60 * 10
+    # Arts excluded for a user, see `utils.exclusion`. Short, so new likes show up soon.
+    excluded_art_ids: int = 60
+
+
+class ArtifactPaths(BaseModel):
+    """Files of one artifact version. Every rebuild writes a new version directory."""
+    root: Path
+
+    @property
+    def features(self) -> Path:
+        # Layout documented in utils/feature_store.py.
+        return self.root / "features.npy"
+
+    @property
+    def feature_norms(self) -> Path:
+        # float32 L2 norms of the rows of features.npy.
+        return self.root / "feature_norms.npy"
+
+    @property
+    def arts_neighbours_indices(self) -> Path:
+        return self.root / "arts_neighbours_indices.npy"
+
+    @property
+    def arts_neighbours_scores(self) -> Path:
+        return self.root / "arts_neighbours_scores.npy"
+
+    @property
+    def art_indices_to_ids(self) -> Path:
+        return self.root / "art_indices_to_ids.npy"
+
+    @property
+    def art_ids_sorted(self) -> Path:
+        return self.root / "art_ids_sorted.npy"
+
+    @property
+    def art_ids_sorted_indices(self) -> Path:
+        return self.root / "art_ids_sorted_indices.npy"
+
+    @property
+    def popular_art_ids(self) -> Path:
+        return self.root / "popular_art_ids.npy"
+
+    @property
+    def popular_scores(self) -> Path:
+        return self.root / "popular_scores.npy"
+
+    @property
+    def popular_tag_ids(self) -> Path:
+        return self.root / "popular_tag_ids.npy"
+
+    @property
+    def ivf_centroids(self) -> Path:
+        return self.root / "ivf_centroids.npy"
+
+    @property
+    def ivf_list_offsets(self) -> Path:
+        return self.root / "ivf_list_offsets.npy"
+
+    @property
+    def ivf_list_rows(self) -> Path:
+        return self.root / "ivf_list_rows.npy"
+
+    @property
+    def art_tag_indptr(self) -> Path:
+        # Layout documented in utils/tag_overlap.py.
+        return self.root / "art_tag_indptr.npy"
+
+    @property
+    def art_tag_ids(self) -> Path:
+        return self.root / "art_tag_ids.npy"
+
+    @property
+    def build_info(self) -> Path:
+        return self.root / "build_info.json"
 
 
 class Paths(BaseModel):
-    arts_csr: Path = rec_dir / "src/data/arts_csr_matrix.npz"
-    arts_sim_matrix: Path = rec_dir / "src/data/arts_similarity_matrix.npy"
-    art_indices_to_ids: Path = rec_dir / "src/data/art_indices_to_ids.pkl"
-    art_ids_to_indices: Path = rec_dir / "src/data/art_ids_to_indices.pkl"
+    versions_dir: Path = rec_dir / "src/data/versions"
+    # Symlink to the live directory in `versions_dir`, swapped atomically after each rebuild.
+    current_version: Path = rec_dir / "src/data/current"
+
+    # Cache shared by all builds: row `i` is the embedding of the tag with id `i`.
+    tag_embeddings: Path = rec_dir / "src/data/tag_embeddings.npy"
+    tag_embeddings_known: Path = rec_dir / "src/data/tag_embeddings_known.npy"
 
     cft_model: Path = rec_dir / "src/data/ft_cc.en.300_freqprune_100K_20K_pq_100.bin"
     pca_model: Path = rec_dir / "src/data/pca_en_300_to_100D_model.joblib"
 
+    def get_version(self, version: str) -> ArtifactPaths:
+        return ArtifactPaths(root=self.versions_dir / version)
+
+    def get_current(self) -> ArtifactPaths:
+        return ArtifactPaths(root=self.current_version.resolve())
+
 
 class Arts(BaseModel):
     max_tags: int = 20
+    tag_vector_size: int = 100
+    # Rows per keyset query when streaming the arts out of Postgres.
+    fetch_batch_size: int = 5000
+
+
+class Features(BaseModel):
+    # float16 halves the store, it is scored in float32.
+    dtype: Literal["float32", "float16"] = "float32"
+    # "padded" keeps every tag slot (max_tags * tag_vector_size columns),
+    # "mean" and "max" pool the tags into tag_vector_size columns.
+    tag_pooling: Literal["padded", "mean", "max"] = "padded"
+
+
+class IVF(BaseModel):
+    # Number of clusters, round(sqrt(n_arts)) if None.
+    n_lists: int | None = None
+    # Clusters scanned per query: more is slower and closer to the exact neighbours.
+    n_probe: int = 8
+    # Rows the cluster centroids are trained on, and k-means iterations.
+    train_size: int = 100_000
+    n_iter: int = 20
+    seed: int = 0
+
+
+class TagOverlap(BaseModel):
+    # Score of the IDF-weighted tag sets of two arts, see `utils.tag_overlap`.
+    metric: Literal["jaccard", "overlap"] = "jaccard"
+
+
+class Similarity(BaseModel):
+    top_k: int = 100
+    # Upper bound for the dense (block_rows x n_arts) float32 score block.
+    max_block_mb: int = 256
+    # "exact" scores all pairs of arts, "ivf" only arts of the `ivf.n_probe` closest clusters.
+    # "tags" scores by tag overlap only and builds without the fastText model and the feature store.
+    engine: Literal["exact", "ivf", "tags"] = "exact"
+    ivf: IVF = IVF()
+    tags: TagOverlap = TagOverlap()
+    # Seed arts accepted by one batch similarity request.
+    max_batch_seeds: int = 200
+    # Neighbour lists of arts created after the build kept in memory, see `utils.fold_in`.
+    max_folded_arts: int = 10_000
+
+
+class Diversity(BaseModel):
+    # Maximal marginal relevance re-ranking of the similar arts, applied before caching.
+    enabled: bool = False
+    # 1 keeps the cosine ranking, lower values favour arts unlike the ones ranked above.
+    mmr_lambda: float = 0.7
+    # Arts of one uploader beyond this number are moved after the others; None disables the cap.
+    max_per_uploader: int | None = 3
+    # Head of the neighbour list that is re-ranked.
+    n_candidates: int = 100
+
+
+class Popularity(BaseModel):
+    # Number of arts kept in the fallback ranking.
+    top_n: int = 1000
+    likes_weight: float = 1.0
+    views_weight: float = 0.1
+    # The popularity of an art halves every `half_life_days` after its creation.
+    half_life_days: float = 30.0
+    # Weight of the tag overlap with the requested art, 0 disables the database lookup of its tags.
+    tag_weight: float = 0.0
+
+
+class Profiles(BaseModel):
+    like_weight: float = 1.0
+    save_weight: float = 2.0
+    # The weight of a like or save halves every `half_life_days`.
+    half_life_days: float = 30.0
+    # Likes and saves, each, a profile is rebuilt from.
+    max_seed_arts: int = 500
+    # Arts ranked per "for you" request; pages are cut from them.
+    top_k: int = 500
+    # Profiles of users without new likes or saves expire from Redis.
+    expire_days: int = 90
+
+
+class Rebuild(BaseModel):
+    # Periodic rebuild interval, disabled if None.
+    interval_minutes: int | None = None
+    incremental: bool = True
+    keep_versions: int = 3
+    max_jobs_history: int = 100
 
 
 class RMQConfig(BaseModel):
@@ -51,6 +220,10 @@ class RMQConfig(BaseModel):
     host: str
     port: int = 5672
     prefetch_count: int = 50
+    # Messages handled at the same time by one server, and threads for blocking handler work
+    # (`utils.workers.run_in_worker`).
+    max_concurrency: int = 50
+    worker_threads: int = 4
 
     heartbeat: int = 120
     timeout_seconds: int = 15
@@ -68,7 +241,13 @@ class Settings(BaseSettings):
     db: Database
     rmq: RMQConfig
     arts: Arts = Arts()
+    features: Features = Features()
     paths: Paths = Paths()
+    similarity: Similarity = Similarity()
+    diversity: Diversity = Diversity()
+    popularity: Popularity = Popularity()
+    profiles: Profiles = Profiles()
+    rebuild: Rebuild = Rebuild()
     redis_ex: RedisExpire = RedisExpire()
 
     update_password: str
@@ -2,7 +2,7 @@ import numpy as np
 
 from sqlalchemy import text as sql_text
 from contextlib import asynccontextmanager
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, AsyncIterator, NamedTuple
 from datetime import datetime
 from config import logger, settings
 
@@ -11,44 +11,122 @@ from .db import db_manager
 if TYPE_CHECKING:
     from sqlalchemy.ext.asyncio import AsyncSession
     from sqlalchemy import TextClause, Result
+    from typing import Sequence
+
+
+class ArtsBatch(NamedTuple):
+    """Columns of consecutive art rows, as numpy arrays."""
+    art_ids: np.ndarray  # int64
+    user_ids: np.ndarray  # int64
+    like_counts: np.ndarray  # float64
+    view_counts: np.ndarray  # float64
+    tag_ids: np.ndarray  # int64, (n_arts x max_tags) padded with -1
+
+    @classmethod
+    def from_rows(cls, rows: "Sequence") -> "ArtsBatch":
+        """Fills preallocated arrays from (id, user_id, likes_count, views_count, tags) rows."""
+        n: int = len(rows)
+        max_tags: int = settings.arts.max_tags
+        batch = cls(
+            art_ids=np.empty(n, dtype=np.int64),
+            user_ids=np.empty(n, dtype=np.int64),
+            like_counts=np.empty(n, dtype=np.float64),
+            view_counts=np.empty(n, dtype=np.float64),
+            tag_ids=np.full((n, max_tags), -1, dtype=np.int64),
+        )
+        for i, (art_id, user_id, likes_count, views_count, tags) in enumerate(rows):
+            batch.art_ids[i] = art_id
+            batch.user_ids[i] = user_id
+            batch.like_counts[i] = likes_count
+            batch.view_counts[i] = views_count
+            tags = tags[:max_tags]
+            batch.tag_ids[i, :len(tags)] = tags
+        return batch
+
+    def take(self, mask: np.ndarray) -> "ArtsBatch":
+        return ArtsBatch(*(column[mask] for column in self))
+
+
+class ArtsStats(NamedTuple):
+    n_arts: int
+    max_id: int
+    likes_range: tuple[float, float]
+    views_range: tuple[float, float]
+
+
+# Arts without tags are not part of the feature matrix.
+_ARTS_WITH_TAGS: str = """
+    created_at >= :start_date
+    AND EXISTS (SELECT 1 FROM arts_to_tags WHERE arts_to_tags.art_id = arts.id)
+"""
 
 
 class ArtsService:
     @staticmethod
-    async def get_new_arts_data(start_date: datetime = None) -> list[list]:
+    async def get_arts_stats(start_date: datetime = None) -> ArtsStats | None:
         """
-        Fetches art data from the database, starting from the specified date, and converts it into a feature matrix.
+        Counts the arts with tags created since `start_date` and the ranges of their counters.
 
-        Args:
-            start_date (datetime, optional): The starting date for fetching data. If not provided, defaults to the earliest possible date (datetime.min).
+        The returned `max_id` bounds `iter_arts_data`, so arts created while the batches are
+        being read don't change the number of rows.
 
         Returns:
-            list[list]: A 2D list where:
-                - Each inner list represents an individual art record.
-                - The structure of each row is as follows:
-                    1. id (int): The ID of the art.
-                    2. user_id (int): The ID of the user associated with the art.
-                    3. likes_count (int): The number of likes the art has received.
-                    4. views_count (int): The number of views the art has received.
-                    5. tags (list[int]): A list of tag IDs associated with the art.
-
-        Matrix format:
-            Each row contains:
-                [id, user_id, likes_count, views_count, [tag1, tag2, ..., tagN]]
-            where `tags` is a list of integers.
+            ArtsStats | None: None if there are no such arts.
+        """
+        if start_date is None:
+            start_date: datetime = datetime.min
+        stmt: "TextClause" = sql_text(f"""
+                SELECT count(*) AS n_arts, max(id) AS max_id,
+                       min(likes_count) AS min_likes, max(likes_count) AS max_likes,
+                       min(views_count) AS min_views, max(views_count) AS max_views
+                FROM arts
+                WHERE {_ARTS_WITH_TAGS};
+                """)
+        async with db_manager.async_session_maker() as session:
+            sql_result: "Result" = await session.execute(stmt, {"start_date": start_date})
+        row = sql_result.mappings().one()
+        logger.info(f"start_date = {start_date}, n_arts = {row['n_arts']}")
+        if row["n_arts"] == 0:
+            return None
+        return ArtsStats(
+            n_arts=row["n_arts"],
+            max_id=row["max_id"],
+            likes_range=(row["min_likes"], row["max_likes"]),
+            views_range=(row["min_views"], row["max_views"]),
+        )
+
+    @staticmethod
+    async def iter_arts_data(
+            max_id: int,
+            start_date: datetime = None,
+            batch_size: int = 5000,
+    ) -> AsyncIterator[ArtsBatch]:
+        """
+        Streams the arts with tags created since `start_date`, ordered by id, in batches.
+
+        Every batch is a separate keyset query (`id > last id of the previous batch`),
+        so neither the database nor this process ever holds more than one batch of rows.
+
+        Args:
+            max_id (int): The largest art id to read, see `get_arts_stats`.
+            start_date (datetime, optional): Only arts created at or after this date are read.
+                Defaults to the earliest possible date (datetime.min).
+            batch_size (int): The maximum number of arts per batch.
+
+        Yields:
+            ArtsBatch: The next `batch_size` arts. Each art has its
+                id, user_id, likes_count, views_count and tag ids.
 
         Example:
             For the following database records:
                 id | user_id | likes_count | views_count | tags
                 1  | 101     | 10          | 200         | [1, 2, 4]
                 2  | 102     | 15          | 250         | [3, 7]
-            The resulting matrix would be:
-                [
-                    [1, 101, 10, 200, [1, 2, 4]],
-                    [2, 102, 15, 250, [3, 7]]
-                ]
+            a single batch is yielded with
+                art_ids = [1, 2], user_ids = [101, 102], like_counts = [10, 15],
+                view_counts = [200, 250], tag_ids = [[1, 2, 4, -1, ...], [3, 7, -1, ...]]
         """
-        logger.info(f"STARTED start_date={start_date}")
+        logger.info(f"STARTED start_date={start_date}, max_id={max_id}")
         if start_date is None:
             start_date: datetime = datetime.min
         stmt: "TextClause" = sql_text("""
@@ -56,18 +134,43 @@ class ArtsService:
                 FROM arts
                 JOIN arts_to_tags
                 ON arts.id = arts_to_tags.art_id
-                WHERE created_at >= :start_date
+                WHERE created_at >= :start_date AND arts.id > :last_id AND arts.id <= :max_id
+                GROUP BY arts.id, arts.user_id, arts.likes_count, arts.views_count
+                ORDER BY arts.id
+                LIMIT :batch_size;
+                """)
+        last_id: int = 0
+        while True:
+            async with db_manager.async_session_maker() as session:
+                sql_result: "Result" = await session.execute(stmt, {
+                    "start_date": start_date,
+                    "last_id": last_id,
+                    "max_id": max_id,
+                    "batch_size": batch_size,
+                })
+                rows: list = sql_result.all()
+            if not rows:
+                return
+            batch: ArtsBatch = ArtsBatch.from_rows(rows)
+            logger.debug(f"last_id = {last_id}, len(batch) = {len(batch.art_ids)}")
+            yield batch
+            last_id = int(batch.art_ids[-1])
+
+    @staticmethod
+    async def get_arts_data(art_ids: list[int]) -> ArtsBatch:
+        """Fetches the data of the given arts. Arts that don't exist or have no tags are omitted."""
+        logger.info(f"STARTED len(art_ids) = {len(art_ids)}")
+        stmt: "TextClause" = sql_text("""
+                SELECT arts.id, arts.user_id, arts.likes_count, arts.views_count, array_agg(arts_to_tags.tag_id) as tags
+                FROM arts
+                JOIN arts_to_tags
+                ON arts.id = arts_to_tags.art_id
+                WHERE arts.id = ANY(:art_ids)
                 GROUP BY arts.id, arts.user_id, arts.likes_count, arts.views_count;
                 """)
         async with db_manager.async_session_maker() as session:
-            sql_result: "Result" = await session.execute(stmt, {"start_date": start_date})
-        logger.debug(f"SQL query executed")
-
-        matrix: list = list()
-        for r in sql_result.mappings():
-            row = [r["id"], r["user_id"], r["likes_count"], r["views_count"], r["tags"]]
-            matrix.append(row)
-        return matrix
+            sql_result: "Result" = await session.execute(stmt, {"art_ids": list(art_ids)})
+        return ArtsBatch.from_rows(sql_result.all())
 
     @staticmethod
     async def get_all_tags() -> list[tuple[int, str]]:
@@ -77,3 +180,99 @@ class ArtsService:
         tags: list[tuple[int, str]] = [(i["id"], i["name"]) for i in sql_result.mappings()]
 
         return tags
+
+    @staticmethod
+    async def get_popular_arts(
+            top_n: int,
+            likes_weight: float,
+            views_weight: float,
+            half_life_days: float,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Ranks the arts by time-decayed popularity in the database and fetches only the best ones.
+        The score is `utils.popularity.get_popularity_scores` computed in SQL.
+
+        Args:
+            top_n (int): The number of arts to fetch.
+            likes_weight (float): Weight of the log-scaled likes_count.
+            views_weight (float): Weight of the log-scaled views_count.
+            half_life_days (float): The score halves every `half_life_days` after the art's creation.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Art ids (int64) and their scores (float32), best first.
+        """
+        stmt: "TextClause" = sql_text("""
+                SELECT id,
+                       (CAST(:likes_weight AS double precision) * ln(1 + likes_count)
+                        + CAST(:views_weight AS double precision) * ln(1 + views_count))
+                       * power(2, -greatest(CAST(EXTRACT(EPOCH FROM (now() - created_at)) AS double precision) / 86400, 0)
+                                  / CAST(:half_life_days AS double precision)) AS score
+                FROM arts
+                ORDER BY score DESC, id
+                LIMIT :top_n;
+                """)
+        params: dict = {
+            "top_n": top_n,
+            "likes_weight": likes_weight,
+            "views_weight": views_weight,
+            "half_life_days": half_life_days,
+        }
+        async with db_manager.async_session_maker() as session:
+            sql_result: "Result" = await session.execute(stmt, params)
+        rows: list = sql_result.all()
+        logger.info(f"len(rows) = {len(rows)}")
+
+        art_ids: np.ndarray = np.array([i[0] for i in rows], dtype=np.int64)
+        scores: np.ndarray = np.array([i[1] for i in rows], dtype=np.float32)
+        return art_ids, scores
+
+    @staticmethod
+    async def get_tag_ids(art_ids: list[int]) -> dict[int, list[int]]:
+        """Returns the tag ids of each of the given arts. Arts without tags are omitted."""
+        stmt: "TextClause" = sql_text("""
+                SELECT art_id, array_agg(tag_id) AS tags
+                FROM arts_to_tags
+                WHERE art_id = ANY(:art_ids)
+                GROUP BY art_id;
+                """)
+        async with db_manager.async_session_maker() as session:
+            sql_result: "Result" = await session.execute(stmt, {"art_ids": list(art_ids)})
+        return {i["art_id"]: i["tags"] for i in sql_result.mappings()}
+
+    @staticmethod
+    async def get_user_art_ids(user_id: int, limit: int) -> tuple[list[int], list[int]]:
+        """
+        Returns the ids of the arts the user liked and saved, newest arts first,
+        at most `limit` of each.
+        """
+        stmt: "TextClause" = sql_text("""
+                (SELECT 'like' AS kind, art_id FROM users_to_likes
+                 WHERE user_id = :user_id ORDER BY art_id DESC LIMIT :limit)
+                UNION ALL
+                (SELECT 'save' AS kind, art_id FROM users_to_saves
+                 WHERE user_id = :user_id ORDER BY art_id DESC LIMIT :limit);
+                """)
+        async with db_manager.async_session_maker() as session:
+            sql_result: "Result" = await session.execute(stmt, {"user_id": user_id, "limit": limit})
+        liked: list[int] = []
+        saved: list[int] = []
+        for kind, art_id in sql_result.all():
+            (liked if kind == "like" else saved).append(art_id)
+        return liked, saved
+
+    @staticmethod
+    async def get_excluded_art_ids(user_id: int, liked: bool, saved: bool, own: bool) -> list[int]:
+        """Returns the ids of the arts the user liked, saved and uploaded, as selected by the flags."""
+        queries: list[str] = []
+        if liked:
+            queries.append("SELECT art_id FROM users_to_likes WHERE user_id = :user_id")
+        if saved:
+            queries.append("SELECT art_id FROM users_to_saves WHERE user_id = :user_id")
+        if own:
+            queries.append("SELECT id AS art_id FROM arts WHERE user_id = :user_id")
+        if not queries:
+            return []
+        stmt: "TextClause" = sql_text(" UNION ".join(queries) + ";")
+        async with db_manager.async_session_maker() as session:
+            sql_result: "Result" = await session.execute(stmt, {"user_id": user_id})
+        return [i[0] for i in sql_result.all()]
@@ -0,0 +1,123 @@
+import asyncio
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from enum import Enum
+from uuid import uuid4
+
+from pydantic import BaseModel, Field
+
+from artifacts import artifact_store
+from config import logger, settings
+
+
+class RebuildStatus(str, Enum):
+    pending = "pending"
+    running = "running"
+    finished = "finished"
+    failed = "failed"
+
+
+class RebuildJob(BaseModel):
+    id: str = Field(default_factory=lambda: uuid4().hex)
+    incremental: bool
+    status: RebuildStatus = RebuildStatus.pending
+    created_at: datetime = Field(default_factory=lambda: datetime.now(tz=timezone.utc))
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    # Name of the published artifact version, None if there was nothing new to publish.
+    version: str | None = None
+    error: str | None = None
+
+
+def _run_rebuild(incremental: bool) -> str | None:
+    """Entry point of the worker process: runs one rebuild on its own event loop."""
+    from database.db import db_manager
+    from rec import update_similarity_matrix
+
+    async def run() -> str | None:
+        try:
+            return await update_similarity_matrix(incremental=incremental)
+        finally:
+            await db_manager.dispose()
+
+    return asyncio.run(run())
+
+
+class RebuildManager:
+    """
+    Runs similarity rebuilds in a separate process, so the event loop serving the RPC
+    queue is never blocked by the numpy work.
+
+    Jobs are executed one at a time. Their state is kept in memory, the oldest finished
+    jobs are forgotten once there are more than `max_jobs_history` of them.
+    """
+
+    def __init__(self, max_jobs_history: int):
+        self.max_jobs_history: int = max_jobs_history
+        self.jobs: OrderedDict[str, RebuildJob] = OrderedDict()
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        # "spawn" keeps the worker free of the parent's event loop, connections and mmaps.
+        self._executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    async def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, incremental: bool) -> RebuildJob:
+        job = RebuildJob(incremental=incremental)
+        self.jobs[job.id] = job
+        self._forget_old_jobs()
+
+        task: asyncio.Task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        logger.info(f"Rebuild job {job.id} submitted, incremental = {incremental}")
+        return job
+
+    def get(self, job_id: str) -> RebuildJob | None:
+        return self.jobs.get(job_id)
+
+    async def run_periodically(self, interval_minutes: int, incremental: bool) -> None:
+        while True:
+            await asyncio.sleep(interval_minutes * 60)
+            self.submit(incremental=incremental)
+
+    async def _run(self, job: RebuildJob) -> None:
+        async with self._lock:
+            job.status = RebuildStatus.running
+            job.started_at = datetime.now(tz=timezone.utc)
+            loop = asyncio.get_running_loop()
+            try:
+                job.version = await loop.run_in_executor(self._executor, _run_rebuild, job.incremental)
+                job.status = RebuildStatus.finished
+                logger.info(f"Rebuild job {job.id} finished, version = {job.version}")
+            except Exception as err:
+                job.status = RebuildStatus.failed
+                job.error = repr(err)
+                logger.critical(f"Rebuild job {job.id} failed: {err}", exc_info=True)
+            finally:
+                job.finished_at = datetime.now(tz=timezone.utc)
+        artifact_store.refresh_if_changed()
+
+    def _forget_old_jobs(self) -> None:
+        finished: list[str] = [
+            job_id for job_id, job in self.jobs.items()
+            if job.status in (RebuildStatus.finished, RebuildStatus.failed)
+        ]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_jobs_history)]:
+            del self.jobs[job_id]
+
+
+rebuild_manager: RebuildManager = RebuildManager(max_jobs_history=settings.rebuild.max_jobs_history)
@@ -2,17 +2,43 @@ import asyncio
 from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, status
 
+from artifacts import artifact_store
 from config import settings, logger
-from rabbit.similarity_server import similarity_server
-from rec import update_similarity_matrix
+from jobs import RebuildJob, rebuild_manager
+from rabbit.art_created_consumer import art_created_consumer
+from rabbit.for_you_server import ForYouRpcServer
+from rabbit.similarity_server import SimilarityBatchRpcServer, similarity_server
+from rabbit.stats import QueueStatsSnapshot, queue_stats
+from rabbit.user_activity_consumer import user_activity_consumer
 
 
 @asynccontextmanager
 async def async_lifespan(app_name: FastAPI):
+    artifact_store.load()
+    rebuild_manager.start()
     app.task = asyncio.create_task(similarity_server())
+    app.batch_task = asyncio.create_task(similarity_server(SimilarityBatchRpcServer))
+    app.for_you_task = asyncio.create_task(similarity_server(ForYouRpcServer))
+    app.art_created_task = asyncio.create_task(art_created_consumer())
+    app.user_activity_task = asyncio.create_task(user_activity_consumer())
+    app.rebuild_task = None
+    if settings.rebuild.interval_minutes is not None:
+        app.rebuild_task = asyncio.create_task(
+            rebuild_manager.run_periodically(
+                interval_minutes=settings.rebuild.interval_minutes,
+                incremental=settings.rebuild.incremental,
+            )
+        )
     yield
+    if app.rebuild_task is not None:
+        app.rebuild_task.cancel()
+    await rebuild_manager.shutdown()
+    app.user_activity_task.cancel()
+    app.art_created_task.cancel()
+    app.for_you_task.cancel()
+    app.batch_task.cancel()
     app.task.cancel()
 
 
@@ -23,13 +49,26 @@ app = FastAPI(
 
 
 @app.post("/update-similarity-matrix")
-async def update_sim(key_word: str):
+async def update_sim(key_word: str, incremental: bool = False) -> RebuildJob | None:
     if key_word == settings.update_password:
         logger.info("password is correct")
-        await update_similarity_matrix()
+        return rebuild_manager.submit(incremental=incremental)
     else:
         logger.info("password is incorrect")
 
 
+@app.get("/update-similarity-matrix/{job_id}")
+async def get_update_sim_job(job_id: str) -> RebuildJob:
+    job: RebuildJob | None = rebuild_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@app.get("/rpc-stats")
+async def get_rpc_stats() -> list[QueueStatsSnapshot]:
+    return [stats.snapshot() for stats in queue_stats.values()]
+
+
 if __name__ == "__main__":
     uvicorn.run(app=app, port=8002, host="0.0.0.0")
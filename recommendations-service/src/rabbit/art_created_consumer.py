@@ -0,0 +1,52 @@
+import asyncio
+from typing import TYPE_CHECKING
+
+from aio_pika import connect
+from aio_pika.exceptions import AMQPException
+
+from config import logger, settings
+from exceptions import ArtNotFoundException
+from rec import get_similar_arts
+
+if TYPE_CHECKING:
+    from aio_pika.abc import AbstractConnection, AbstractIncomingMessage
+
+# Published by art-service after an art is created; the body is the art id.
+ART_CREATED: str = "art_created"
+
+
+async def _on_art_created(message: "AbstractIncomingMessage") -> None:
+    async with message.process(requeue=False):
+        art_id: int = int(message.body.decode())
+        try:
+            # Folds the art in and warms the Redis cache.
+            await get_similar_arts(art_id)
+        except ArtNotFoundException as e:
+            logger.warning(f"Art was not folded in: {e}")
+
+
+async def _run_art_created_consumer() -> None:
+    connection: "AbstractConnection" = await connect(
+        url=settings.rmq.get_connection_url(),
+        client_properties={"heartbeat": settings.rmq.heartbeat},
+    )
+    async with connection:
+        channel = await connection.channel()
+        await channel.set_qos(prefetch_count=settings.rmq.prefetch_count)
+        queue = await channel.declare_queue(name=ART_CREATED)
+        await queue.consume(_on_art_created)
+        logger.info("ArtCreatedConsumer connected to RabbitMQ and queue declared successfully.")
+        await asyncio.Future()
+
+
+async def art_created_consumer():
+    while True:
+        try:
+            await _run_art_created_consumer()
+        except asyncio.CancelledError:
+            logger.info("Art created consumer task was cancelled.")
+            raise
+        except (AMQPException, OSError) as err:
+            logger.critical(f"Art created consumer encountered an error: {err}", exc_info=True)
+            logger.info("Restarting art created consumer...")
+            await asyncio.sleep(5)
@@ -0,0 +1,43 @@
+import json
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from rec import get_for_you_arts, get_page
+from utils.exclusion import ArtExclusion, ExclusionSpec, resolve_exclusion
+from .rpc_server import RmqRpcServer
+
+FOR_YOU_REQUEST: str = "for_you_request"
+
+
+class ForYouRequest(BaseModel):
+    user_id: int
+    offset: int = Field(default=0, ge=0)
+    limit: int | None = Field(default=None, ge=0)
+    exclude: list[int] = []
+    # Usually the requesting user's own likes, saves and arts.
+    exclude_for: ExclusionSpec | None = None
+
+
+class ForYouRpcServer(RmqRpcServer):
+    """Serves pages of the arts ranked by the requesting user's profile."""
+
+    def __init__(self):
+        super().__init__(queue_name=FOR_YOU_REQUEST)
+
+    async def msg_handler(self, message_body: str) -> str:
+        page: np.ndarray = await self._get_page(ForYouRequest.model_validate_json(message_body))
+        return json.dumps(page.tolist())
+
+    async def data_handler(self, data: dict, headers: dict) -> np.ndarray:
+        return await self._get_page(ForYouRequest.model_validate(data))
+
+    @staticmethod
+    async def _get_page(request: ForYouRequest) -> np.ndarray:
+        exclusion: ArtExclusion | None = None
+        if request.exclude_for is not None:
+            exclusion = await resolve_exclusion(request.exclude_for)
+        # The ranking is extended by the excluded arts, so the exclusion doesn't shorten it.
+        n_extra: int = len(request.exclude) + (len(exclusion) if exclusion is not None else 0)
+        art_ids: np.ndarray = await get_for_you_arts(request.user_id, n_extra)
+        return get_page(art_ids, request.offset, request.limit, request.exclude, exclusion)
@@ -1,7 +1,10 @@
-from typing import TYPE_CHECKING
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
 from aio_pika import connect, Message
 from aio_pika.exceptions import AMQPException
 from config import settings, logger
+from . import codec
+from .stats import QueueStats, get_queue_stats
 
 import asyncio
 
@@ -14,7 +17,6 @@ if TYPE_CHECKING:
         AbstractIncomingMessage
     )
 
-
 class RmqRpcServer:
     def __init__(self, queue_name: str):
         self.queue_name: str = queue_name
@@ -22,6 +24,9 @@ class RmqRpcServer:
         self.channel: "AbstractChannel" | None = None
         self.queue: "AbstractQueue" | None = None
         self.exchange: "AbstractExchange" | None = None
+        self.stats: QueueStats = get_queue_stats(queue_name)
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(settings.rmq.max_concurrency)
+        self._tasks: set[asyncio.Task] = set()
 
     async def connect(self):
         while True:
@@ -34,6 +39,8 @@ class RmqRpcServer:
                     }
                 )
                 self.channel = await self.connection.channel()
+                # Without a prefetch limit the broker pushes the whole backlog into this consumer.
+                await self.channel.set_qos(prefetch_count=settings.rmq.prefetch_count)
                 self.queue = await self.channel.declare_queue(name=self.queue_name)
                 self.exchange = self.channel.default_exchange
                 break
@@ -44,30 +51,89 @@ class RmqRpcServer:
     async def msg_handler(self, message_body: str) -> str:
         return message_body
 
+    async def data_handler(self, data: Any, headers: dict[str, Any]) -> Any:
+        """Handles a request sent in a binary codec. `data` is already decoded."""
+        raise ValueError(f"{self.queue_name} does not accept binary requests")
+
+    async def handle(self, message: "AbstractIncomingMessage") -> tuple[bytes, str]:
+        """
+        Dispatches the request by its content type: JSON text goes to `msg_handler`,
+        any other codec to `data_handler`.
+
+        Returns:
+            tuple[bytes, str]: The encoded reply and its content type.
+        """
+        if codec.is_json(message.content_type):
+            message_body: str = message.body.decode()
+            logger.debug(f"message_body = {message_body}")
+            response: str = await self.msg_handler(message_body)
+            return response.encode(), codec.JSON
+
+        content_type: str = codec.get_reply_content_type(message)
+        data: Any = codec.decode(message.body, message.content_type)
+        response_data: Any = await self.data_handler(data, dict(message.headers or {}))
+        return codec.encode(response_data, content_type), content_type
+
+    async def _handle_message(self, message: "AbstractIncomingMessage") -> None:
+        self.stats.started()
+        started_at: float = perf_counter()
+        failed: bool = False
+        try:
+            async with message.process():
+                assert message.reply_to is not None
+                try:
+                    response, content_type = await self.handle(message)
+                except Exception as err:
+                    await self._reply_error(message, err)
+                    raise
+
+                await self.exchange.publish(
+                    Message(
+                        body=response,
+                        content_type=content_type,
+                        correlation_id=message.correlation_id,
+                    ),
+                    routing_key=message.reply_to
+                )
+                logger.info(f"Sent response")
+        except Exception as err:
+            failed = True
+            logger.error(f"Failed to handle message {message.correlation_id}: {err}", exc_info=True)
+        finally:
+            self.stats.finished(perf_counter() - started_at, failed=failed)
+            self._semaphore.release()
+
+    async def _reply_error(self, message: "AbstractIncomingMessage", err: Exception) -> None:
+        """Tells the caller at once that its request failed, instead of letting it wait out its deadline."""
+        try:
+            await self.exchange.publish(
+                Message(
+                    body=b"",
+                    headers={codec.ERROR_HEADER: f"{type(err).__name__}: {err}"},
+                    correlation_id=message.correlation_id,
+                ),
+                routing_key=message.reply_to
+            )
+        except AMQPException as publish_err:
+            logger.error(f"Failed to send the error reply to {message.correlation_id}: {publish_err}")
+
     async def process_messages(self):
         try:
             async with self.queue.iterator() as q_iterator:
                 async for message in q_iterator:
                     message: "AbstractIncomingMessage"
-                    async with message.process():
-                        assert message.reply_to is not None
-                        message_body: str = message.body.decode()
-                        logger.debug(f"message_body = {message_body}")
-                        response: str = await self.msg_handler(message_body)
-
-                        await self.exchange.publish(
-                            Message(
-                                body=response.encode(),
-                                correlation_id=message.correlation_id,
-                            ),
-                            routing_key=message.reply_to
-                        )
-                        logger.info(f"Sent response")
+                    await self._semaphore.acquire()
+                    task: asyncio.Task = asyncio.create_task(self._handle_message(message))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
         except AMQPException as err:
             logger.critical(f"Error: {err}", exc_info=True)
         except Exception as err:
             logger.critical(f"Unexpected error during message processing: {err}", exc_info=True)
         finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
             await self.cleanup()
 
     async def cleanup(self) -> None:
@@ -1,12 +1,60 @@
 import asyncio
 from .rpc_server import RmqRpcServer
 import json
-import pickle
+from typing import Literal
+
+import numpy as np
+from pydantic import BaseModel, Field, model_validator
 from config import logger, settings
-from rec import get_similar_arts
+from rec import count_excluded, get_fallback_arts, get_page, get_similar_arts, get_similar_to_many
 from exceptions import ArtNotFoundException
+from utils.exclusion import ArtExclusion, ExclusionSpec, resolve_exclusion
 
 SIMILARITY_REQUEST: str = "similarity_request"
+SIMILARITY_BATCH_REQUEST: str = "similarity_batch_request"
+
+
+class SimilarityRequest(BaseModel):
+    art_id: int
+    offset: int = Field(default=0, ge=0)
+    # None returns every stored neighbour.
+    limit: int | None = Field(default=None, ge=0)
+    exclude: list[int] = []
+    # Arts the requesting user has already seen.
+    exclude_for: ExclusionSpec | None = None
+    # "tags" scores by tag overlap, None serves the neighbour lists of `similarity.engine`.
+    engine: Literal["tags"] | None = None
+
+    @classmethod
+    def from_message(cls, message_body: str) -> "SimilarityRequest":
+        # Older clients send the bare art id.
+        if message_body.lstrip().startswith("{"):
+            return cls.model_validate_json(message_body)
+        return cls(art_id=int(message_body))
+
+
+class SimilarityBatchRequest(BaseModel):
+    art_ids: list[int] = Field(min_length=1, max_length=settings.similarity.max_batch_seeds)
+    # One weight per seed, 1 each if None.
+    weights: list[float] | None = None
+    offset: int = Field(default=0, ge=0)
+    limit: int | None = Field(default=None, ge=0)
+    exclude: list[int] = []
+    exclude_for: ExclusionSpec | None = None
+
+    @model_validator(mode="after")
+    def check_weights(self) -> "SimilarityBatchRequest":
+        if self.weights is not None and len(self.weights) != len(self.art_ids):
+            raise ValueError("weights must have one entry per art id")
+        return self
+
+
+def _is_short(page: np.ndarray, limit: int | None) -> bool:
+    return limit is None or len(page) < limit
+
+
+def _get_n_extra(exclude: list[int], exclusion: ArtExclusion | None) -> int:
+    return len(exclude) + (len(exclusion) if exclusion is not None else 0)
 
 
 class SimilarityRpcServer(RmqRpcServer):
@@ -14,26 +62,69 @@ class SimilarityRpcServer(RmqRpcServer):
         super().__init__(queue_name=SIMILARITY_REQUEST)
 
     async def msg_handler(self, message_body: str) -> str:
+        page: np.ndarray = await self._get_page(SimilarityRequest.from_message(message_body))
+        response: str = json.dumps(page.tolist())
+        return response
+
+    async def data_handler(self, data: dict, headers: dict) -> np.ndarray:
+        return await self._get_page(SimilarityRequest.model_validate(data))
+
+    @staticmethod
+    async def _get_page(request: SimilarityRequest) -> np.ndarray:
+        is_similar: bool = True
         try:
-            art_id: int = int(message_body)
-            similar_art_ids: list[int] = get_similar_arts(art_id)
-            response: str = json.dumps(similar_art_ids)
-            return response
+            art_ids: np.ndarray = await get_similar_arts(request.art_id, request.engine)
         except ArtNotFoundException as e:
             logger.error(f"Expected Exception: {e}")
-            logger.info("Returning alternative output")
-            with open(settings.paths.art_ids_to_indices, "rb") as file:
-                art_ids_to_indices: dict = pickle.load(file)
-            art_ids: list[int] = [int(i) for i in art_ids_to_indices]
-            response: str = json.dumps(art_ids)
-            return response
+            logger.info("Returning popular arts")
+            art_ids = await get_fallback_arts(request.art_id)
+            is_similar = False
+        exclusion: ArtExclusion | None = None
+        if request.exclude_for is not None:
+            exclusion = await resolve_exclusion(request.exclude_for)
+        exclude: list[int] = request.exclude + [request.art_id]
+        page: np.ndarray = get_page(art_ids, request.offset, request.limit, exclude, exclusion)
+        if is_similar and _is_short(page, request.limit) and count_excluded(art_ids, exclude, exclusion):
+            # The exclusion cut into the stored neighbours, search a ranking long enough to fill the page.
+            art_ids = await get_similar_arts(request.art_id, request.engine, n_extra=_get_n_extra(exclude, exclusion))
+            page = get_page(art_ids, request.offset, request.limit, exclude, exclusion)
+        return page
+
+
+class SimilarityBatchRpcServer(RmqRpcServer):
+    """Serves one merged, deduplicated page of the arts similar to a set of seed arts."""
+
+    def __init__(self):
+        super().__init__(queue_name=SIMILARITY_BATCH_REQUEST)
+
+    async def msg_handler(self, message_body: str) -> str:
+        page: np.ndarray = await self._get_page(SimilarityBatchRequest.model_validate_json(message_body))
+        return json.dumps(page.tolist())
+
+    async def data_handler(self, data: dict, headers: dict) -> np.ndarray:
+        return await self._get_page(SimilarityBatchRequest.model_validate(data))
+
+    @staticmethod
+    async def _get_page(request: SimilarityBatchRequest) -> np.ndarray:
+        art_ids: np.ndarray = await get_similar_to_many(request.art_ids, request.weights)
+        exclusion: ArtExclusion | None = None
+        if request.exclude_for is not None:
+            exclusion = await resolve_exclusion(request.exclude_for)
+        exclude: list[int] = request.exclude + request.art_ids
+        page: np.ndarray = get_page(art_ids, request.offset, request.limit, exclude, exclusion)
+        if _is_short(page, request.limit) and count_excluded(art_ids, exclude, exclusion):
+            art_ids = await get_similar_to_many(
+                request.art_ids, request.weights, n_extra=_get_n_extra(exclude, exclusion)
+            )
+            page = get_page(art_ids, request.offset, request.limit, exclude, exclusion)
+        return page
 
 
-async def _run_similarity_rpc_server() -> None:
-    similarity_rpc_server = SimilarityRpcServer()
+async def _run_similarity_rpc_server(server_class: type[RmqRpcServer] = SimilarityRpcServer) -> None:
+    similarity_rpc_server = server_class()
     try:
         await similarity_rpc_server.connect()
-        logger.info("SimilarityRpcServer connected to RabbitMQ and queue declared successfully.")
+        logger.info(f"{server_class.__name__} connected to RabbitMQ and queue declared successfully.")
         await similarity_rpc_server.process_messages()
     except Exception as err:
         logger.critical(f"Exception: {err}", exc_info=True)
@@ -41,12 +132,12 @@ async def _run_similarity_rpc_server() -> None:
         raise err
 
 
-async def similarity_server():
+async def similarity_server(server_class: type[RmqRpcServer] = SimilarityRpcServer):
     similarity_server_task: asyncio.Task | None = None
     try:
         while True:
             if similarity_server_task is None or similarity_server_task.done():
-                similarity_server_task = asyncio.create_task(_run_similarity_rpc_server())
+                similarity_server_task = asyncio.create_task(_run_similarity_rpc_server(server_class))
             try:
                 await similarity_server_task
             except asyncio.CancelledError:
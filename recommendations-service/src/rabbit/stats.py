@@ -0,0 +1,61 @@
+from collections import deque
+
+import numpy as np
+from pydantic import BaseModel
+
+
+class QueueStatsSnapshot(BaseModel):
+    queue_name: str
+    in_flight: int
+    processed: int
+    failed: int
+    latency_avg_ms: float
+    latency_p50_ms: float
+    latency_p99_ms: float
+    latency_max_ms: float
+
+
+class QueueStats:
+    """In-flight and latency counters of one RPC queue. Percentiles cover the last `window` messages."""
+
+    def __init__(self, queue_name: str, window: int = 1000):
+        self.queue_name: str = queue_name
+        self.in_flight: int = 0
+        self.processed: int = 0
+        self.failed: int = 0
+        self.latency_total: float = 0.0
+        self.latency_max: float = 0.0
+        self._latencies: deque[float] = deque(maxlen=window)
+
+    def started(self) -> None:
+        self.in_flight += 1
+
+    def finished(self, latency: float, failed: bool = False) -> None:
+        self.in_flight -= 1
+        self.processed += 1
+        self.failed += int(failed)
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self._latencies.append(latency)
+
+    def snapshot(self) -> QueueStatsSnapshot:
+        p50, p99 = np.percentile(self._latencies, [50, 99]) if self._latencies else (0.0, 0.0)
+        return QueueStatsSnapshot(
+            queue_name=self.queue_name,
+            in_flight=self.in_flight,
+            processed=self.processed,
+            failed=self.failed,
+            latency_avg_ms=self.latency_total / max(self.processed, 1) * 1000,
+            latency_p50_ms=float(p50) * 1000,
+            latency_p99_ms=float(p99) * 1000,
+            latency_max_ms=self.latency_max * 1000,
+        )
+
+
+queue_stats: dict[str, QueueStats] = {}
+
+
+def get_queue_stats(queue_name: str) -> QueueStats:
+    if queue_name not in queue_stats:
+        queue_stats[queue_name] = QueueStats(queue_name)
+    return queue_stats[queue_name]
@@ -0,0 +1,58 @@
+import asyncio
+from typing import TYPE_CHECKING
+
+from aio_pika import connect
+from aio_pika.exceptions import AMQPException
+from pydantic import BaseModel, ValidationError
+
+from config import logger, settings
+from utils.profiles import ProfileAction, update_profile
+
+if TYPE_CHECKING:
+    from aio_pika.abc import AbstractConnection, AbstractIncomingMessage
+
+# Published by art-service after a like or save is added or removed.
+USER_ACTIVITY: str = "user_activity"
+
+
+class UserActivityEvent(BaseModel):
+    user_id: int
+    art_id: int
+    action: ProfileAction
+
+
+async def _on_user_activity(message: "AbstractIncomingMessage") -> None:
+    async with message.process(requeue=False):
+        try:
+            event: UserActivityEvent = UserActivityEvent.model_validate_json(message.body)
+        except ValidationError as e:
+            logger.error(f"Invalid {USER_ACTIVITY} event: {e}")
+            return
+        await update_profile(event.user_id, event.art_id, event.action)
+
+
+async def _run_user_activity_consumer() -> None:
+    connection: "AbstractConnection" = await connect(
+        url=settings.rmq.get_connection_url(),
+        client_properties={"heartbeat": settings.rmq.heartbeat},
+    )
+    async with connection:
+        channel = await connection.channel()
+        await channel.set_qos(prefetch_count=settings.rmq.prefetch_count)
+        queue = await channel.declare_queue(name=USER_ACTIVITY)
+        await queue.consume(_on_user_activity)
+        logger.info("UserActivityConsumer connected to RabbitMQ and queue declared successfully.")
+        await asyncio.Future()
+
+
+async def user_activity_consumer():
+    while True:
+        try:
+            await _run_user_activity_consumer()
+        except asyncio.CancelledError:
+            logger.info("User activity consumer task was cancelled.")
+            raise
+        except (AMQPException, OSError) as err:
+            logger.critical(f"User activity consumer encountered an error: {err}", exc_info=True)
+            logger.info("Restarting user activity consumer...")
+            await asyncio.sleep(5)
@@ -1,50 +1,460 @@
-import pickle
+import shutil
 
 import numpy as np
-from scipy.sparse import csr_matrix, load_npz
-from sklearn.metrics.pairwise import cosine_similarity
 
-from config import logger, settings
+from artifacts import (
+    BuildInfo,
+    artifact_store,
+    create_version,
+    load_build_info,
+    load_ivf_index,
+    load_tag_index,
+    publish_version,
+    remove_old_versions,
+    save_array,
+    save_build_info,
+    save_ivf_index,
+)
+from config import ArtifactPaths, logger, settings
+from database.arts import ArtsService
 from exceptions import ArtNotFoundException
-from red import r
-from utils.data_processor import update_arts_matrix
-
-
-def get_sim_from_arts_matrix():
-    matrix: csr_matrix = load_npz(settings.paths.arts_csr)
-    similarity_matrix: np.ndarray = cosine_similarity(matrix)
-    np.save(settings.paths.arts_sim_matrix, similarity_matrix)
-
-
-def get_similar_arts(art_id: int):
-    redis_key_name = f"similar_arts_for_{art_id}"
-    art_ids = r.lrange(redis_key_name, 0, -1)
-    if art_ids:
-        return [int(i) for i in art_ids]
-    with open(settings.paths.art_ids_to_indices, "rb") as file:
-        art_ids_to_indices: dict = pickle.load(file)
-    with open(settings.paths.art_indices_to_ids, "rb") as file:
-        art_indices_to_ids: dict = pickle.load(file)
-    if art_id not in art_ids_to_indices:
+from red import SingleFlight, get_ids, set_ids
+from utils.data_processor import append_arts_matrix, update_arts_matrix
+from utils.diversity import diversify
+from utils.exclusion import ArtExclusion
+from utils.feature_store import get_row_norms, load_features
+from utils.fold_in import fold_in_art, get_art_feature_rows, search_art_tags, search_features
+from utils.ivf import IVFIndex, get_ivf_neighbours
+from utils.neighbours import add_rows_to_neighbours, get_top_k_neighbours
+from utils.popularity import build_popularity, rank_popular_by_tags
+from utils.profiles import Profile, get_profile
+from utils.tag_overlap import get_tag_neighbours
+
+_similar_arts_flight: SingleFlight = SingleFlight()
+
+
+def _build_ivf_index(matrix: np.ndarray) -> IVFIndex:
+    config = settings.similarity.ivf
+    n_lists: int = config.n_lists or max(1, round(np.sqrt(len(matrix))))
+    return IVFIndex.build(
+        matrix, n_lists=n_lists, n_iter=config.n_iter, train_size=config.train_size, seed=config.seed
+    )
+
+
+def _save_tag_neighbours(paths: "ArtifactPaths") -> None:
+    neighbour_indices, neighbour_scores = get_tag_neighbours(
+        load_tag_index(paths),
+        top_k=settings.similarity.top_k,
+        max_block_mb=settings.similarity.max_block_mb,
+    )
+    save_array(paths.arts_neighbours_indices, neighbour_indices)
+    save_array(paths.arts_neighbours_scores, neighbour_scores)
+
+
+def get_sim_from_arts_matrix(paths: "ArtifactPaths"):
+    if settings.similarity.engine == "tags":
+        _save_tag_neighbours(paths)
+        return
+    matrix: np.ndarray = load_features(paths.features)
+    save_array(paths.feature_norms, get_row_norms(matrix))
+    if settings.similarity.engine == "ivf":
+        index: IVFIndex = _build_ivf_index(matrix)
+        save_ivf_index(paths, index)
+        neighbour_indices, neighbour_scores = get_ivf_neighbours(
+            matrix,
+            index,
+            top_k=settings.similarity.top_k,
+            n_probe=settings.similarity.ivf.n_probe,
+            max_block_mb=settings.similarity.max_block_mb,
+        )
+    else:
+        neighbour_indices, neighbour_scores = get_top_k_neighbours(
+            matrix,
+            top_k=settings.similarity.top_k,
+            max_block_mb=settings.similarity.max_block_mb,
+        )
+    save_array(paths.arts_neighbours_indices, neighbour_indices)
+    save_array(paths.arts_neighbours_scores, neighbour_scores)
+
+
+def update_sim_with_new_arts(old_paths: "ArtifactPaths", paths: "ArtifactPaths", n_old_arts: int):
+    if settings.similarity.engine == "tags":
+        # Rescoring all arts by their tags is cheap enough, and new tags change the IDF of all arts.
+        _save_tag_neighbours(paths)
+        return
+    matrix: np.ndarray = load_features(paths.features)
+    try:
+        old_norms: np.ndarray = np.load(old_paths.feature_norms, mmap_mode="r")
+        norms: np.ndarray = np.concatenate([old_norms, get_row_norms(matrix[n_old_arts:])])
+    except FileNotFoundError:
+        norms = get_row_norms(matrix)
+    save_array(paths.feature_norms, norms)
+    old_indices: np.ndarray = np.load(old_paths.arts_neighbours_indices, mmap_mode="r")
+    old_scores: np.ndarray = np.load(old_paths.arts_neighbours_scores, mmap_mode="r")
+    # Exact for the new rows too: their cost grows with the number of new arts only.
+    neighbour_indices, neighbour_scores = add_rows_to_neighbours(
+        matrix,
+        n_old_rows=n_old_arts,
+        old_indices=old_indices,
+        old_scores=old_scores,
+        top_k=settings.similarity.top_k,
+        max_block_mb=settings.similarity.max_block_mb,
+    )
+    save_array(paths.arts_neighbours_indices, neighbour_indices)
+    save_array(paths.arts_neighbours_scores, neighbour_scores)
+
+    if settings.similarity.engine == "ivf":
+        old_index: IVFIndex | None = load_ivf_index(old_paths)
+        index: IVFIndex = (
+            _build_ivf_index(matrix) if old_index is None else old_index.extend(matrix, n_old_arts)
+        )
+        save_ivf_index(paths, index)
+
+
+def _get_neighbours(art_id: int) -> tuple[np.ndarray, np.ndarray]:
+    artifact_store.refresh_if_changed()
+    art_index: int | None = artifact_store.get_index(art_id)
+    if art_index is None:
+        raise ArtNotFoundException(art_id)
+    # Neighbours are already sorted by similarity and never contain the art itself.
+    return artifact_store.get_neighbours(art_index)
+
+
+def _scores_by_tags(engine: str | None) -> bool:
+    """Whether a request for `engine` is scored by tag overlap on the fly instead of served from the neighbour lists."""
+    if engine != "tags" or settings.similarity.engine == "tags":
+        return False
+    if artifact_store.tag_index is None:
+        logger.warning("The live version has no tag index, serving the neighbour lists")
+        return False
+    return True
+
+
+async def _load_similar_arts(art_id: int, redis_key_name: str, engine: str | None = None) -> np.ndarray:
+    artifact_store.refresh_if_changed()
+    if _scores_by_tags(engine):
+        similar_art_ids, scores = await search_art_tags(art_id)
+    else:
+        try:
+            similar_art_ids, scores = _get_neighbours(art_id)
+        except ArtNotFoundException:
+            # Created after the last build.
+            similar_art_ids, scores = await fold_in_art(art_id)
+    if settings.diversity.enabled:
+        similar_art_ids = await diversify(similar_art_ids, scores)
+    await set_ids({redis_key_name: similar_art_ids}, ex=settings.redis_ex.art_ids)
+    return similar_art_ids
+
+
+async def search_similar_arts(art_id: int, k: int, engine: str | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Searches the live version for the top `k` arts most similar to `art_id`, for rankings longer
+    than the stored neighbour lists.
+
+    The arts are scored like the neighbour lists: by tag overlap for the tags engine, by cosine
+    similarity of the feature rows otherwise. Versions with neither serve the stored list.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Art ids without `art_id` itself, and their scores, best first.
+
+    Raises:
+        ArtNotFoundException: If the art is neither in the artifacts nor can be folded in.
+    """
+    artifact_store.refresh_if_changed()
+    build_info: BuildInfo | None = artifact_store.build_info
+    by_tags: bool = engine == "tags" or settings.similarity.engine == "tags"
+    if by_tags and artifact_store.tag_index is not None:
+        return await search_art_tags(art_id, k)
+    if build_info is None or not build_info.has_features:
+        try:
+            return _get_neighbours(art_id)
+        except ArtNotFoundException:
+            return await fold_in_art(art_id)
+
+    found_ids, rows = await get_art_feature_rows([art_id])
+    if len(found_ids) == 0:
         raise ArtNotFoundException(art_id)
-    similarity_matrix: np.ndarray = np.load(settings.paths.arts_sim_matrix)
-    art_index = art_ids_to_indices[art_id]
-
-    similar_art_indices: np.ndarray = similarity_matrix[art_index]
-    similar_art_indices = np.argsort(-similar_art_indices)
-    result = [int(art_indices_to_ids[i]) for i in similar_art_indices]
-    if art_id in result:
-        result.remove(art_id)
-
-    r.rpush(redis_key_name, *result)
-    r.expire(redis_key_name, settings.redis_ex.art_ids)
-    return result
-
-
-async def update_similarity_matrix():
-    logger.warning(f"working on forming arts matrix ...")
-    await update_arts_matrix()
-    logger.warning("arts_matrix is ready")
-    logger.warning("working on calculation similarity matrix ...")
-    get_sim_from_arts_matrix()
+    # The art itself is its own best match.
+    art_ids, scores = await search_features(rows[0], k + 1)
+    is_other: np.ndarray = art_ids != art_id
+    return art_ids[is_other][:k], scores[is_other][:k]
+
+
+async def get_similar_arts(art_id: int, engine: str | None = None, n_extra: int = 0) -> np.ndarray:
+    """
+    Returns the ids of the top-K arts most similar to `art_id`, best first.
+
+    The list is cached in Redis as packed int32. Concurrent misses for the same art
+    share one lookup.
+
+    Arts created after the last build are folded in on the first request.
+
+    Args:
+        art_id (int): The query art.
+        engine (str | None): "tags" scores by tag overlap, see `utils.tag_overlap`, whatever
+            `similarity.engine` the neighbour lists were built with. None serves the neighbour lists.
+        n_extra (int): Callers that drop arts from the ranking pass their number, the ranking is
+            then searched `similarity.top_k + n_extra` long by `search_similar_arts`, and not cached.
+
+    Raises:
+        ArtNotFoundException: If the art is neither in the artifacts nor can be folded in.
+    """
+    if n_extra > 0:
+        similar_art_ids, scores = await search_similar_arts(art_id, settings.similarity.top_k + n_extra, engine)
+        if settings.diversity.enabled:
+            similar_art_ids = await diversify(similar_art_ids, scores)
+        return similar_art_ids
+    redis_key_name = f"similar_arts:{art_id}" if engine is None else f"similar_arts:{engine}:{art_id}"
+    cached: np.ndarray | None = await get_ids(redis_key_name)
+    if cached is not None:
+        return cached
+    return await _similar_arts_flight.do(
+        (art_id, engine), lambda: _load_similar_arts(art_id, redis_key_name, engine)
+    )
+
+
+def merge_neighbours(neighbour_ids: np.ndarray, neighbour_scores: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Ranks the union of several neighbour lists by the weighted sum of their similarities.
+
+    Args:
+        neighbour_ids (np.ndarray): Concatenated neighbour ids of all seeds.
+        neighbour_scores (np.ndarray): Their cosine similarities.
+        weights (np.ndarray): The weight of the seed each neighbour belongs to.
+
+    Returns:
+        np.ndarray: Unique art ids, best first.
+    """
+    unique_ids, inverse = np.unique(neighbour_ids, return_inverse=True)
+    totals: np.ndarray = np.bincount(
+        inverse, weights=neighbour_scores.astype(np.float64) * weights, minlength=len(unique_ids)
+    )
+    return unique_ids[np.argsort(-totals, kind="stable")]
+
+
+async def get_similar_to_many(
+        art_ids: list[int],
+        weights: list[float] | None = None,
+        n_extra: int = 0,
+) -> np.ndarray:
+    """
+    Returns the arts most similar to a set of seed arts, best first.
+
+    The neighbour lists of the seeds in the artifacts are gathered in one indexing pass, seeds
+    created after the last build are folded in, and the lists are merged by `merge_neighbours`.
+    Repeated seeds add up their weights. Seeds are not removed from the result.
+
+    Args:
+        art_ids (list[int]): The seed art ids.
+        weights (list[float] | None): Weights of the seeds, 1 each if None.
+        n_extra (int): Callers that drop arts from the ranking pass their number, the neighbours
+            of every seed are then searched `similarity.top_k + n_extra` long by `search_similar_arts`.
+
+    Returns:
+        np.ndarray: The merged ranking, or the popularity ranking if no seed is known.
+    """
+    artifact_store.refresh_if_changed()
+    seed_ids, inverse = np.unique(np.asarray(art_ids, dtype=np.int64), return_inverse=True)
+    seed_weights: np.ndarray = np.bincount(
+        inverse, weights=np.ones(len(art_ids)) if weights is None else np.asarray(weights, dtype=np.float64)
+    )
+    if n_extra > 0:
+        return await _search_similar_to_many(seed_ids, seed_weights, settings.similarity.top_k + n_extra)
+    rows: list[int | None] = [artifact_store.get_index(int(art_id)) for art_id in seed_ids]
+    is_built: np.ndarray = np.array([row is not None for row in rows], dtype=bool)
+
+    built_rows: np.ndarray = np.array([row for row in rows if row is not None], dtype=np.int64)
+    ids_parts: list[np.ndarray] = []
+    scores_parts: list[np.ndarray] = []
+    weights_parts: list[np.ndarray] = []
+    if len(built_rows):
+        neighbour_indices: np.ndarray = artifact_store.neighbour_indices[built_rows]
+        # The tag engine pads short lists with -1.
+        is_neighbour: np.ndarray = neighbour_indices >= 0
+        ids_parts.append(artifact_store.get_art_ids(neighbour_indices[is_neighbour]))
+        scores_parts.append(np.asarray(artifact_store.neighbour_scores[built_rows])[is_neighbour])
+        weights_parts.append(
+            np.broadcast_to(seed_weights[is_built][:, None], neighbour_indices.shape)[is_neighbour]
+        )
+
+    for art_id, weight in zip(seed_ids[~is_built].tolist(), seed_weights[~is_built]):
+        try:
+            folded_ids, folded_scores = await fold_in_art(art_id)
+        except ArtNotFoundException:
+            continue
+        ids_parts.append(folded_ids)
+        scores_parts.append(folded_scores)
+        weights_parts.append(np.full(len(folded_ids), weight))
+
+    if not ids_parts:
+        logger.info("No seed art is known, returning popular arts")
+        return await get_fallback_arts(int(seed_ids[0]))
+    return merge_neighbours(np.concatenate(ids_parts), np.concatenate(scores_parts), np.concatenate(weights_parts))
+
+
+async def _search_similar_to_many(seed_ids: np.ndarray, seed_weights: np.ndarray, k: int) -> np.ndarray:
+    ids_parts: list[np.ndarray] = []
+    scores_parts: list[np.ndarray] = []
+    weights_parts: list[np.ndarray] = []
+    for art_id, weight in zip(seed_ids.tolist(), seed_weights):
+        try:
+            similar_art_ids, scores = await search_similar_arts(art_id, k)
+        except ArtNotFoundException:
+            continue
+        ids_parts.append(similar_art_ids)
+        scores_parts.append(scores)
+        weights_parts.append(np.full(len(similar_art_ids), weight))
+    if not ids_parts:
+        logger.info("No seed art is known, returning popular arts")
+        return await get_fallback_arts(int(seed_ids[0]))
+    return merge_neighbours(np.concatenate(ids_parts), np.concatenate(scores_parts), np.concatenate(weights_parts))
+
+
+async def get_fallback_arts(art_id: int) -> np.ndarray:
+    """
+    Returns the precomputed popularity ranking for arts missing from the artifacts,
+    e.g. arts uploaded after the last rebuild.
+
+    If `popularity.tag_weight` is set, the ranking is mixed with the tag overlap
+    between the popular arts and `art_id`.
+    """
+    artifact_store.refresh_if_changed()
+    if not artifact_store.is_loaded:
+        return np.empty(0, dtype=np.int64)
+    tag_weight: float = settings.popularity.tag_weight
+    if tag_weight <= 0:
+        return artifact_store.popular_art_ids
+
+    tag_ids: list[int] = (await ArtsService.get_tag_ids([art_id])).get(art_id, [])
+    return rank_popular_by_tags(
+        artifact_store.popular_art_ids,
+        artifact_store.popular_scores,
+        artifact_store.popular_tag_ids,
+        tag_ids,
+        tag_weight,
+    )
+
+
+async def get_for_you_arts(user_id: int, n_extra: int = 0) -> np.ndarray:
+    """
+    Ranks the arts of the live version by cosine similarity to the user's profile vector,
+    see `utils.profiles`. The ranking is `profiles.top_k + n_extra` long, callers that drop
+    arts from it pass their number as `n_extra`.
+
+    Users without likes or saves, and all users of versions without a feature store,
+    get the popularity ranking.
+    """
+    artifact_store.refresh_if_changed()
+    if not artifact_store.is_loaded:
+        return np.empty(0, dtype=np.int64)
+    if artifact_store.build_info is None or not artifact_store.build_info.has_features:
+        return artifact_store.popular_art_ids
+    profile: Profile | None = await get_profile(user_id)
+    if profile is None or not profile.vector.any():
+        return artifact_store.popular_art_ids
+    art_ids, _ = await search_features(profile.vector, settings.profiles.top_k + n_extra)
+    return art_ids
+
+
+def count_excluded(
+        art_ids: np.ndarray,
+        exclude: list[int] | None = None,
+        exclusion: "ArtExclusion | None" = None,
+) -> int:
+    """The number of ids `get_page` drops from `art_ids`."""
+    is_excluded: np.ndarray = np.zeros(len(art_ids), dtype=bool)
+    if exclude:
+        is_excluded |= np.isin(art_ids, exclude)
+    if exclusion is not None and len(exclusion):
+        is_excluded |= exclusion.contains(art_ids)
+    return int(is_excluded.sum())
+
+
+def get_page(
+        art_ids: np.ndarray,
+        offset: int = 0,
+        limit: int | None = None,
+        exclude: list[int] | None = None,
+        exclusion: "ArtExclusion | None" = None,
+) -> np.ndarray:
+    """
+    Drops the excluded ids and returns the requested page of the rest.
+
+    A ranking of K arts gives full pages over its first K ranks only if it was extended by the
+    number of excluded arts, see `n_extra` of `get_for_you_arts` and `get_similar_arts`.
+
+    Args:
+        art_ids (np.ndarray): Ranked art ids.
+        offset (int): The number of ids to skip after the exclusion.
+        limit (int | None): The maximum number of ids to return, all of them if None.
+        exclude (list[int] | None): Art ids that must not be returned.
+        exclusion (ArtExclusion | None): More arts that must not be returned, see `utils.exclusion`.
+    """
+    if exclude:
+        art_ids = art_ids[np.isin(art_ids, exclude, invert=True)]
+    if exclusion is not None and len(exclusion):
+        art_ids = art_ids[~exclusion.contains(art_ids)]
+    stop: int | None = None if limit is None else offset + limit
+    return art_ids[offset:stop]
+
+
+def _can_append(build_info: BuildInfo | None, old_paths: "ArtifactPaths") -> bool:
+    """New rows can only extend a feature store with the same column layout, and a tag incidence matrix."""
+    if build_info is None or not old_paths.art_tag_indptr.exists():
+        return False
+    if build_info.has_features != (settings.similarity.engine != "tags"):
+        logger.warning(f"Engine changed to {settings.similarity.engine}, rebuilding from scratch")
+        return False
+    if build_info.has_features and not old_paths.features.exists():
+        return False
+    if build_info.tag_pooling != settings.features.tag_pooling:
+        logger.warning(
+            f"Tag pooling changed from {build_info.tag_pooling} to {settings.features.tag_pooling}, "
+            f"rebuilding from scratch"
+        )
+        return False
+    return True
+
+
+async def update_similarity_matrix(incremental: bool = False) -> str | None:
+    """
+    Builds a new artifact version and publishes it once it is complete.
+
+    The live version is never modified, so requests keep being served from it while the
+    new one is being built, and a failed build leaves nothing behind.
+
+    Args:
+        incremental (bool): Append only the arts created since the live build, if there is one.
+
+    Returns:
+        str | None: The name of the published version, or None if there was nothing to publish.
+    """
+    old_paths: ArtifactPaths = settings.paths.get_current()
+    build_info: BuildInfo | None = load_build_info(old_paths)
+    paths: ArtifactPaths = create_version()
+    try:
+        if incremental and _can_append(build_info, old_paths):
+            logger.warning(f"working on appending new arts to arts matrix ...")
+            new_build_info: BuildInfo | None = await append_arts_matrix(build_info, old_paths, paths)
+            if new_build_info is None:
+                shutil.rmtree(paths.root)
+                return None
+            logger.warning("working on updating top-k neighbours ...")
+            update_sim_with_new_arts(old_paths, paths, n_old_arts=build_info.n_arts)
+        else:
+            logger.warning(f"working on forming arts matrix ...")
+            new_build_info: BuildInfo = await update_arts_matrix(paths)
+            logger.warning("arts_matrix is ready")
+            logger.warning("working on calculation top-k neighbours ...")
+            get_sim_from_arts_matrix(paths)
+        logger.warning("working on popularity ranking ...")
+        await build_popularity(paths)
+        save_build_info(paths, new_build_info)
+    except BaseException:
+        shutil.rmtree(paths.root, ignore_errors=True)
+        raise
+
+    publish_version(paths)
+    remove_old_versions(keep=settings.rebuild.keep_versions)
     logger.info("FINISHED update_similarity_matrix.py")
+    return paths.root.name
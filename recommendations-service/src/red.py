@@ -1,3 +1,50 @@
-import redis
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
 
-r = redis.Redis(host="localhost", port=6379, decode_responses=True)
+import numpy as np
+import redis.asyncio as redis
+
+r = redis.Redis(host="localhost", port=6379)
+
+# Art ids are stored as packed little-endian int32, 4 bytes per id.
+_IDS_DTYPE: str = "<i4"
+
+
+def pack_ids(art_ids: np.ndarray) -> bytes:
+    return np.asarray(art_ids, dtype=_IDS_DTYPE).tobytes()
+
+
+def unpack_ids(value: bytes) -> np.ndarray:
+    return np.frombuffer(value, dtype=_IDS_DTYPE)
+
+
+async def get_ids(key: str) -> np.ndarray | None:
+    value: bytes | None = await r.get(key)
+    return None if value is None else unpack_ids(value)
+
+
+async def set_ids(items: dict[str, np.ndarray], ex: int) -> None:
+    """Stores several id lists with their expiration in a single round trip."""
+    async with r.pipeline(transaction=False) as pipe:
+        for key, art_ids in items.items():
+            pipe.set(key, pack_ids(art_ids), ex=ex)
+        await pipe.execute()
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls with the same key: the first caller runs the coroutine,
+    the others wait for its result instead of computing it again.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task: asyncio.Task | None = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # A cancelled caller must not cancel the call the other callers are waiting for.
+        return await asyncio.shield(task)
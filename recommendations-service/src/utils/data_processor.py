@@ -1,91 +1,244 @@
 # Standard library imports
-from pathlib import Path
-import joblib
-import pickle
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
 
 # Third-party imports
 import numpy as np
-from scipy.sparse import csr_matrix, hstack, save_npz, vstack
-from scipy.spatial.distance import cosine
-from sklearn.decomposition import PCA
 from sklearn.preprocessing import MinMaxScaler
-from compress_fasttext.models import CompressedFastTextKeyedVectors
 
 # Local application imports
+from artifacts import BuildInfo, load_tag_incidence, save_art_ids, save_tag_incidence
 from config import logger, settings
-from database.arts import ArtsService
-
-
-def to_binary_vector(number: int, arr_len: int = 16) -> np.ndarray:
-    binary_lst = list(bin(number)[2:].zfill(arr_len))
-    return np.array(binary_lst, dtype=np.int8)
-
-
-async def _get_csr_matrix_of_vectorized_tags(tag_ids: list[list[int]]) -> csr_matrix:
-    logger.info(f"STARTED len(tag_ids) = {len(tag_ids)}")
-    vector_size = 100
-    cft_model = CompressedFastTextKeyedVectors.load(str(settings.paths.cft_model))
-    pca_model: PCA = joblib.load(str(settings.paths.pca_model))
-    logger.debug(f"cft_model and pca_model are initialized")
-
-    tag_ids = [tags[:settings.arts.max_tags] for tags in tag_ids]
-
+from database.arts import ArtsBatch, ArtsService, ArtsStats
+from utils.feature_store import (
+    N_USER_ID_BITS,
+    FeatureWriter,
+    get_n_features,
+    load_features,
+    pool_tag_embeddings,
+)
+from utils.tag_embeddings import gather_tag_embeddings, update_tag_embeddings
+from utils.tag_overlap import concat_tag_ids, pack_tag_ids
+
+if TYPE_CHECKING:
+    from config import ArtifactPaths
+
+
+def get_padded_tag_ids(tag_ids: list[list[int]]) -> np.ndarray:
+    """Packs tag id lists into a (n_arts x max_tags) int64 matrix padded with -1."""
+    max_tags: int = settings.arts.max_tags
+    padded: np.ndarray = np.full((len(tag_ids), max_tags), -1, dtype=np.int64)
+    for i, tags in enumerate(tag_ids):
+        tags = tags[:max_tags]
+        padded[i, :len(tags)] = tags
+    return padded
+
+
+def to_binary_vectors(numbers: np.ndarray, arr_len: int = 16) -> np.ndarray:
+    """One row of `arr_len` bits per number, most significant first."""
+    shifts: np.ndarray = np.arange(arr_len - 1, -1, -1)
+    return ((np.asarray(numbers)[:, None] >> shifts) & 1).astype(np.int8)
+
+
+async def get_tag_embeddings() -> np.ndarray:
+    """Returns the tag embedding store, with every tag of the `tags` table embedded."""
     arts_service = ArtsService()
     all_tags: list[tuple[int, str]] = await arts_service.get_all_tags()
-    all_tags_mapping: dict[int, str] = {i[0]: i[1] for i in all_tags}
-    logger.debug(f"len(all_tags_mapping) = {len(all_tags_mapping)}")
-
-    tags_vectors_csr_matrices: list[csr_matrix] = []
-    for row in tag_ids:
-        tags_matrix = np.zeros((settings.arts.max_tags, vector_size), dtype=np.float32)
-        tags_vectors = np.array([cft_model.get_vector(all_tags_mapping[tag_id]) for tag_id in row])
-        for i, vec in enumerate(tags_vectors):
-            # cft_model.get_vector() returns a vector with 300 dimensions, while we need 100D.
-            transformed_vector: np.ndarray = pca_model.transform(vec.reshape(1, -1))[0]
-            tags_matrix[i] = transformed_vector
-        tags_csr_matrix = csr_matrix(tags_matrix.reshape(-1))
-        tags_vectors_csr_matrices.append(tags_csr_matrix)
-
-    tags_vectors_csr_matrix: csr_matrix = vstack(tags_vectors_csr_matrices)
-    return tags_vectors_csr_matrix
-
-
-#     arts_data_csr: csr_matrix = hstack(
-#         [user_ids_vec, likes_scaled_csr, views_scaled_csr, tags_csr_matrix])
-
-
-async def update_arts_matrix():
+    return update_tag_embeddings(all_tags)
+
+
+def _get_scaler(values_range: tuple[float, float]) -> MinMaxScaler:
+    """Creates a MinMaxScaler fitted on a known (min, max) range."""
+    scaler = MinMaxScaler()
+    scaler.fit(np.array(values_range, dtype=np.float64).reshape(-1, 1))
+    return scaler
+
+
+def get_arts_features(
+        batch: ArtsBatch,
+        likes_range: tuple[float, float],
+        views_range: tuple[float, float],
+        tag_embeddings: np.ndarray,
+) -> np.ndarray:
+    """
+    Turns a batch of arts into their dense feature rows:
+    owner id bits, scaled likes, scaled views and the pooled tag embeddings.
+
+    The counters are scaled with the given ranges, so rows embedded in an incremental
+    update are comparable with the rows of the last full build.
+    The column layout is described in `utils.feature_store`.
+    """
+    likes_scaler, views_scaler = _get_scaler(likes_range), _get_scaler(views_range)
+    features: np.ndarray = np.empty((len(batch.art_ids), get_n_features()), dtype=np.float32)
+    features[:, :N_USER_ID_BITS] = to_binary_vectors(batch.user_ids, N_USER_ID_BITS)
+    features[:, N_USER_ID_BITS] = likes_scaler.transform(batch.like_counts.reshape(-1, 1)).ravel()
+    features[:, N_USER_ID_BITS + 1] = views_scaler.transform(batch.view_counts.reshape(-1, 1)).ravel()
+    # (n_arts, max_tags, tag_vector_size) -> (n_arts, n_tag_columns)
+    gathered: np.ndarray = gather_tag_embeddings(tag_embeddings, batch.tag_ids)
+    features[:, N_USER_ID_BITS + 2:] = pool_tag_embeddings(gathered, batch.tag_ids)
+    return features.astype(settings.features.dtype, copy=False)
+
+
+async def _read_arts_features(
+        stats: ArtsStats,
+        writer: FeatureWriter | None,
+        likes_range: tuple[float, float],
+        views_range: tuple[float, float],
+        start_date: datetime | None = None,
+        skip_art_ids: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Streams the arts described by `stats` batch by batch into the feature store.
+
+    Only one batch of rows is held at a time: ids and tag ids go into preallocated arrays and
+    every batch of feature rows is written through `writer` right away.
+
+    Args:
+        stats (ArtsStats): Counts of the arts to read, from `ArtsService.get_arts_stats`.
+        writer (FeatureWriter | None): The feature store the rows are appended to.
+            If None, only the ids and tags are read and no tag is embedded.
+        likes_range (tuple[float, float]): Range the likes are scaled with.
+        views_range (tuple[float, float]): Range the views are scaled with.
+        start_date (datetime | None): Only arts created at or after this date are read.
+        skip_art_ids (np.ndarray | None): Sorted art ids to leave out.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Ids of the arts written, in the order of their rows,
+            and their (n_arts x max_tags) tag ids padded with -1.
+    """
+    arts_service = ArtsService()
+    tag_embeddings: np.ndarray | None = None if writer is None else await get_tag_embeddings()
+
+    art_ids: np.ndarray = np.empty(stats.n_arts, dtype=np.int64)
+    tag_ids: np.ndarray = np.empty((stats.n_arts, settings.arts.max_tags), dtype=np.int32)
+    n_read: int = 0
+    async for batch in arts_service.iter_arts_data(
+            max_id=stats.max_id, start_date=start_date, batch_size=settings.arts.fetch_batch_size,
+    ):
+        if skip_art_ids is not None and len(skip_art_ids):
+            batch = batch.take(~_is_in_sorted(batch.art_ids, skip_art_ids))
+        n: int = len(batch.art_ids)
+        if n == 0:
+            continue
+        # `max_id` keeps new arts out, but an old art may get its first tags while reading.
+        if n_read + n > len(art_ids):
+            art_ids = np.concatenate([art_ids[:n_read], np.empty(n, dtype=np.int64)])
+            tag_ids = np.concatenate([tag_ids[:n_read], np.empty((n, tag_ids.shape[1]), dtype=np.int32)])
+        art_ids[n_read:n_read + n] = batch.art_ids
+        tag_ids[n_read:n_read + n] = batch.tag_ids
+        if writer is not None:
+            writer.append(get_arts_features(batch, likes_range, views_range, tag_embeddings))
+        n_read += n
+
+    return art_ids[:n_read], tag_ids[:n_read]
+
+
+def _is_in_sorted(values: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+    positions: np.ndarray = np.searchsorted(sorted_values, values)
+    positions = np.minimum(positions, len(sorted_values) - 1)
+    return sorted_values[positions] == values
+
+
+async def update_arts_matrix(paths: "ArtifactPaths") -> BuildInfo:
+    """
+    Builds the feature matrix, the tag incidence matrix and the id maps of all arts from scratch.
+    The feature matrix is skipped with `similarity.engine = "tags"`.
+
+    Args:
+        paths (ArtifactPaths): The artifact version to write to.
+
+    Returns:
+        BuildInfo: Metadata of the new build. It is not saved here, so the caller can
+            persist it only after the neighbour lists are ready.
+    """
     logger.warning("STARTED")
+    built_at: datetime = datetime.now(tz=timezone.utc)
     arts_service = ArtsService()
-    arts_data: list[list] = await arts_service.get_new_arts_data()
-
-    art_ids, user_ids, like_counts, view_counts = map(np.array, zip(*[i[:4] for i in arts_data]))
-
-    user_id_binary_vectors = np.array([to_binary_vector(i) for i in user_ids])
-
-    likes_scaler, views_scaler = MinMaxScaler(), MinMaxScaler()
-    like_counts_scaled = likes_scaler.fit_transform(like_counts.reshape(-1, 1))
-    view_counts_scaled = views_scaler.fit_transform(view_counts.reshape(-1, 1))
-    logger.debug(f" like_counts_scaled.shape = {like_counts_scaled.shape}")
-
-    tags_ids: list[list[int]] = [i[4] for i in arts_data]
-    tags_csr_matrix = await _get_csr_matrix_of_vectorized_tags(tags_ids)
-    logger.debug(f"tags_csr_matrix.shape = {tags_csr_matrix.shape}")
-
-    user_ids_csr = csr_matrix(user_id_binary_vectors)
-    like_counts_scaled_csr = csr_matrix(like_counts_scaled)
-    view_counts_scaled_csr = csr_matrix(view_counts_scaled)
-
-    arts_data_csr: csr_matrix = hstack(
-        [user_ids_csr, like_counts_scaled_csr, view_counts_scaled_csr, tags_csr_matrix]
+    stats: ArtsStats | None = await arts_service.get_arts_stats()
+    if stats is None:
+        raise ValueError("There are no arts with tags to build the artifacts from")
+
+    has_features: bool = settings.similarity.engine != "tags"
+    writer: FeatureWriter | None = FeatureWriter(paths.features, capacity=stats.n_arts) if has_features else None
+    art_ids, tag_ids = await _read_arts_features(stats, writer, stats.likes_range, stats.views_range)
+    if writer is not None:
+        writer.close()
+        logger.info(f"features.shape = {(writer.n_rows, writer.n_features)}, dtype = {writer.dtype}")
+    save_art_ids(paths, art_ids)
+    save_tag_incidence(paths, *pack_tag_ids(tag_ids))
+
+    return BuildInfo(
+        built_at=built_at,
+        n_arts=len(art_ids),
+        likes_range=stats.likes_range,
+        views_range=stats.views_range,
+        tag_pooling=settings.features.tag_pooling,
+        has_features=has_features,
     )
-    logger.info(f"arts_data_csr.shape = {arts_data_csr.shape}")
-    save_npz(settings.paths.arts_csr, arts_data_csr)
 
-    art_indices_to_ids: dict = {i: val for i, val in enumerate(art_ids)}
-    art_ids_to_indices: dict = {val: i for i, val in enumerate(art_ids)}
 
-    with open(settings.paths.art_indices_to_ids, "wb") as file:
-        pickle.dump(art_indices_to_ids, file)
-    with open(settings.paths.art_ids_to_indices, "wb") as file:
-        pickle.dump(art_ids_to_indices, file)
+async def append_arts_matrix(
+        build_info: "BuildInfo",
+        old_paths: "ArtifactPaths",
+        paths: "ArtifactPaths",
+) -> BuildInfo | None:
+    """
+    Embeds only the arts created since the last build and appends them to the feature
+    matrix, the tag incidence matrix and the id maps. Builds without a feature matrix
+    stay without one.
+
+    The new rows are placed after the existing `build_info.n_arts` rows, so existing
+    row indices stay valid.
+
+    Args:
+        build_info (BuildInfo): Metadata of the build the new arts are appended to.
+        old_paths (ArtifactPaths): The artifact version described by `build_info`.
+        paths (ArtifactPaths): The artifact version to write the extended artifacts to.
+
+    Returns:
+        BuildInfo | None: Metadata of the extended build, or None if there are no new arts.
+    """
+    logger.warning(f"STARTED built_at = {build_info.built_at}")
+    built_at: datetime = datetime.now(tz=timezone.utc)
+    arts_service = ArtsService()
+    stats: ArtsStats | None = await arts_service.get_arts_stats(start_date=build_info.built_at)
+    if stats is None:
+        logger.info("No new arts")
+        return None
+
+    old_art_ids: np.ndarray = np.load(old_paths.art_indices_to_ids)
+    writer: FeatureWriter | None = None
+    if build_info.has_features:
+        old_features: np.ndarray = load_features(old_paths.features)
+        writer = FeatureWriter(paths.features, capacity=len(old_features) + stats.n_arts)
+        for start in range(0, len(old_features), settings.arts.fetch_batch_size):
+            writer.append(old_features[start:start + settings.arts.fetch_batch_size])
+    # Arts created while the previous build was fetching data may already be there.
+    new_art_ids, new_tag_ids = await _read_arts_features(
+        stats,
+        writer,
+        build_info.likes_range,
+        build_info.views_range,
+        start_date=build_info.built_at,
+        skip_art_ids=np.load(old_paths.art_ids_sorted),
+    )
+    if len(new_art_ids) == 0:
+        logger.info("No new arts")
+        return None
+    if writer is not None:
+        writer.close()
+        logger.info(f"features.shape = {(writer.n_rows, writer.n_features)}")
+    art_ids: np.ndarray = np.concatenate([old_art_ids, new_art_ids])
+    logger.info(f"n_new_arts = {len(new_art_ids)}, n_arts = {len(art_ids)}")
+    save_art_ids(paths, art_ids)
+    old_indptr, old_tag_ids = load_tag_incidence(old_paths)
+    save_tag_incidence(paths, *concat_tag_ids(old_indptr, old_tag_ids, *pack_tag_ids(new_tag_ids)))
+
+    return BuildInfo(
+        built_at=built_at,
+        n_arts=len(art_ids),
+        likes_range=build_info.likes_range,
+        views_range=build_info.views_range,
+        tag_pooling=build_info.tag_pooling,
+        has_features=build_info.has_features,
+    )
@@ -0,0 +1,105 @@
+import numpy as np
+
+from config import logger, settings
+from utils.feature_store import N_USER_ID_BITS
+from utils.fold_in import get_art_feature_rows
+
+
+def get_uploader_codes(rows: np.ndarray) -> np.ndarray:
+    """Decodes the owner id bits of feature rows (normalized or not) back into the low 16 bits of the user id."""
+    bits: np.ndarray = (rows[:, :N_USER_ID_BITS] > 0).astype(np.int64)
+    return bits @ (1 << np.arange(N_USER_ID_BITS - 1, -1, -1, dtype=np.int64))
+
+
+def mmr_order(
+        relevance: np.ndarray,
+        vectors: np.ndarray,
+        mmr_lambda: float,
+        uploader_codes: np.ndarray | None = None,
+        max_per_uploader: int | None = None,
+) -> np.ndarray:
+    """
+    Orders candidates by maximal marginal relevance.
+
+    Each step picks the candidate maximizing
+    `mmr_lambda * relevance - (1 - mmr_lambda) * max cosine to the candidates picked so far`.
+    The pairwise similarities are one (n x n) product, and every step updates the
+    redundancy of all candidates at once.
+
+    Args:
+        relevance (np.ndarray): Relevance of the n candidates, e.g. cosine to the query.
+        vectors (np.ndarray): Their (n x n_features) L2-normalized feature rows.
+        mmr_lambda (float): 1 ranks by relevance only, 0 by novelty only.
+        uploader_codes (np.ndarray | None): Uploader of every candidate.
+        max_per_uploader (int | None): Candidates of one uploader beyond this number are moved
+            to the end, by relevance.
+
+    Returns:
+        np.ndarray: Candidate positions, best first.
+    """
+    n: int = len(relevance)
+    similarities: np.ndarray = vectors @ vectors.T
+    redundancy: np.ndarray = np.zeros(n, dtype=np.float32)
+    picked: np.ndarray = np.zeros(n, dtype=bool)
+    capped: np.ndarray = np.zeros(n, dtype=bool)
+    uploader_counts: dict[int, int] = {}
+    order: list[int] = []
+
+    for _ in range(n):
+        scores: np.ndarray = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        scores[picked | capped] = -np.inf
+        best: int = int(np.argmax(scores))
+        if picked[best] or capped[best]:
+            break
+        picked[best] = True
+        order.append(best)
+        redundancy = np.maximum(redundancy, similarities[best])
+        if uploader_codes is not None and max_per_uploader is not None:
+            uploader: int = int(uploader_codes[best])
+            uploader_counts[uploader] = uploader_counts.get(uploader, 0) + 1
+            if uploader_counts[uploader] >= max_per_uploader:
+                capped |= uploader_codes == uploader
+
+    # Candidates of capped uploaders, by relevance.
+    rest: np.ndarray = np.flatnonzero(~picked)
+    rest = rest[np.argsort(-relevance[rest], kind="stable")]
+    return np.concatenate([np.array(order, dtype=np.int64), rest])
+
+
+async def diversify(art_ids: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """
+    Re-ranks the first `diversity.n_candidates` of a ranked neighbour list with `mmr_order`.
+    The rest of the list keeps its order.
+
+    Args:
+        art_ids (np.ndarray): Neighbour art ids, best first.
+        scores (np.ndarray): Their cosine similarities to the query art.
+
+    Returns:
+        np.ndarray: The re-ranked art ids.
+    """
+    config = settings.diversity
+    n: int = min(config.n_candidates, len(art_ids))
+    if n < 2:
+        return art_ids
+    found_ids, rows = await get_art_feature_rows(np.asarray(art_ids[:n]).tolist())
+    if len(found_ids) < 2:
+        return art_ids
+
+    # Candidates without feature rows (deleted meanwhile) go after the re-ranked ones.
+    head: np.ndarray = np.asarray(art_ids[:n])
+    positions: np.ndarray = np.argsort(found_ids, kind="stable")
+    sorted_positions: np.ndarray = np.minimum(np.searchsorted(found_ids[positions], head), len(found_ids) - 1)
+    is_found: np.ndarray = found_ids[positions[sorted_positions]] == head
+    candidate_ids: np.ndarray = head[is_found]
+    candidate_rows: np.ndarray = rows[positions[sorted_positions[is_found]]]
+
+    order: np.ndarray = mmr_order(
+        np.asarray(scores[:n], dtype=np.float32)[is_found],
+        candidate_rows,
+        config.mmr_lambda,
+        get_uploader_codes(candidate_rows),
+        config.max_per_uploader,
+    )
+    logger.debug(f"n_candidates = {len(candidate_ids)}")
+    return np.concatenate([candidate_ids[order], head[~is_found], art_ids[n:]])
@@ -0,0 +1,115 @@
+"""
+Server-side exclusion of the arts a user has already seen.
+
+An `ExclusionSpec` in a request names a user whose liked and saved arts, and optionally their
+own arts, must not be recommended to them. It is resolved once per request to an `ArtExclusion`:
+a set of row indices of the live artifact version, plus the few art ids created after the build.
+Pages are cut after the exclusion, so they stay full and don't shift when the user likes an art
+that was on a later page.
+
+Like a container of a roaring bitmap, an `ArtIndexSet` stores a sparse set as a sorted int32
+array and switches to a bitmap of n_rows bits as soon as that is smaller.
+
+The art ids of a spec are cached in Redis for `redis_ex.excluded_art_ids` seconds.
+"""
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pydantic import BaseModel
+
+from artifacts import artifact_store
+from config import logger, settings
+from database.arts import ArtsService
+from red import get_ids, set_ids
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+_INDEX_BITS: int = 32
+
+
+class ExclusionSpec(BaseModel):
+    user_id: int
+    liked: bool = True
+    saved: bool = True
+    # The arts the user uploaded.
+    own: bool = False
+
+    def get_redis_key(self) -> str:
+        return f"excluded_art_ids:{self.user_id}:{int(self.liked)}{int(self.saved)}{int(self.own)}"
+
+
+class ArtIndexSet:
+    """An immutable set of row indices in [0, n_rows)."""
+
+    def __init__(self, indices: np.ndarray, n_rows: int):
+        indices = np.unique(np.asarray(indices, dtype=np.int64))
+        self.n_rows: int = n_rows
+        self.size: int = len(indices)
+        self._sorted: np.ndarray | None = None
+        self._bitmap: np.ndarray | None = None
+        if self.size * _INDEX_BITS > n_rows:
+            is_member: np.ndarray = np.zeros(n_rows, dtype=bool)
+            is_member[indices] = True
+            self._bitmap = np.packbits(is_member)
+        else:
+            self._sorted = indices.astype(np.int32)
+
+    @property
+    def is_bitmap(self) -> bool:
+        return self._bitmap is not None
+
+    def contains(self, indices: np.ndarray) -> np.ndarray:
+        """Membership of every index, which must be in [0, n_rows)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        if self._bitmap is not None:
+            # `np.packbits` stores the first index of a byte in its most significant bit.
+            return ((self._bitmap[indices >> 3] >> (7 - (indices & 7))) & 1).astype(bool)
+        if self.size == 0:
+            return np.zeros(len(indices), dtype=bool)
+        positions: np.ndarray = np.minimum(np.searchsorted(self._sorted, indices), self.size - 1)
+        return self._sorted[positions] == indices
+
+
+class ArtExclusion:
+    """Art ids to drop from a ranking, resolved against the live artifact version."""
+
+    def __init__(self, art_ids: np.ndarray):
+        art_ids = np.asarray(art_ids, dtype=np.int64)
+        self.version: "Path | None" = artifact_store.version
+        self.art_ids: np.ndarray = art_ids
+        indices: np.ndarray = artifact_store.get_indices(art_ids)
+        n_rows: int = len(artifact_store.art_ids) if artifact_store.is_loaded else 0
+        self.indices: ArtIndexSet = ArtIndexSet(indices[indices >= 0], n_rows)
+        # Arts created after the build, or deleted meanwhile.
+        self.other_art_ids: np.ndarray = np.unique(art_ids[indices < 0])
+
+    def __len__(self) -> int:
+        return self.indices.size + len(self.other_art_ids)
+
+    def contains(self, art_ids: np.ndarray) -> np.ndarray:
+        art_ids = np.asarray(art_ids, dtype=np.int64)
+        if artifact_store.version != self.version:
+            # Another version was loaded since, the row indices no longer apply.
+            return np.isin(art_ids, self.art_ids)
+        indices: np.ndarray = artifact_store.get_indices(art_ids)
+        is_built: np.ndarray = indices >= 0
+        result: np.ndarray = np.empty(len(art_ids), dtype=bool)
+        result[is_built] = self.indices.contains(indices[is_built])
+        result[~is_built] = np.isin(art_ids[~is_built], self.other_art_ids)
+        return result
+
+
+async def resolve_exclusion(spec: ExclusionSpec) -> ArtExclusion:
+    """Fetches the arts excluded by the spec, from Redis or else from the database."""
+    redis_key: str = spec.get_redis_key()
+    art_ids: np.ndarray | None = await get_ids(redis_key)
+    if art_ids is None:
+        art_ids = np.array(
+            await ArtsService.get_excluded_art_ids(spec.user_id, spec.liked, spec.saved, spec.own),
+            dtype=np.int64,
+        )
+        await set_ids({redis_key: art_ids}, ex=settings.redis_ex.excluded_art_ids)
+    exclusion: ArtExclusion = ArtExclusion(art_ids)
+    logger.debug(f"user_id = {spec.user_id}, n_excluded = {len(exclusion)}")
+    return exclusion
@@ -0,0 +1,134 @@
+"""
+Dense art feature store.
+
+`features.npy` of an artifact version is a plain .npy file with one row per art, in the
+order of `art_indices_to_ids.npy`. Its dtype is `features.dtype` (float32 or float16)
+and its columns are:
+
+    [0, 16)          bits of the owner's user id, most significant first (0 or 1)
+    16               likes_count, min-max scaled with the range of the full build
+    17               views_count, min-max scaled with the range of the full build
+    [18, 18 + T)     tag embeddings, depending on `features.tag_pooling`:
+                       "padded": T = max_tags * tag_vector_size, slot j holds the
+                                 embedding of the j-th tag, zeros after the last tag
+                       "mean":   T = tag_vector_size, mean of the art's tag embeddings
+                       "max":    T = tag_vector_size, element-wise max of them
+
+The file is written in one pass through `FeatureWriter` and read memory-mapped.
+The rebuild also saves the float32 L2 norms of its rows as `feature_norms.npy`.
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from config import logger, settings
+
+N_USER_ID_BITS: int = 16
+N_COUNTER_COLUMNS: int = 2
+
+
+def get_n_tag_columns() -> int:
+    if settings.features.tag_pooling == "padded":
+        return settings.arts.max_tags * settings.arts.tag_vector_size
+    return settings.arts.tag_vector_size
+
+
+def get_n_features() -> int:
+    return N_USER_ID_BITS + N_COUNTER_COLUMNS + get_n_tag_columns()
+
+
+def pool_tag_embeddings(gathered: np.ndarray, tag_ids: np.ndarray) -> np.ndarray:
+    """
+    Reduces gathered tag embeddings to the tag columns of the store.
+
+    Args:
+        gathered (np.ndarray): A (n_arts x max_tags x tag_vector_size) array, zero for padding.
+        tag_ids (np.ndarray): The matching (n_arts x max_tags) tag ids, padded with -1.
+
+    Returns:
+        np.ndarray: A (n_arts x get_n_tag_columns()) float32 array.
+    """
+    pooling: str = settings.features.tag_pooling
+    if pooling == "padded":
+        return gathered.reshape(len(gathered), -1)
+
+    is_tag: np.ndarray = tag_ids >= 0
+    if pooling == "mean":
+        n_tags: np.ndarray = np.maximum(is_tag.sum(axis=1, keepdims=True), 1)
+        return (gathered.sum(axis=1) / n_tags).astype(np.float32)
+    if pooling == "max":
+        masked: np.ndarray = np.where(is_tag[:, :, None], gathered, -np.inf)
+        pooled: np.ndarray = masked.max(axis=1)
+        return np.where(np.isfinite(pooled), pooled, 0).astype(np.float32)
+    raise ValueError(f"Unknown tag pooling: {pooling}")
+
+
+class FeatureWriter:
+    """
+    Writes feature rows block by block into a memory-mapped .npy file, so only one block
+    is in memory at a time. The file is moved into place by `close`.
+
+    `capacity` is the expected number of rows. Fewer rows are fine, more rows cost a copy.
+    """
+
+    def __init__(self, path: Path, capacity: int):
+        self.path: Path = path
+        self.dtype: np.dtype = np.dtype(settings.features.dtype)
+        self.n_features: int = get_n_features()
+        self.n_rows: int = 0
+        self._tmp_path: Path = path.with_name(f"{path.stem}.tmp{path.suffix}")
+        self._features: np.ndarray = self._open(self._tmp_path, max(capacity, 1))
+
+    def _open(self, path: Path, n_rows: int) -> np.ndarray:
+        return open_memmap(path, mode="w+", dtype=self.dtype, shape=(n_rows, self.n_features))
+
+    def append(self, block: np.ndarray) -> None:
+        n: int = len(block)
+        if self.n_rows + n > len(self._features):
+            self._grow(self.n_rows + n)
+        self._features[self.n_rows:self.n_rows + n] = block
+        self.n_rows += n
+
+    def _grow(self, min_rows: int) -> None:
+        logger.warning(f"Growing the feature store beyond {len(self._features)} rows")
+        grown_path: Path = self._tmp_path.with_name(f"{self._tmp_path.stem}.grown{self._tmp_path.suffix}")
+        grown: np.ndarray = self._open(grown_path, max(min_rows, 2 * len(self._features)))
+        copy_rows(self._features, grown, self.n_rows)
+        del self._features
+        os.replace(grown_path, self._tmp_path)
+        self._features = grown
+
+    def close(self) -> None:
+        if self.n_rows != len(self._features):
+            final_path: Path = self._tmp_path.with_name(f"{self._tmp_path.stem}.final{self._tmp_path.suffix}")
+            final: np.ndarray = self._open(final_path, self.n_rows)
+            copy_rows(self._features, final, self.n_rows)
+            final.flush()
+            del self._features
+            os.replace(final_path, self._tmp_path)
+        else:
+            self._features.flush()
+            del self._features
+        os.replace(self._tmp_path, self.path)
+
+
+def copy_rows(source: np.ndarray, target: np.ndarray, n_rows: int, chunk_rows: int = 8192) -> None:
+    for start in range(0, n_rows, chunk_rows):
+        stop: int = min(start + chunk_rows, n_rows)
+        target[start:stop] = source[start:stop]
+
+
+def load_features(path: Path) -> np.ndarray:
+    """Opens a feature store memory-mapped, read-only."""
+    return np.load(path, mmap_mode="r")
+
+
+def get_row_norms(features: np.ndarray, chunk_rows: int = 8192) -> np.ndarray:
+    """L2 norms of the rows, in float32, computed chunk by chunk."""
+    norms: np.ndarray = np.empty(len(features), dtype=np.float32)
+    for start in range(0, len(features), chunk_rows):
+        block: np.ndarray = np.asarray(features[start:start + chunk_rows], dtype=np.float32)
+        norms[start:start + len(block)] = np.linalg.norm(block, axis=1)
+    return norms
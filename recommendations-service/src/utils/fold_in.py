@@ -0,0 +1,184 @@
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from artifacts import BuildInfo, artifact_store
+from config import logger, settings
+from database.arts import ArtsBatch, ArtsService
+from exceptions import ArtNotFoundException
+from utils.data_processor import get_arts_features
+from utils.feature_store import get_n_features
+from utils.ivf import IVFIndex
+from utils.neighbours import select_top_k
+from utils.tag_embeddings import load_tag_embeddings
+from utils.tag_overlap import TagIndex
+from utils.workers import run_in_worker
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def search_feature_rows(
+        features: np.ndarray,
+        matrix: np.ndarray,
+        norms: np.ndarray,
+        k: int,
+        index: IVFIndex | None = None,
+        chunk_rows: int = 8192,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the row indices and cosine similarities of the top `k` rows of `matrix` most similar
+    to the single feature row, through `index` if given, else by a full scan.
+    Reads only its arguments, so it can run in a worker while another version is loaded.
+    """
+    row: np.ndarray = np.asarray(features, dtype=np.float32).ravel()
+    row_norm: float = float(np.linalg.norm(row))
+    if row_norm > 0:
+        row = row / row_norm
+    k = min(k, len(matrix))
+    if k == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    if index is not None:
+        return index.search(row, matrix, norms, k, n_probe=settings.similarity.ivf.n_probe)
+
+    scores: np.ndarray = np.zeros((1, len(matrix)), dtype=np.float32)
+    if row_norm > 0:
+        for start in range(0, len(matrix), chunk_rows):
+            block: np.ndarray = np.asarray(matrix[start:start + chunk_rows], dtype=np.float32)
+            scores[0, start:start + len(block)] = block @ row
+        np.divide(scores[0], norms, out=scores[0], where=norms > 0)
+    top_indices, top_scores = select_top_k(scores, k)
+    return top_indices[0], top_scores[0]
+
+
+async def search_features(features: np.ndarray, k: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the ids and cosine similarities of the top `k` (`similarity.top_k` if None)
+    arts of the live version most similar to the single feature row.
+
+    Versions with an IVF index are searched through it, others are scanned in full. The arrays
+    of the version are taken once, before the search runs in a worker, so a version loaded
+    meanwhile doesn't mix its rows with the ids of the searched one.
+    """
+    matrix, norms = artifact_store.get_features()
+    art_ids: np.ndarray = artifact_store.art_ids
+    index: IVFIndex | None = artifact_store.ivf_index if settings.similarity.engine == "ivf" else None
+    rows, scores = await run_in_worker(
+        search_feature_rows, features, matrix, norms, settings.similarity.top_k if k is None else k, index
+    )
+    return art_ids[rows], scores
+
+
+def embed_new_arts(batch: ArtsBatch, build_info: BuildInfo) -> np.ndarray:
+    """
+    Feature rows of arts created after the build, in the layout of the build.
+
+    Only the published tag embedding store is read, it is written by the rebuild job alone.
+    Tags created since the last rebuild have no embedding yet and count as zero vectors.
+    """
+    tag_embeddings, _ = load_tag_embeddings()
+    return get_arts_features(batch, build_info.likes_range, build_info.views_range, tag_embeddings)
+
+
+async def search_art_tags(art_id: int, k: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the ids and scores of the top `k` (`similarity.top_k` if None) arts of the live version
+    by tag overlap with `art_id`, see `utils.tag_overlap`. Works for arts created after the build too.
+
+    Raises:
+        ArtNotFoundException: If the live version has no tag index, or the art has no tags.
+    """
+    index: TagIndex | None = artifact_store.tag_index
+    if index is None:
+        raise ArtNotFoundException(art_id)
+    # Rows are mapped to the ids of the searched version, another one may be loaded meanwhile.
+    art_ids: np.ndarray = artifact_store.art_ids
+    row: int | None = artifact_store.get_index(art_id)
+    if row is not None:
+        tag_ids: np.ndarray = index.get_tags(row)
+    else:
+        tag_ids = np.array((await ArtsService.get_tag_ids([art_id])).get(art_id, []), dtype=np.int64)
+    if len(tag_ids) == 0:
+        raise ArtNotFoundException(art_id)
+    rows, scores = await run_in_worker(index.search, tag_ids, settings.similarity.top_k if k is None else k, row)
+    return art_ids[rows], scores
+
+
+async def fold_in_art(art_id: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Embeds an art created after the last build and finds its neighbours in the live version.
+
+    The features follow the recipe of `update_arts_matrix` (owner bits, counters scaled with
+    the ranges of the build, pooled tag embeddings, see `embed_new_arts`), and the art is scored
+    against the memory-mapped feature store chunk by chunk. Versions without a feature store are
+    searched by tag overlap instead. The result is kept in `artifact_store.folded`, a bounded LRU
+    cache, until the next version is loaded; existing arts don't get the new art as a neighbour
+    before that.
+
+    Args:
+        art_id (int): The id of the new art.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Neighbour art ids and their cosine similarities, best first.
+
+    Raises:
+        ArtNotFoundException: If there is no live version, the live version has another feature
+            layout, or the art doesn't exist or has no tags.
+    """
+    neighbours: tuple[np.ndarray, np.ndarray] | None = artifact_store.get_folded(art_id)
+    if neighbours is not None:
+        return neighbours
+    build_info: BuildInfo | None = artifact_store.build_info
+    if not artifact_store.is_loaded or build_info is None:
+        raise ArtNotFoundException(art_id)
+    version: "Path | None" = artifact_store.version
+    if not build_info.has_features:
+        neighbours = await search_art_tags(art_id)
+    elif build_info.tag_pooling != settings.features.tag_pooling:
+        raise ArtNotFoundException(art_id)
+    else:
+        batch: ArtsBatch = await ArtsService.get_arts_data([art_id])
+        if len(batch.art_ids) == 0:
+            raise ArtNotFoundException(art_id)
+        features: np.ndarray = await run_in_worker(embed_new_arts, batch, build_info)
+        neighbours = await search_features(features)
+        logger.info(f"Folded in art_id = {art_id}")
+    # Not kept for a version loaded meanwhile, which may already contain the art.
+    if artifact_store.version == version:
+        artifact_store.set_folded(art_id, neighbours)
+    return neighbours
+
+
+async def get_art_feature_rows(art_ids: list[int]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns L2-normalized float32 feature rows of the given arts in the layout of the live version.
+
+    Rows of built arts are read from the feature store, arts created after the build are
+    embedded like in `fold_in_art`. Arts that exist in neither, or have no tags, are omitted,
+    and so are all arts if the live version has no feature store.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The ids of the arts found and their (n x n_features) rows.
+    """
+    build_info: BuildInfo | None = artifact_store.build_info
+    if (not artifact_store.is_loaded or build_info is None or not build_info.has_features
+            or build_info.tag_pooling != settings.features.tag_pooling):
+        return np.empty(0, dtype=np.int64), np.empty((0, get_n_features()), dtype=np.float32)
+
+    matrix, norms = artifact_store.get_features()
+    indices: list[int | None] = [artifact_store.get_index(art_id) for art_id in art_ids]
+    built_rows: np.ndarray = np.array(sorted(i for i in indices if i is not None), dtype=np.int64)
+    new_ids: list[int] = [art_id for art_id, i in zip(art_ids, indices) if i is None]
+
+    found_ids: np.ndarray = artifact_store.get_art_ids(built_rows)
+    rows: np.ndarray = np.asarray(matrix[built_rows], dtype=np.float32) / np.maximum(norms[built_rows], 1e-12)[:, None]
+    if new_ids:
+        batch: ArtsBatch = await ArtsService.get_arts_data(new_ids)
+        if len(batch.art_ids):
+            new_rows: np.ndarray = (await run_in_worker(embed_new_arts, batch, build_info)).astype(np.float32)
+            new_rows /= np.maximum(np.linalg.norm(new_rows, axis=1, keepdims=True), 1e-12)
+            found_ids = np.concatenate([found_ids, batch.art_ids])
+            rows = np.vstack([rows, new_rows])
+    logger.debug(f"len(art_ids) = {len(art_ids)}, len(new_ids) = {len(new_ids)}, n_found = {len(found_ids)}")
+    return found_ids, rows
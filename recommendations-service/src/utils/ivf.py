@@ -0,0 +1,218 @@
+"""
+Inverted file (IVF) index over the art feature store.
+
+The L2-normalized feature rows are clustered with spherical k-means, and every cluster keeps
+the list of its rows. A query scores only the rows of the `n_probe` clusters whose centroids
+are closest to it instead of the whole catalogue, trading recall for speed.
+
+Files of an artifact version (see `artifacts.save_ivf_index`):
+
+    ivf_centroids.npy       (n_lists x n_features) float32, unit length
+    ivf_list_offsets.npy    (n_lists + 1) int64, list `c` is list_rows[offsets[c]:offsets[c + 1]]
+    ivf_list_rows.npy       (n_rows) int32, row indices grouped by list
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from config import logger
+from utils.neighbours import get_block_rows, normalize_rows, select_top_k
+
+
+def _normalize_dense(block: np.ndarray) -> np.ndarray:
+    block = np.asarray(block, dtype=np.float32)
+    norms: np.ndarray = np.linalg.norm(block, axis=1, keepdims=True)
+    return block / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def assign_rows(features: np.ndarray, centroids: np.ndarray, chunk_rows: int = 8192) -> np.ndarray:
+    """Returns the closest centroid of every row, reading the rows chunk by chunk."""
+    assignments: np.ndarray = np.empty(len(features), dtype=np.int32)
+    for start in range(0, len(features), chunk_rows):
+        block: np.ndarray = _normalize_dense(features[start:start + chunk_rows])
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(
+        features: np.ndarray,
+        n_lists: int,
+        n_iter: int,
+        train_size: int,
+        seed: int,
+) -> np.ndarray:
+    """
+    Clusters a random sample of the rows with spherical k-means.
+
+    Args:
+        features (np.ndarray): The (n_rows x n_features) feature store.
+        n_lists (int): The number of clusters. Clipped to the sample size.
+        n_iter (int): The number of k-means iterations.
+        train_size (int): The number of sampled rows.
+        seed (int): Seed of the sampling and of the initial centroids.
+
+    Returns:
+        np.ndarray: (n_lists x n_features) float32 unit-length centroids.
+    """
+    rng = np.random.default_rng(seed)
+    sample_rows: np.ndarray = np.sort(rng.choice(len(features), min(train_size, len(features)), replace=False))
+    sample: np.ndarray = _normalize_dense(features[sample_rows])
+    n_lists = max(1, min(n_lists, len(sample)))
+    centroids: np.ndarray = sample[rng.choice(len(sample), n_lists, replace=False)]
+
+    for _ in range(n_iter):
+        assignments: np.ndarray = assign_rows(sample, centroids)
+        one_hot = csr_matrix(
+            (np.ones(len(sample), dtype=np.float32), (assignments, np.arange(len(sample)))),
+            shape=(n_lists, len(sample)),
+        )
+        sums: np.ndarray = np.asarray(one_hot @ sample)
+        empty: np.ndarray = np.bincount(assignments, minlength=n_lists) == 0
+        # Empty clusters restart from random rows of the sample.
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        centroids = _normalize_dense(sums)
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray):
+        self.centroids: np.ndarray = centroids
+        self.list_offsets: np.ndarray = list_offsets
+        self.list_rows: np.ndarray = list_rows
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def from_assignments(cls, centroids: np.ndarray, assignments: np.ndarray) -> "IVFIndex":
+        list_rows: np.ndarray = np.argsort(assignments, kind="stable").astype(np.int32)
+        list_offsets: np.ndarray = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=len(centroids)), out=list_offsets[1:])
+        return cls(centroids, list_offsets, list_rows)
+
+    @classmethod
+    def build(cls, features: np.ndarray, n_lists: int, n_iter: int, train_size: int, seed: int) -> "IVFIndex":
+        centroids: np.ndarray = train_centroids(features, n_lists, n_iter, train_size, seed)
+        index: IVFIndex = cls.from_assignments(centroids, assign_rows(features, centroids))
+        logger.info(f"n_rows = {len(features)}, n_lists = {index.n_lists}")
+        return index
+
+    def extend(self, features: np.ndarray, n_old_rows: int) -> "IVFIndex":
+        """Returns the index with the rows appended after `n_old_rows` assigned to the existing clusters."""
+        old_assignments: np.ndarray = np.empty(n_old_rows, dtype=np.int32)
+        old_assignments[self.list_rows] = np.repeat(
+            np.arange(self.n_lists, dtype=np.int32), np.diff(self.list_offsets)
+        )
+        new_assignments: np.ndarray = assign_rows(features[n_old_rows:], self.centroids)
+        return IVFIndex.from_assignments(
+            np.asarray(self.centroids), np.concatenate([old_assignments, new_assignments])
+        )
+
+    def get_list(self, list_id: int) -> np.ndarray:
+        return self.list_rows[self.list_offsets[list_id]:self.list_offsets[list_id + 1]]
+
+    def get_candidates(self, list_order: np.ndarray, n_probe: int, min_rows: int = 0) -> np.ndarray:
+        """
+        Rows of the first `n_probe` lists of `list_order`, and of further lists
+        until there are at least `min_rows` rows (if the index has that many).
+        """
+        lists: list[np.ndarray] = []
+        n_rows: int = 0
+        for i, list_id in enumerate(list_order):
+            if i >= n_probe and n_rows >= min_rows:
+                break
+            rows: np.ndarray = self.get_list(list_id)
+            lists.append(rows)
+            n_rows += len(rows)
+        return np.concatenate(lists) if lists else np.empty(0, dtype=np.int32)
+
+    def search(
+            self,
+            query: np.ndarray,
+            features: np.ndarray,
+            norms: np.ndarray,
+            k: int,
+            n_probe: int,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the approximate top-K cosine neighbours of one query vector.
+
+        Args:
+            query (np.ndarray): A unit-length float32 feature vector.
+            features (np.ndarray): The feature store the index was built on.
+            norms (np.ndarray): Row norms of `features`.
+            k (int): The number of neighbours.
+            n_probe (int): The number of clusters to scan.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Row indices and cosine similarities, best first.
+        """
+        list_order: np.ndarray = np.argsort(-(self.centroids @ query))
+        # Sorted, so the rows are read from the memory map in file order.
+        candidates: np.ndarray = np.sort(self.get_candidates(list_order, n_probe, min_rows=k))
+        k = min(k, len(candidates))
+        if k == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        scores: np.ndarray = np.asarray(features[candidates], dtype=np.float32) @ query
+        candidate_norms: np.ndarray = norms[candidates]
+        np.divide(scores, candidate_norms, out=scores, where=candidate_norms > 0)
+        top_columns, top_scores = select_top_k(scores.reshape(1, -1), k)
+        return candidates[top_columns[0]], top_scores[0]
+
+
+def get_ivf_neighbours(
+        features: np.ndarray,
+        index: IVFIndex,
+        top_k: int,
+        n_probe: int,
+        max_block_mb: int = 256,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Approximate counterpart of `get_top_k_neighbours`.
+
+    The rows of one cluster are scored together against the rows of the `n_probe` clusters
+    closest to that cluster's centroid, the cluster itself first. A row is never its own neighbour.
+
+    Args:
+        features (np.ndarray): The (n_rows x n_features) feature store.
+        index (IVFIndex): The index built on `features`.
+        top_k (int): The number of neighbours to keep per row. Clipped to n_rows - 1.
+        n_probe (int): The number of clusters scanned per cluster, more if they hold fewer than K rows.
+        max_block_mb (int): Approximate memory budget of one dense score block, in megabytes.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Neighbour indices (int32) and scores (float32), best first.
+    """
+    n_rows: int = len(features)
+    k: int = max(0, min(top_k, n_rows - 1))
+    indices: np.ndarray = np.empty((n_rows, k), dtype=np.int32)
+    scores: np.ndarray = np.empty((n_rows, k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+
+    normalized: np.ndarray = normalize_rows(features)
+    centroids: np.ndarray = np.asarray(index.centroids)
+    list_orders: np.ndarray = np.argsort(-(centroids @ centroids.T), axis=1)
+    logger.info(f"n_rows = {n_rows}, top_k = {k}, n_lists = {index.n_lists}, n_probe = {n_probe}")
+
+    for list_id in range(index.n_lists):
+        rows: np.ndarray = index.get_list(list_id)
+        if len(rows) == 0:
+            continue
+        list_order: np.ndarray = list_orders[list_id]
+        list_order = np.concatenate([[list_id], list_order[list_order != list_id]])
+        # The rows of `list_id` come first, in the order of `rows`.
+        candidates: np.ndarray = index.get_candidates(list_order, n_probe, min_rows=k + 1)
+        candidates_t: np.ndarray = normalized[candidates].T
+        block_rows: int = get_block_rows(len(candidates), max_block_mb)
+
+        for start in range(0, len(rows), block_rows):
+            stop: int = min(start + block_rows, len(rows))
+            block_scores: np.ndarray = normalized[rows[start:stop]] @ candidates_t
+            # Exclude the art itself from its own neighbours.
+            block_scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+            top_columns, top_scores = select_top_k(block_scores, k)
+            indices[rows[start:stop]] = candidates[top_columns]
+            scores[rows[start:stop]] = top_scores
+    return indices, scores
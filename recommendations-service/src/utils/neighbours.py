@@ -0,0 +1,164 @@
+import numpy as np
+from scipy.sparse import issparse
+from sklearn.preprocessing import normalize
+
+from config import logger
+
+# Annotation
+from scipy.sparse import spmatrix
+
+
+def get_block_rows(n_rows: int, max_block_mb: int) -> int:
+    """Number of rows whose dense float32 score block (rows x n_rows) fits into `max_block_mb`."""
+    max_block_bytes: int = max_block_mb * 1024 * 1024
+    return max(1, max_block_bytes // (4 * max(n_rows, 1)))
+
+
+def normalize_rows(matrix: "np.ndarray | spmatrix") -> "np.ndarray | spmatrix":
+    """L2-normalized copy of the rows, dense matrices as float32."""
+    if issparse(matrix):
+        return normalize(matrix, norm="l2", axis=1)
+    # A private float32 copy: memory-mapped float16 stores are scored in float32.
+    dense: np.ndarray = np.array(matrix, dtype=np.float32)
+    return normalize(dense, norm="l2", axis=1, copy=False)
+
+
+def get_top_k_neighbours(
+        matrix: "np.ndarray | spmatrix",
+        top_k: int,
+        max_block_mb: int = 256,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the top-K cosine neighbours of every row of the feature matrix.
+
+    The scores are computed block by block, so only a (block_rows x n_rows) float32 block
+    is kept in memory at a time instead of the full N x N similarity matrix.
+    A row is never its own neighbour.
+
+    Args:
+        matrix (np.ndarray | spmatrix): The (n_rows x n_features) feature matrix, dense or sparse.
+        top_k (int): The number of neighbours to keep per row. Clipped to n_rows - 1.
+        max_block_mb (int): Approximate memory budget of one dense score block, in megabytes.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]:
+            - indices (int32, n_rows x K): row indices of the neighbours, best first.
+            - scores (float32, n_rows x K): cosine similarities matching `indices`.
+    """
+    n_rows: int = matrix.shape[0]
+    k: int = max(0, min(top_k, n_rows - 1))
+    indices: np.ndarray = np.empty((n_rows, k), dtype=np.int32)
+    scores: np.ndarray = np.empty((n_rows, k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+
+    normalized = normalize_rows(matrix)
+    block_rows: int = get_block_rows(n_rows, max_block_mb)
+    logger.info(f"n_rows = {n_rows}, top_k = {k}, block_rows = {block_rows}")
+    _fill_top_k_for_rows(normalized, 0, n_rows, k, block_rows, indices, scores)
+    return indices, scores
+
+
+def _get_dense_scores(rows, columns_t) -> np.ndarray:
+    block_scores = rows @ columns_t
+    if issparse(block_scores):
+        block_scores = block_scores.toarray()
+    return np.asarray(block_scores, dtype=np.float32)
+
+
+def _fill_top_k_for_rows(
+        normalized: "np.ndarray | spmatrix",
+        row_start: int,
+        row_stop: int,
+        k: int,
+        block_rows: int,
+        indices: np.ndarray,
+        scores: np.ndarray,
+) -> None:
+    """Scores rows [row_start, row_stop) against all rows and writes their top-K into `indices`/`scores`."""
+    normalized_t = normalized.T
+    for start in range(row_start, row_stop, block_rows):
+        stop: int = min(start + block_rows, row_stop)
+        block_scores: np.ndarray = _get_dense_scores(normalized[start:stop], normalized_t)
+        # Exclude the art itself from its own neighbours.
+        block_scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        block_indices, block_top_scores = select_top_k(block_scores, k)
+        indices[start - row_start:stop - row_start] = block_indices
+        scores[start - row_start:stop - row_start] = block_top_scores
+
+
+def add_rows_to_neighbours(
+        matrix: "np.ndarray | spmatrix",
+        n_old_rows: int,
+        old_indices: np.ndarray,
+        old_scores: np.ndarray,
+        top_k: int,
+        max_block_mb: int = 256,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Extends top-K neighbour lists with rows appended to the end of the feature matrix.
+
+    Only the new rows are scored: each new row against the whole matrix, and the old rows
+    against the new rows. The old lists are then merged with the new candidates, so the cost
+    grows with the number of new rows instead of with the square of the catalogue size.
+
+    Args:
+        matrix (np.ndarray | spmatrix): The full feature matrix, new rows placed after `n_old_rows`.
+        n_old_rows (int): The number of rows the old neighbour lists were built for.
+        old_indices (np.ndarray): Neighbour indices of the old rows, as returned by `get_top_k_neighbours`.
+        old_scores (np.ndarray): Neighbour scores of the old rows.
+        top_k (int): The number of neighbours to keep per row. Clipped to n_rows - 1.
+        max_block_mb (int): Approximate memory budget of one dense score block, in megabytes.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Neighbour indices (int32) and scores (float32) of all rows.
+    """
+    n_rows: int = matrix.shape[0]
+    k: int = max(0, min(top_k, n_rows - 1))
+    indices: np.ndarray = np.empty((n_rows, k), dtype=np.int32)
+    scores: np.ndarray = np.empty((n_rows, k), dtype=np.float32)
+    if k == 0 or n_old_rows == n_rows:
+        return np.asarray(old_indices[:, :k]), np.asarray(old_scores[:, :k])
+
+    normalized = normalize_rows(matrix)
+    block_rows: int = get_block_rows(n_rows, max_block_mb)
+    logger.info(f"n_old_rows = {n_old_rows}, n_rows = {n_rows}, top_k = {k}")
+
+    new_rows_t = normalized[n_old_rows:].T
+    for start in range(0, n_old_rows, block_rows):
+        stop: int = min(start + block_rows, n_old_rows)
+        new_scores: np.ndarray = _get_dense_scores(normalized[start:stop], new_rows_t)
+        new_indices: np.ndarray = np.broadcast_to(
+            np.arange(n_old_rows, n_rows, dtype=np.int32), new_scores.shape
+        )
+        candidate_scores: np.ndarray = np.hstack([old_scores[start:stop], new_scores])
+        candidate_indices: np.ndarray = np.hstack([old_indices[start:stop], new_indices])
+
+        top_columns, top_scores = select_top_k(candidate_scores, k)
+        indices[start:stop] = np.take_along_axis(candidate_indices, top_columns, axis=1)
+        scores[start:stop] = top_scores
+
+    _fill_top_k_for_rows(
+        normalized, n_old_rows, n_rows, k, block_rows, indices[n_old_rows:], scores[n_old_rows:]
+    )
+    return indices, scores
+
+
+def select_top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Selects the `k` highest scores of every row, sorted in descending order.
+
+    Args:
+        scores (np.ndarray): A (n_rows x n_columns) score matrix.
+        k (int): The number of columns to keep per row, 0 < k <= n_columns.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Column indices (int32) and their scores (float32), best first.
+    """
+    top_columns: np.ndarray = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores: np.ndarray = np.take_along_axis(scores, top_columns, axis=1)
+    order: np.ndarray = np.argsort(-top_scores, axis=1, kind="stable")
+    top_columns = np.take_along_axis(top_columns, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    return top_columns.astype(np.int32), top_scores.astype(np.float32)
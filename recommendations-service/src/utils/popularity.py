@@ -0,0 +1,74 @@
+import numpy as np
+
+from artifacts import save_array
+from config import ArtifactPaths, logger, settings
+from database.arts import ArtsService
+from utils.data_processor import get_padded_tag_ids
+
+
+def get_popularity_scores(likes: np.ndarray, views: np.ndarray, age_days: np.ndarray) -> np.ndarray:
+    """
+    Scores arts by their log-scaled counters, decayed exponentially with age.
+    `ArtsService.get_popular_arts` computes the same score in SQL.
+
+    Returns:
+        np.ndarray: float32 scores, higher is more popular.
+    """
+    config = settings.popularity
+    counters: np.ndarray = config.likes_weight * np.log1p(likes) + config.views_weight * np.log1p(views)
+    decay: np.ndarray = np.exp2(-np.maximum(age_days, 0) / config.half_life_days)
+    return (counters * decay).astype(np.float32)
+
+
+async def build_popularity(paths: ArtifactPaths) -> None:
+    """
+    Ranks all arts by time-decayed popularity and saves the `popularity.top_n` best ones,
+    together with their tags, into the artifact version.
+
+    The ranking is computed in the database anew on every rebuild, incremental ones included,
+    so the ranking follows the current likes and views.
+    """
+    config = settings.popularity
+    arts_service = ArtsService()
+    popular_art_ids, popular_scores = await arts_service.get_popular_arts(
+        config.top_n, config.likes_weight, config.views_weight, config.half_life_days,
+    )
+    n: int = len(popular_art_ids)
+
+    tag_ids: dict[int, list[int]] = await arts_service.get_tag_ids(popular_art_ids.tolist())
+    popular_tag_ids: np.ndarray = get_padded_tag_ids([tag_ids.get(i, []) for i in popular_art_ids.tolist()])
+
+    save_array(paths.popular_art_ids, popular_art_ids)
+    save_array(paths.popular_scores, popular_scores)
+    save_array(paths.popular_tag_ids, popular_tag_ids.astype(np.int32))
+    logger.info(f"n_popular = {n}")
+
+
+def rank_popular_by_tags(
+        popular_art_ids: np.ndarray,
+        popular_scores: np.ndarray,
+        popular_tag_ids: np.ndarray,
+        tag_ids: list[int],
+        tag_weight: float,
+) -> np.ndarray:
+    """
+    Re-ranks the popular arts by popularity mixed with their tag overlap with `tag_ids`.
+
+    Args:
+        popular_art_ids (np.ndarray): Popular art ids, best first.
+        popular_scores (np.ndarray): Their popularity scores.
+        popular_tag_ids (np.ndarray): Their (n x max_tags) tag ids, padded with -1.
+        tag_ids (list[int]): Tags of the requested art.
+        tag_weight (float): Weight of the overlap, a fraction in [0, 1], against the popularity
+            normalized to [0, 1].
+
+    Returns:
+        np.ndarray: The popular art ids in the new order.
+    """
+    if not tag_ids or len(popular_art_ids) == 0:
+        return popular_art_ids
+    max_score: float = float(popular_scores.max())
+    normalized: np.ndarray = popular_scores / max_score if max_score > 0 else np.zeros_like(popular_scores)
+    overlap: np.ndarray = np.isin(popular_tag_ids, tag_ids).sum(axis=1) / len(tag_ids)
+    order: np.ndarray = np.argsort(-(normalized + tag_weight * overlap), kind="stable")
+    return popular_art_ids[order]
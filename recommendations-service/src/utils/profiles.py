@@ -0,0 +1,131 @@
+"""
+Per-user profile vectors for "for you" recommendations.
+
+A profile is the sum of the L2-normalized feature rows of the arts a user liked or saved,
+weighted by `profiles.like_weight` / `profiles.save_weight` and decayed exponentially with
+`profiles.half_life_days`. Ranking is by cosine similarity, so the sum stands for the decayed
+weighted average without dividing by the total weight.
+
+Each profile is a Redis hash `user_profile:{user_id}` with a TTL of `profiles.expire_days`:
+
+    vector      n_features float32 values, packed little-endian
+    weight      total decayed weight in `vector`
+    updated_at  unix time the decay was last applied
+"""
+import asyncio
+import time
+from typing import Literal, NamedTuple
+
+import numpy as np
+
+from config import logger, settings
+from database.arts import ArtsService
+from red import r
+from utils.feature_store import get_n_features
+from utils.fold_in import get_art_feature_rows
+
+ProfileAction = Literal["like", "unlike", "save", "unsave"]
+
+_VECTOR_DTYPE: str = "<f4"
+# Events of one user are applied one at a time; users share a fixed set of locks.
+_locks: list[asyncio.Lock] = [asyncio.Lock() for _ in range(64)]
+
+
+class Profile(NamedTuple):
+    vector: np.ndarray  # float32, n_features
+    weight: float
+    updated_at: float
+
+    def decayed(self, now: float) -> "Profile":
+        age_days: float = max(now - self.updated_at, 0.0) / 86400
+        factor: float = 2 ** (-age_days / settings.profiles.half_life_days)
+        return Profile(self.vector * np.float32(factor), self.weight * factor, now)
+
+
+def _get_key(user_id: int) -> str:
+    return f"user_profile:{user_id}"
+
+
+async def _load_profile(user_id: int) -> Profile | None:
+    """The stored profile, or None if there is none or it has another feature layout."""
+    fields: dict[bytes, bytes] = await r.hgetall(_get_key(user_id))
+    if not fields:
+        return None
+    vector: np.ndarray = np.frombuffer(fields[b"vector"], dtype=_VECTOR_DTYPE)
+    if len(vector) != get_n_features():
+        return None
+    return Profile(vector.astype(np.float32), float(fields[b"weight"]), float(fields[b"updated_at"]))
+
+
+async def _save_profile(user_id: int, profile: Profile) -> None:
+    key: str = _get_key(user_id)
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={
+            "vector": np.asarray(profile.vector, dtype=_VECTOR_DTYPE).tobytes(),
+            "weight": profile.weight,
+            "updated_at": profile.updated_at,
+        })
+        pipe.expire(key, settings.profiles.expire_days * 86400)
+        await pipe.execute()
+
+
+async def build_profile(user_id: int) -> Profile | None:
+    """
+    Builds the profile from the likes and saves in the database, all weighted as of now.
+
+    Returns:
+        Profile | None: None if none of the user's arts can be embedded.
+    """
+    liked, saved = await ArtsService.get_user_art_ids(user_id, limit=settings.profiles.max_seed_arts)
+    art_weights: dict[int, float] = {}
+    for art_ids, weight in ((liked, settings.profiles.like_weight), (saved, settings.profiles.save_weight)):
+        for art_id in art_ids:
+            art_weights[art_id] = art_weights.get(art_id, 0.0) + weight
+    if not art_weights:
+        return None
+
+    found_ids, rows = await get_art_feature_rows(list(art_weights))
+    if len(found_ids) == 0:
+        return None
+    weights: np.ndarray = np.array([art_weights[art_id] for art_id in found_ids.tolist()], dtype=np.float32)
+    logger.info(f"user_id = {user_id}, n_arts = {len(found_ids)}")
+    return Profile(weights @ rows, float(weights.sum()), time.time())
+
+
+async def get_profile(user_id: int) -> Profile | None:
+    """Returns the stored profile, building it from the database on the first request."""
+    profile: Profile | None = await _load_profile(user_id)
+    if profile is None:
+        profile = await build_profile(user_id)
+        if profile is not None:
+            await _save_profile(user_id, profile)
+    return profile
+
+
+async def update_profile(user_id: int, art_id: int, action: ProfileAction) -> None:
+    """
+    Applies a like or save to the profile in place: the profile is decayed to now and the
+    art's feature row is added with its weight.
+
+    A decayed contribution can't be subtracted exactly, so unlikes and unsaves rebuild the
+    profile from the likes and saves left in the database.
+    """
+    async with _locks[user_id % len(_locks)]:
+        profile: Profile | None = None if action in ("unlike", "unsave") else await _load_profile(user_id)
+        if profile is None:
+            # The database already reflects the action.
+            profile = await build_profile(user_id)
+        else:
+            found_ids, rows = await get_art_feature_rows([art_id])
+            if len(found_ids) == 0:
+                logger.warning(f"Art {art_id} can't be embedded, profile of user {user_id} unchanged")
+                return
+            weight: float = settings.profiles.like_weight if action == "like" else settings.profiles.save_weight
+            profile = profile.decayed(time.time())
+            profile = Profile(profile.vector + np.float32(weight) * rows[0], profile.weight + weight, profile.updated_at)
+
+        if profile is None:
+            await r.delete(_get_key(user_id))
+        else:
+            await _save_profile(user_id, profile)
+        logger.info(f"Profile of user {user_id} updated on {action} of art {art_id}")
@@ -0,0 +1,93 @@
+import joblib
+import numpy as np
+from compress_fasttext.models import CompressedFastTextKeyedVectors
+from sklearn.decomposition import PCA
+
+from artifacts import save_array
+from config import logger, settings
+
+
+def load_tag_embeddings() -> tuple[np.ndarray, np.ndarray]:
+    """
+    Opens the tag embedding store, memory-mapped.
+
+    Row `i` of the store holds the embedding of the tag with id `i`.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]:
+            - embeddings (float32, n_slots x tag_vector_size)
+            - known (bool, n_slots): whether the slot holds an embedding.
+            Both are empty if the store does not exist yet.
+    """
+    try:
+        embeddings: np.ndarray = np.load(settings.paths.tag_embeddings, mmap_mode="r")
+        known: np.ndarray = np.load(settings.paths.tag_embeddings_known, mmap_mode="r")
+    except FileNotFoundError:
+        embeddings = np.zeros((0, settings.arts.tag_vector_size), dtype=np.float32)
+        known = np.zeros(0, dtype=bool)
+    return embeddings, known
+
+
+def _embed_tag_names(tag_names: list[str]) -> np.ndarray:
+    cft_model = CompressedFastTextKeyedVectors.load(str(settings.paths.cft_model))
+    pca_model: PCA = joblib.load(str(settings.paths.pca_model))
+    logger.debug(f"cft_model and pca_model are initialized")
+
+    # cft_model.get_vector() returns a vector with 300 dimensions, while we need 100D.
+    vectors: np.ndarray = np.stack([cft_model.get_vector(name) for name in tag_names])
+    return pca_model.transform(vectors).astype(np.float32)
+
+
+def update_tag_embeddings(all_tags: list[tuple[int, str]]) -> np.ndarray:
+    """
+    Embeds the tags that are not in the store yet and returns the up-to-date store.
+
+    The fastText and PCA models are loaded only if there is something to embed, and all
+    new tags go through a single batched PCA transform.
+
+    Args:
+        all_tags (list[tuple[int, str]]): (id, name) pairs of the `tags` table.
+
+    Returns:
+        np.ndarray: The memory-mapped (n_slots x tag_vector_size) float32 embedding store.
+    """
+    embeddings, known = load_tag_embeddings()
+    new_tags: list[tuple[int, str]] = [
+        (tag_id, name) for tag_id, name in all_tags if tag_id >= len(known) or not known[tag_id]
+    ]
+    logger.info(f"len(all_tags) = {len(all_tags)}, len(new_tags) = {len(new_tags)}")
+    if not new_tags:
+        return embeddings
+
+    n_slots: int = max(len(known), max(tag_id for tag_id, _ in new_tags) + 1)
+    new_embeddings: np.ndarray = np.zeros((n_slots, embeddings.shape[1]), dtype=np.float32)
+    new_known: np.ndarray = np.zeros(n_slots, dtype=bool)
+    new_embeddings[:len(embeddings)] = embeddings
+    new_known[:len(known)] = known
+
+    new_tag_ids: np.ndarray = np.array([tag_id for tag_id, _ in new_tags], dtype=np.int64)
+    new_embeddings[new_tag_ids] = _embed_tag_names([name for _, name in new_tags])
+    new_known[new_tag_ids] = True
+
+    save_array(settings.paths.tag_embeddings, new_embeddings)
+    save_array(settings.paths.tag_embeddings_known, new_known)
+    embeddings, _ = load_tag_embeddings()
+    return embeddings
+
+
+def gather_tag_embeddings(embeddings: np.ndarray, tag_ids: np.ndarray) -> np.ndarray:
+    """
+    Looks up the embeddings of a padded tag id matrix in one vectorized pass.
+
+    Args:
+        embeddings (np.ndarray): The embedding store returned by `update_tag_embeddings`.
+        tag_ids (np.ndarray): A (n_arts x max_tags) int matrix, padded with -1.
+
+    Returns:
+        np.ndarray: A (n_arts x max_tags x tag_vector_size) float32 array,
+            zero for padding and for tags missing from the store.
+    """
+    is_valid: np.ndarray = (tag_ids >= 0) & (tag_ids < len(embeddings))
+    gathered: np.ndarray = embeddings[np.where(is_valid, tag_ids, 0)]
+    gathered[~is_valid] = 0
+    return gathered
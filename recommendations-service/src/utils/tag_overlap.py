@@ -0,0 +1,172 @@
+"""
+Sparse tag-overlap similarity.
+
+Arts are compared by the tags they share. Every tag is weighted by its inverse document
+frequency `log((1 + n_arts) / (1 + n_arts_with_tag))`, so rare tags count more than common
+ones, and `similarity.tags.metric` turns the weights into a score:
+
+    "jaccard"   weight of the shared tags / weight of all tags of both arts, in [0, 1]
+    "overlap"   weight of the shared tags
+
+Scores are sparse matrix products with an inverted index from every tag to the rows of its
+arts, so only arts sharing at least one tag are ever scored. The engine needs neither the
+fastText model nor the feature store.
+
+Files of an artifact version (see `artifacts.save_tag_incidence`), the art x tag incidence
+matrix in CSR form, rows in the order of `art_indices_to_ids.npy`:
+
+    art_tag_indptr.npy  (n_rows + 1) int64, the tags of row i are art_tag_ids[indptr[i]:indptr[i + 1]]
+    art_tag_ids.npy     int32 tag ids, sorted and unique within a row
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from config import logger, settings
+from utils.neighbours import get_block_rows, select_top_k
+
+
+def pack_tag_ids(tag_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Packs padded tag ids into CSR arrays.
+
+    Args:
+        tag_ids (np.ndarray): A (n_arts x max_tags) matrix of tag ids, padded with -1.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The int64 indptr and the int32 tag ids, sorted and unique per row.
+    """
+    tag_ids = np.sort(np.asarray(tag_ids, dtype=np.int64).reshape(len(tag_ids), -1), axis=1)
+    is_tag: np.ndarray = tag_ids >= 0
+    is_tag[:, 1:] &= tag_ids[:, 1:] != tag_ids[:, :-1]
+    indptr: np.ndarray = np.zeros(len(tag_ids) + 1, dtype=np.int64)
+    np.cumsum(is_tag.sum(axis=1), out=indptr[1:])
+    return indptr, tag_ids[is_tag].astype(np.int32)
+
+
+def concat_tag_ids(
+        indptr: np.ndarray,
+        tag_ids: np.ndarray,
+        new_indptr: np.ndarray,
+        new_tag_ids: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Appends the rows of the second CSR arrays after the rows of the first ones."""
+    return (
+        np.concatenate([indptr, indptr[-1] + np.asarray(new_indptr[1:], dtype=np.int64)]),
+        np.concatenate([tag_ids, new_tag_ids]).astype(np.int32),
+    )
+
+
+def get_scores(overlap: np.ndarray, weights_a: np.ndarray, weights_b: np.ndarray) -> np.ndarray:
+    """Turns the weight of the shared tags of pairs of arts into `similarity.tags.metric` scores."""
+    overlap = np.asarray(overlap, dtype=np.float32)
+    if settings.similarity.tags.metric == "overlap":
+        return overlap
+    union: np.ndarray = np.asarray(weights_a + weights_b - overlap, dtype=np.float32)
+    scores: np.ndarray = np.zeros_like(overlap)
+    np.divide(overlap, union, out=scores, where=union > 0)
+    return scores
+
+
+class TagIndex:
+    """The IDF-weighted art x tag incidence matrix and its inverted index."""
+
+    def __init__(self, indptr: np.ndarray, tag_ids: np.ndarray):
+        indptr = np.asarray(indptr, dtype=np.int64)
+        tag_ids = np.asarray(tag_ids, dtype=np.int32)
+        self.n_rows: int = len(indptr) - 1
+        self.n_tags: int = int(tag_ids.max()) + 1 if len(tag_ids) else 0
+        self.document_frequencies: np.ndarray = np.bincount(tag_ids, minlength=self.n_tags)
+        self.idf: np.ndarray = np.log((1 + self.n_rows) / (1 + self.document_frequencies)).astype(np.float32)
+        # (n_rows x n_tags), every tag of an art weighted by its IDF.
+        self.weighted: csr_matrix = csr_matrix(
+            (self.idf[tag_ids], tag_ids, indptr), shape=(self.n_rows, self.n_tags)
+        )
+        self.row_weights: np.ndarray = np.asarray(self.weighted.sum(axis=1), dtype=np.float32).ravel()
+        # Inverted index, (n_tags x n_rows): the rows of the arts having each tag.
+        self.postings: csr_matrix = csr_matrix(
+            (np.ones(len(tag_ids), dtype=np.float32), tag_ids, indptr), shape=(self.n_rows, self.n_tags)
+        ).T.tocsr()
+
+    def get_tags(self, row: int) -> np.ndarray:
+        return self.weighted.indices[self.weighted.indptr[row]:self.weighted.indptr[row + 1]]
+
+    def get_idf(self, tag_ids: np.ndarray) -> np.ndarray:
+        """IDF of any tag ids, tags unknown to the index count as the rarest ones."""
+        tag_ids = np.asarray(tag_ids, dtype=np.int64)
+        idf: np.ndarray = np.full(len(tag_ids), np.log(1 + self.n_rows), dtype=np.float32)
+        is_known: np.ndarray = tag_ids < self.n_tags
+        idf[is_known] = self.idf[tag_ids[is_known]]
+        return idf
+
+    def search(self, tag_ids: list[int] | np.ndarray, k: int, exclude_row: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the top-K arts by tag overlap with a set of tags.
+
+        Args:
+            tag_ids (list[int] | np.ndarray): Tags of the query art.
+            k (int): The maximum number of arts to return. Only arts sharing a tag are returned.
+            exclude_row (int | None): Row of the query art itself, if it is in the index.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Row indices and scores, best first.
+        """
+        tag_ids = np.unique(np.asarray(tag_ids, dtype=np.int64))
+        tag_ids = tag_ids[tag_ids >= 0]
+        known: np.ndarray = tag_ids[tag_ids < self.n_tags]
+        query = csr_matrix(
+            (self.idf[known], (np.zeros(len(known), dtype=np.int64), np.arange(len(known)))),
+            shape=(1, len(known)),
+        )
+        overlap: csr_matrix = (query @ self.postings[known]).tocsr()
+        rows: np.ndarray = overlap.indices
+        scores: np.ndarray = get_scores(overlap.data, self.get_idf(tag_ids).sum(), self.row_weights[rows])
+        if exclude_row is not None:
+            is_other: np.ndarray = rows != exclude_row
+            rows, scores = rows[is_other], scores[is_other]
+
+        k = min(k, len(rows))
+        if k == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        top: np.ndarray = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return rows[top].astype(np.int32), scores[top]
+
+
+def get_tag_neighbours(index: TagIndex, top_k: int, max_block_mb: int = 256) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Tag-overlap counterpart of `get_top_k_neighbours`.
+
+    The shared tag weights of a block of rows and all rows are one sparse product through the
+    inverted index, so only pairs of arts sharing a tag are multiplied. The top-K are selected
+    from the (block_rows x n_rows) float32 scores. A row is never its own neighbour.
+
+    Args:
+        index (TagIndex): The tag index of all arts.
+        top_k (int): The number of neighbours to keep per row. Clipped to n_rows - 1.
+        max_block_mb (int): Approximate memory budget of one dense score block, in megabytes.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Neighbour indices (int32) and scores (float32), best first.
+            Arts sharing tags with fewer than K arts are padded with index -1 and score 0.
+    """
+    n_rows: int = index.n_rows
+    k: int = max(0, min(top_k, n_rows - 1))
+    indices: np.ndarray = np.full((n_rows, k), -1, dtype=np.int32)
+    scores: np.ndarray = np.zeros((n_rows, k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+
+    block_rows: int = get_block_rows(n_rows, max_block_mb)
+    logger.info(f"n_rows = {n_rows}, n_tags = {index.n_tags}, top_k = {k}, block_rows = {block_rows}")
+    for start in range(0, n_rows, block_rows):
+        stop: int = min(start + block_rows, n_rows)
+        overlap: np.ndarray = (index.weighted[start:stop] @ index.postings).toarray()
+        block_scores: np.ndarray = get_scores(overlap, index.row_weights[start:stop, None], index.row_weights)
+        # Exclude the art itself from its own neighbours.
+        block_scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        top_columns, top_scores = select_top_k(block_scores, k)
+        is_neighbour: np.ndarray = top_scores > 0
+        indices[start:stop][is_neighbour] = top_columns[is_neighbour]
+        scores[start:stop][is_neighbour] = top_scores[is_neighbour]
+    return indices, scores
@@ -0,0 +1,18 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from config import settings
+
+# Shared by all servers of the process; numpy releases the GIL, so the threads run in parallel.
+worker_pool: ThreadPoolExecutor = ThreadPoolExecutor(
+    max_workers=settings.rmq.worker_threads,
+    thread_name_prefix="rpc-worker",
+)
+
+
+async def run_in_worker(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Runs blocking `func` in the worker pool, keeping the event loop free for other messages."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(worker_pool, partial(func, *args, **kwargs))